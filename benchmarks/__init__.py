@@ -0,0 +1 @@
+"""pg_mvt benchmarks."""
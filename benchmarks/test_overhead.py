@@ -0,0 +1,106 @@
+"""Request overhead benchmarks.
+
+Each endpoint is called in-process against the stub database pool. The time
+per request is compared to the `/healthz` request (so the measures don't depend
+on the machine's speed) and the memory allocated during a request is traced.
+Benchmarks fail when an endpoint is slower, or allocates more, than its
+baseline (`baseline.json`) by more than `PG_MVT_BENCH_TOLERANCE` (default 50%).
+
+Update the baseline with `PG_MVT_BENCH_UPDATE=1 python -m pytest benchmarks`.
+
+"""
+
+import os
+import time
+import tracemalloc
+from typing import Tuple
+
+import pytest
+
+from .conftest import RESULTS
+
+TOLERANCE = float(os.environ.get("PG_MVT_BENCH_TOLERANCE", "0.5"))
+
+ROUNDS = 10
+REQUESTS = 50
+
+GZIP = [("Accept-Encoding", "gzip")]
+
+ENDPOINTS = {
+    "tile": ("/tiles/public.landsat_wrs/0/0/0.pbf", []),
+    "tile_tms": ("/tiles/WebMercatorQuad/public.landsat_wrs/0/0/0.pbf", []),
+    "tile_params": (
+        "/tiles/public.landsat_wrs/1/0/0.pbf?columns=pr,row&filter=path%3D13&limit=100",
+        [],
+    ),
+    "tile_gzip": ("/tiles/public.landsat_wrs/0/0/0.pbf", GZIP),
+    "tilejson": ("/public.landsat_wrs/tilejson.json", []),
+    "tables": ("/tables.json", []),
+    "table_metadata": ("/table/public.landsat_wrs.json", []),
+    "tilematrixsets": ("/tileMatrixSets", []),
+}
+
+
+def _time(loop, client, path, headers) -> Tuple[float, float]:
+    """Return the best mean time of a request and of the `/healthz` request.
+
+    Both requests are timed in the same rounds, so their ratio doesn't depend
+    on the machine's load.
+
+    """
+
+    async def run(path, headers, n):
+        for _ in range(n):
+            await client.get(path, headers)
+
+    def timed(path, headers):
+        start = time.perf_counter()
+        loop.run_until_complete(run(path, headers, REQUESTS))
+        return (time.perf_counter() - start) / REQUESTS
+
+    # warm up (caches, lazy imports)
+    loop.run_until_complete(run(path, headers, 20))
+
+    rounds = [(timed(path, headers), timed("/healthz", [])) for _ in range(ROUNDS)]
+    return min(r[0] for r in rounds), min(r[1] for r in rounds)
+
+
+def _peak(loop, client, path, headers) -> float:
+    """Return the memory allocated (peak) by a request, in KB."""
+    peaks = []
+    for _ in range(3):
+        tracemalloc.start()
+        try:
+            loop.run_until_complete(client.get(path, headers))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    return min(peaks) / 1024
+
+
+@pytest.mark.parametrize("name", list(ENDPOINTS))
+def test_overhead(name, loop, client, baseline):
+    """Request overhead doesn't regress."""
+    path, headers = ENDPOINTS[name]
+
+    elapsed, reference = _time(loop, client, path, headers)
+    result = {
+        "us": round(elapsed * 1e6, 1),
+        "ratio": round(elapsed / reference, 2),
+        "peak_kb": round(_peak(loop, client, path, headers), 1),
+    }
+    RESULTS[name] = result
+
+    expected = baseline.get(name)
+    if expected is None or os.environ.get("PG_MVT_BENCH_UPDATE"):
+        pytest.skip(f"no baseline for '{name}'")
+
+    assert result["ratio"] <= expected["ratio"] * (1 + TOLERANCE), (
+        f"'{name}' request takes {result['ratio']}x the `/healthz` request "
+        f"(baseline: {expected['ratio']}x)"
+    )
+    assert result["peak_kb"] <= expected["peak_kb"] * (1 + TOLERANCE), (
+        f"'{name}' request allocates {result['peak_kb']}KB "
+        f"(baseline: {expected['peak_kb']}KB)"
+    )
@@ -0,0 +1,346 @@
+"""pg_mvt.archive: MBTiles and PMTiles archive readers."""
+
+import abc
+import gzip
+import json
+import mmap
+import os
+import sqlite3
+import struct
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from pg_mvt.errors import InvalidArchive
+
+
+def decompress(data: bytes, compression: Optional[str]) -> bytes:
+    """Decompress tile or directory data."""
+    if not data or compression in (None, "none"):
+        return data
+
+    if compression == "gzip":
+        return gzip.decompress(data)
+
+    if compression in ("br", "zstd"):
+        import cramjam
+
+        codec = cramjam.brotli if compression == "br" else cramjam.zstd
+        return bytes(codec.decompress(data))
+
+    raise InvalidArchive(f"Unsupported compression: {compression}")
+
+
+@dataclass
+class ArchiveInfo:
+    """Tile archive information."""
+
+    minzoom: int
+    maxzoom: int
+    bounds: List[float]
+    metadata: Dict
+
+
+class ArchiveReader(metaclass=abc.ABCMeta):
+    """Tile archive reader abstract base class."""
+
+    path: str
+    info: ArchiveInfo
+
+    @abc.abstractmethod
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """Return decompressed tile data or None if the tile is not in the archive."""
+        ...
+
+    @abc.abstractmethod
+    def close(self):
+        """Close the archive."""
+        ...
+
+
+class MBTilesReader(ArchiveReader):
+    """MBTiles (SQLite) archive reader.
+
+    The database is opened read-only (immutable) and SQLite's memory-mapped
+    I/O is enabled so tile reads do not need any read syscalls.
+
+    """
+
+    def __init__(self, path: str, mmap_size: int = 2**30):
+        """Open MBTiles archive."""
+        self.path = path
+        self.db = sqlite3.connect(
+            f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self.db.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+
+        metadata = dict(self.db.execute("SELECT name, value FROM metadata").fetchall())
+
+        if "minzoom" in metadata and "maxzoom" in metadata:
+            minzoom, maxzoom = int(metadata["minzoom"]), int(metadata["maxzoom"])
+        else:
+            minzoom, maxzoom = self.db.execute(
+                "SELECT min(zoom_level), max(zoom_level) FROM tiles"
+            ).fetchone()
+
+        bounds = [-180.0, -85.051129, 180.0, 85.051129]
+        if metadata.get("bounds"):
+            bounds = [float(v) for v in metadata["bounds"].split(",")]
+
+        if metadata.get("json"):
+            metadata["json"] = json.loads(metadata["json"])
+
+        self.info = ArchiveInfo(
+            minzoom=minzoom, maxzoom=maxzoom, bounds=bounds, metadata=metadata
+        )
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """Return tile data (MBTiles uses TMS `y` ordering)."""
+        row = self.db.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        if row is None:
+            return None
+
+        # Vector tiles in MBTiles are usually (but not always) gzip compressed
+        data = bytes(row[0])
+        return decompress(data, "gzip") if data[:2] == b"\x1f\x8b" else data
+
+    def close(self):
+        """Close the database connection."""
+        self.db.close()
+
+
+# PMTiles v3 specification: https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md
+PMTILES_HEADER = struct.Struct("<7sBQQQQQQQQQQQBBBBBBiiiiBii")
+PMTILES_COMPRESSION = {0: None, 1: "none", 2: "gzip", 3: "br", 4: "zstd"}
+
+
+def zxy_to_tileid(z: int, x: int, y: int) -> int:
+    """Return PMTiles (hilbert) Tile ID for a z/x/y tile."""
+    if x >= 1 << z or y >= 1 << z:
+        raise ValueError(f"Tile {z}/{x}/{y} is outside the zoom level.")
+
+    acc = ((1 << (z * 2)) - 1) // 3
+    a = z - 1
+    while a >= 0:
+        s = 1 << a
+        rx = s & x
+        ry = s & y
+        acc += ((3 * rx) ^ ry) << a
+        if ry == 0:
+            if rx != 0:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        a -= 1
+
+    return acc
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    """Decode an unsigned LEB128 varint."""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+@dataclass
+class Directory:
+    """Decoded PMTiles directory (columnar)."""
+
+    tile_ids: List[int]
+    run_lengths: List[int]
+    lengths: List[int]
+    offsets: List[int]
+
+    @classmethod
+    def from_bytes(cls, buf: bytes) -> "Directory":
+        """Decode a (decompressed) directory."""
+        n, pos = _read_varint(buf, 0)
+
+        tile_ids = [0] * n
+        last_id = 0
+        for i in range(n):
+            delta, pos = _read_varint(buf, pos)
+            last_id += delta
+            tile_ids[i] = last_id
+
+        run_lengths = [0] * n
+        for i in range(n):
+            run_lengths[i], pos = _read_varint(buf, pos)
+
+        lengths = [0] * n
+        for i in range(n):
+            lengths[i], pos = _read_varint(buf, pos)
+
+        offsets = [0] * n
+        for i in range(n):
+            value, pos = _read_varint(buf, pos)
+            if value == 0 and i > 0:
+                offsets[i] = offsets[i - 1] + lengths[i - 1]
+            else:
+                offsets[i] = value - 1
+
+        return cls(tile_ids, run_lengths, lengths, offsets)
+
+    def find(self, tile_id: int) -> Optional[int]:
+        """Return the index of the entry containing `tile_id`."""
+        idx = bisect_right(self.tile_ids, tile_id) - 1
+        if idx < 0:
+            return None
+
+        run_length = self.run_lengths[idx]
+        # run_length == 0 means the entry points to a leaf directory
+        if run_length == 0 or tile_id < self.tile_ids[idx] + run_length:
+            return idx
+
+        return None
+
+
+class PMTilesReader(ArchiveReader):
+    """PMTiles (v3) archive reader.
+
+    The archive is memory-mapped and decoded directories are kept in a
+    bounded LRU cache, so a tile read is a couple of binary searches and a
+    slice of the mapped file.
+
+    """
+
+    def __init__(self, path: str, max_cached_directories: int = 128):
+        """Open PMTiles archive."""
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:7] != b"PMTiles":
+            raise InvalidArchive(f"{path} is not a PMTiles archive.")
+
+        if self._mmap[7] != 3:
+            raise InvalidArchive(f"Unsupported PMTiles version: {self._mmap[7]}")
+
+        (
+            _,
+            _,
+            self.root_offset,
+            self.root_length,
+            metadata_offset,
+            metadata_length,
+            self.leaf_offset,
+            _,
+            self.data_offset,
+            _,
+            _,
+            _,
+            _,
+            _,
+            internal_compression,
+            tile_compression,
+            _,
+            minzoom,
+            maxzoom,
+            min_lon,
+            min_lat,
+            max_lon,
+            max_lat,
+            _,
+            _,
+            _,
+        ) = PMTILES_HEADER.unpack_from(self._mmap, 0)
+
+        self.internal_compression = PMTILES_COMPRESSION.get(internal_compression)
+        self.tile_compression = PMTILES_COMPRESSION.get(tile_compression)
+
+        self._directories: "OrderedDict[Tuple[int, int], Directory]" = OrderedDict()
+        self._max_cached_directories = max_cached_directories
+
+        metadata = json.loads(
+            decompress(
+                self._mmap[metadata_offset : metadata_offset + metadata_length],
+                self.internal_compression,
+            )
+            or b"{}"
+        )
+
+        self.info = ArchiveInfo(
+            minzoom=minzoom,
+            maxzoom=maxzoom,
+            bounds=[min_lon / 1e7, min_lat / 1e7, max_lon / 1e7, max_lat / 1e7],
+            metadata=metadata,
+        )
+
+    def _directory(self, offset: int, length: int) -> Directory:
+        """Return decoded directory (cached)."""
+        key = (offset, length)
+        directory = self._directories.get(key)
+        if directory is not None:
+            self._directories.move_to_end(key)
+            return directory
+
+        directory = Directory.from_bytes(
+            decompress(self._mmap[offset : offset + length], self.internal_compression)
+        )
+        self._directories[key] = directory
+        if len(self._directories) > self._max_cached_directories:
+            self._directories.popitem(last=False)
+
+        return directory
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """Return tile data."""
+        tile_id = zxy_to_tileid(z, x, y)
+
+        offset, length = self.root_offset, self.root_length
+        # Root + at most 3 levels of leaf directories (spec)
+        for _ in range(4):
+            directory = self._directory(offset, length)
+            idx = directory.find(tile_id)
+            if idx is None:
+                return None
+
+            if directory.run_lengths[idx] > 0:
+                start = self.data_offset + directory.offsets[idx]
+                data = self._mmap[start : start + directory.lengths[idx]]
+                return decompress(data, self.tile_compression)
+
+            offset = self.leaf_offset + directory.offsets[idx]
+            length = directory.lengths[idx]
+
+        return None
+
+    def close(self):
+        """Close the memory map and the file."""
+        self._mmap.close()
+        self._file.close()
+
+
+@lru_cache(maxsize=16)
+def _open_archive(path: str, mtime: float) -> ArchiveReader:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".mbtiles":
+        try:
+            return MBTilesReader(path)
+        except sqlite3.DatabaseError as e:
+            raise InvalidArchive(f"{path} is not a MBTiles archive: {e}") from e
+
+    elif ext == ".pmtiles":
+        return PMTilesReader(path)
+
+    raise InvalidArchive(f"Unsupported archive format: {path}")
+
+
+def open_archive(path: str) -> ArchiveReader:
+    """Open (and cache) a tile archive reader, reopening it when the file changes."""
+    if not os.path.exists(path):
+        raise InvalidArchive(f"{path} does not exist.")
+
+    return _open_archive(path, os.path.getmtime(path))
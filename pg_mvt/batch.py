@@ -0,0 +1,85 @@
+"""pg_mvt.batch: Micro-batching of tile queries.
+
+Tile requests sharing a batch key (e.g same layer, zoom level and query
+parameters) received within a short window are rendered together, with one
+query returning all the tiles.
+
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Sequence, Set
+
+from morecantile import Tile
+
+from pg_mvt.settings import PgSettings
+
+BatchRender = Callable[[Sequence[Tile]], Awaitable[List[Any]]]
+
+
+class TileBatcher:
+    """Collect tile requests and render them in batches."""
+
+    def __init__(self):
+        """Create batcher."""
+        self._batches: Dict[Hashable, Dict[Tile, asyncio.Future]] = {}
+        # NOTE: the event loop only keeps weak references to the tasks
+        self._tasks: Set["asyncio.Future"] = set()
+
+    async def get(self, key: Hashable, tile: Tile, render: BatchRender) -> Any:
+        """Return the tile, rendered with the other tiles of the batch.
+
+        Args:
+            key (hashable): Batch key (tiles of a batch are rendered by `render`).
+            tile (Tile): Tile object with X,Y,Z indices.
+            render (callable): Coroutine function rendering a list of tiles
+                (returning the tiles' content in the same order).
+
+        """
+        settings = PgSettings()
+        loop = asyncio.get_event_loop()
+
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = {}
+            loop.call_later(settings.db_batch_window, self._flush, key, batch, render)
+
+        # Identical tiles share the same result
+        future = batch.get(tile)
+        if future is None:
+            future = batch[tile] = loop.create_future()
+            if len(batch) >= settings.db_batch_max_tiles:
+                self._flush(key, batch, render)
+
+        # NOTE: a cancelled request must not cancel the other requests of the tile
+        return await asyncio.shield(future)
+
+    def _flush(self, key: Hashable, batch: Dict[Tile, asyncio.Future], render):
+        """Render a batch (once, when full or at the end of the window)."""
+        if self._batches.get(key) is not batch:
+            return
+
+        del self._batches[key]
+        task = asyncio.ensure_future(self._render(batch, render))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _render(self, batch: Dict[Tile, asyncio.Future], render: BatchRender):
+        tiles = list(batch)
+        try:
+            results = await render(tiles)
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for tile, content in zip(tiles, results):
+            if not batch[tile].done():
+                batch[tile].set_result(content)
+
+
+tile_batcher = TileBatcher()
@@ -0,0 +1,533 @@
+"""pg_mvt.cache: Tile cache."""
+
+import abc
+import asyncio
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from morecantile import Tile
+
+from pg_mvt.settings import CacheSettings
+
+try:
+    import fcntl
+except ImportError:  # pragma: nocover
+    fcntl = None  # type: ignore
+
+
+class TileCache(metaclass=abc.ABCMeta):
+    """Tile cache abstract base class."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached tile or None."""
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """Add tile to the cache."""
+        ...
+
+    @abc.abstractmethod
+    def clear(self):
+        """Remove all tiles from the cache."""
+        ...
+
+    def invalidate(self, match: Callable[[str], bool]):
+        """Remove the tiles whose key matches (all the tiles by default)."""
+        self.clear()
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """Return the remaining time to live of a cached tile (None if unknown)."""
+        return None
+
+    def hit(self, key: str, render: Callable[[], Awaitable[bytes]]):
+        """Register a cache hit, `render` re-creates the tile (refresh-ahead)."""
+        pass
+
+
+class NoCache(TileCache):
+    """Disabled cache."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return None."""
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """Do nothing."""
+        pass
+
+    def clear(self):
+        """Do nothing."""
+        pass
+
+
+class MemoryCache(TileCache):
+    """In-process LRU cache with time-to-live.
+
+    Attributes:
+        maxsize (int): Maximum number of tiles in the cache.
+        ttl (int): Default time to live, in seconds.
+
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: int = 300):
+        """Create empty cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return number of items in the cache."""
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached tile or None if missing or expired."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """Return the remaining time to live of a cached tile."""
+        item = self._data.get(key)
+        return item[0] - time.monotonic() if item is not None else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """Add tile to the cache, evicting the least recently used tiles."""
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all tiles from the cache."""
+        self._data.clear()
+
+    def invalidate(self, match: Callable[[str], bool]):
+        """Remove the tiles whose key matches."""
+        for key in [key for key in self._data if match(key)]:
+            del self._data[key]
+
+
+# Shared cache file layout:
+# - header: magic, number of buckets, data (ring buffer) size, write position
+# - buckets: seqlock counter, key hash, record offset, expiration time, record size
+# - data: ring buffer of records (key size, key, value)
+SHARED_MAGIC = b"PGMVTC01"
+SHARED_HEADER = struct.Struct("<8sQQQ")
+SHARED_BUCKET = struct.Struct("<QQQdI4x")
+SHARED_RECORD = struct.Struct("<I")
+WRITE_POS_OFFSET = 24  # write position offset in the header
+
+
+class SharedMemoryCache(TileCache):
+    """Cache shared between the processes of a host (e.g uvicorn/gunicorn workers).
+
+    Tiles are stored in a memory-mapped file: a fixed size hash table (one
+    entry per bucket, newer tiles replace older ones) pointing to records in a
+    ring buffer. Reads are lock-free (a per-bucket sequence counter and the ring
+    write position are checked after copying the data) and writes are
+    serialized between processes with a file lock.
+
+    Attributes:
+        path (str): Path of the cache file (e.g in `/dev/shm`).
+        size (int): Size of the ring buffer, in bytes.
+        buckets (int): Number of hash table buckets.
+        ttl (int): Default time to live, in seconds.
+
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int = 256 * 2**20,
+        buckets: int = 2**16,
+        ttl: int = 300,
+    ):
+        """Open (or create) cache file."""
+        assert fcntl is not None, "SharedMemoryCache is only available on Unix"
+
+        self.path = path
+        self.size = size
+        self.buckets = buckets
+        self.ttl = ttl
+
+        self._data_offset = SHARED_HEADER.size + buckets * SHARED_BUCKET.size
+        total_size = self._data_offset + size
+
+        while not self._open(total_size):
+            pass
+
+        self._mmap = mmap.mmap(self._fd, total_size)
+
+    def _open(self, total_size: int) -> bool:
+        """Open the cache file, return False if it must be opened again.
+
+        A file with another configuration is unlinked (and a new one created)
+        instead of being resized, as other processes (e.g old workers during a
+        rolling restart) may still have it mapped.
+
+        """
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._lock():
+            stat = os.fstat(self._fd)
+            try:
+                replaced = os.stat(self.path).st_ino != stat.st_ino
+            except FileNotFoundError:
+                replaced = True
+
+            if not replaced and stat.st_size == 0:
+                # New file
+                os.ftruncate(self._fd, total_size)
+                os.pwrite(
+                    self._fd,
+                    SHARED_HEADER.pack(SHARED_MAGIC, self.buckets, self.size, 0),
+                    0,
+                )
+                return True
+
+            header = os.pread(self._fd, SHARED_HEADER.size, 0)
+            if (
+                not replaced
+                and len(header) == SHARED_HEADER.size
+                and SHARED_HEADER.unpack(header)[:3]
+                == (SHARED_MAGIC, self.buckets, self.size)
+                and stat.st_size == total_size
+            ):
+                return True
+
+            if not replaced:
+                # Different configuration
+                os.unlink(self.path)
+
+        os.close(self._fd)
+        return False
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """Exclusive (inter-process) lock."""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _hash(self, key: bytes) -> int:
+        """Return stable (across processes) 64bit key hash."""
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+    def _bucket_offset(self, hash: int) -> int:
+        return SHARED_HEADER.size + (hash % self.buckets) * SHARED_BUCKET.size
+
+    def _write_pos(self) -> int:
+        return struct.unpack_from("<Q", self._mmap, WRITE_POS_OFFSET)[0]
+
+    def _read(self, pos: int, length: int) -> bytes:
+        """Read bytes from the ring buffer."""
+        start = pos % self.size
+        end = start + length
+        if end <= self.size:
+            return self._mmap[self._data_offset + start : self._data_offset + end]
+
+        return (
+            self._mmap[self._data_offset + start : self._data_offset + self.size]
+            + self._mmap[self._data_offset : self._data_offset + end - self.size]
+        )
+
+    def _write(self, pos: int, data: bytes):
+        """Write bytes to the ring buffer."""
+        start = pos % self.size
+        first = min(len(data), self.size - start)
+        self._mmap[
+            self._data_offset + start : self._data_offset + start + first
+        ] = data[:first]
+        if first < len(data):
+            self._mmap[
+                self._data_offset : self._data_offset + len(data) - first
+            ] = data[first:]
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached tile or None if missing, expired or overwritten."""
+        bkey = key.encode()
+        hash = self._hash(bkey)
+        offset = self._bucket_offset(hash)
+
+        seq, bucket_hash, pos, expires, length = SHARED_BUCKET.unpack_from(
+            self._mmap, offset
+        )
+        if seq % 2 or not length or bucket_hash != hash or expires < time.time():
+            return None
+
+        record = self._read(pos, length)
+
+        # The bucket was updated or the record overwritten while reading
+        if SHARED_BUCKET.unpack_from(self._mmap, offset)[0] != seq:
+            return None
+        if self._write_pos() - pos > self.size:
+            return None
+
+        key_size = SHARED_RECORD.unpack_from(record)[0]
+        start = SHARED_RECORD.size
+        if record[start : start + key_size] != bkey:
+            return None
+
+        return record[start + key_size :]
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """Return the remaining time to live of a cached tile."""
+        hash = self._hash(key.encode())
+        _, bucket_hash, _, expires, length = SHARED_BUCKET.unpack_from(
+            self._mmap, self._bucket_offset(hash)
+        )
+        if not length or bucket_hash != hash:
+            return None
+
+        return expires - time.time()
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """Add tile to the cache."""
+        bkey = key.encode()
+        record = SHARED_RECORD.pack(len(bkey)) + bkey + value
+        # Do not let a single tile evict a large part of the cache
+        if len(record) > self.size // 8:
+            return
+
+        hash = self._hash(bkey)
+        offset = self._bucket_offset(hash)
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._lock():
+            pos = self._write_pos()
+            # Publish the new write position first so readers of the records
+            # being overwritten can detect it
+            struct.pack_into("<Q", self._mmap, WRITE_POS_OFFSET, pos + len(record))
+            self._write(pos, record)
+
+            seq = SHARED_BUCKET.unpack_from(self._mmap, offset)[0]
+            struct.pack_into("<Q", self._mmap, offset, seq + 1)
+            SHARED_BUCKET.pack_into(
+                self._mmap, offset, seq + 1, hash, pos, expires, len(record)
+            )
+            struct.pack_into("<Q", self._mmap, offset, seq + 2)
+
+    def clear(self):
+        """Remove all tiles from the cache."""
+        with self._lock():
+            for i in range(self.buckets):
+                offset = SHARED_HEADER.size + i * SHARED_BUCKET.size
+                seq = SHARED_BUCKET.unpack_from(self._mmap, offset)[0]
+                SHARED_BUCKET.pack_into(self._mmap, offset, seq + 2, 0, 0, 0.0, 0)
+
+    def invalidate(self, match: Callable[[str], bool]):
+        """Remove the tiles whose key matches."""
+        with self._lock():
+            write_pos = self._write_pos()
+            for i in range(self.buckets):
+                offset = SHARED_HEADER.size + i * SHARED_BUCKET.size
+                seq, _, pos, _, length = SHARED_BUCKET.unpack_from(self._mmap, offset)
+                if not length or write_pos - pos > self.size:
+                    continue
+
+                key_size = SHARED_RECORD.unpack(self._read(pos, SHARED_RECORD.size))[0]
+                key = self._read(pos + SHARED_RECORD.size, key_size)
+                if match(key.decode()):
+                    SHARED_BUCKET.pack_into(self._mmap, offset, seq + 2, 0, 0, 0.0, 0)
+
+    def close(self):
+        """Close the memory map and the file."""
+        self._mmap.close()
+        os.close(self._fd)
+
+
+class RefreshAheadCache(TileCache):
+    """Cache wrapper re-rendering hot tiles in the background before they expire.
+
+    Tiles hit at least `min_hits` times since they were cached are re-rendered
+    when a hit happens less than `window` seconds before their expiration.
+    Background renders are limited to `connections` concurrent renders (i.e
+    database connections) and to `rate` renders per second.
+
+    Attributes:
+        cache (TileCache): Wrapped cache.
+        window (float): Refresh tiles expiring in less than `window` seconds.
+        min_hits (int): Minimum number of hits for a tile to be refreshed.
+        connections (int): Maximum number of concurrent background renders.
+        rate (float): Maximum number of background renders per second.
+
+    """
+
+    def __init__(
+        self,
+        cache: TileCache,
+        window: float = 30,
+        min_hits: int = 3,
+        connections: int = 1,
+        rate: float = 10,
+        max_keys: int = 2**16,
+    ):
+        """Wrap cache."""
+        self.cache = cache
+        self.window = window
+        self.min_hits = min_hits
+        self.connections = connections
+        self.rate = rate
+        self.max_keys = max_keys
+
+        self._hits: Dict[str, int] = {}
+        self._pending: Set[str] = set()
+        self._tasks: Set["asyncio.Future"] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tokens = float(max(rate, 1))
+        self._last = time.monotonic()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached tile or None."""
+        return self.cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """Add tile to the cache (and reset its hits count)."""
+        self._hits.pop(key, None)
+        self.cache.set(key, value, ttl=ttl)
+
+    def clear(self):
+        """Remove all tiles from the cache."""
+        self._hits.clear()
+        self.cache.clear()
+
+    def invalidate(self, match: Callable[[str], bool]):
+        """Remove the tiles whose key matches."""
+        for key in [key for key in self._hits if match(key)]:
+            del self._hits[key]
+        self.cache.invalidate(match)
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """Return the remaining time to live of a cached tile."""
+        return self.cache.expires_in(key)
+
+    def _take_token(self) -> bool:
+        """Rate limiter (token bucket)."""
+        now = time.monotonic()
+        self._tokens = min(
+            self._tokens + (now - self._last) * self.rate, max(self.rate, 1)
+        )
+        self._last = now
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def hit(self, key: str, render: Callable[[], Awaitable[bytes]]):
+        """Count the hit and schedule a background render for hot expiring tiles."""
+        if len(self._hits) >= self.max_keys and key not in self._hits:
+            # Forget the coldest half of the tiles (the hot tiles keep their count)
+            coldest = heapq.nsmallest(
+                max(len(self._hits) // 2, 1), self._hits, key=self._hits.__getitem__
+            )
+            for k in coldest:
+                del self._hits[k]
+
+        hits = self._hits.get(key, 0) + 1
+        self._hits[key] = hits
+        if hits < self.min_hits or key in self._pending:
+            return
+
+        expires_in = self.cache.expires_in(key)
+        if expires_in is None or expires_in > self.window or not self._take_token():
+            return
+
+        self._pending.add(key)
+        task = asyncio.ensure_future(self._refresh(key, render))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: str, render: Callable[[], Awaitable[bytes]]):
+        """Re-render and cache a tile."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.connections)
+
+        try:
+            async with self._semaphore:
+                content = await render()
+            self.set(key, content)
+        except Exception:
+            # The tile will be rendered on a cache miss
+            pass
+        finally:
+            self._pending.discard(key)
+
+
+def create_cache() -> TileCache:
+    """Create tile cache from settings."""
+    settings = CacheSettings()
+    if settings.disable or settings.maxsize <= 0:
+        return NoCache()
+
+    cache: TileCache
+    if settings.backend == "shared":
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        cache = SharedMemoryCache(
+            settings.path or os.path.join(shm, "pg_mvt_cache"),
+            size=settings.shared_size,
+            buckets=settings.shared_buckets,
+            ttl=settings.ttl,
+        )
+    else:
+        cache = MemoryCache(maxsize=settings.maxsize, ttl=settings.ttl)
+
+    if settings.refresh_ahead > 0:
+        cache = RefreshAheadCache(
+            cache,
+            window=settings.refresh_ahead,
+            min_hits=settings.refresh_min_hits,
+            connections=settings.refresh_connections,
+            rate=settings.refresh_rate,
+        )
+
+    return cache
+
+
+def create_document_cache() -> TileCache:
+    """Create catalog/TileJSON documents cache from settings.
+
+    Documents are cached for a catalog version so they do not expire.
+
+    """
+    settings = CacheSettings()
+    if settings.documents_maxsize <= 0:
+        return NoCache()
+
+    return MemoryCache(maxsize=settings.documents_maxsize, ttl=2**31)
+
+
+def cache_key(layer_id: str, tms_id: str, tile: Tile, params: Dict[str, Any]) -> str:
+    """Return cache key for a tile.
+
+    Query parameters (e.g `columns`, `filter`) are sorted so equivalent
+    requests share the same key.
+
+    """
+    key = f"{layer_id}/{tms_id}/{tile.z}/{tile.x}/{tile.y}"
+    if params:
+        key += "?" + urlencode(sorted(params.items()), doseq=True)
+
+    return key
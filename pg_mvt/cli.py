@@ -0,0 +1,235 @@
+"""pg_mvt.cli: Command line tools."""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+import morecantile
+from buildpg import asyncpg
+
+from pg_mvt.diagnostics import heavy_tiles
+from pg_mvt.layer import Table
+
+SHADES = " .:-=+*#%@"
+
+
+def _heatmap(rows: List[List[int]]) -> str:
+    """Render heatmap as text (darker is heavier)."""
+    vmax = max((v for row in rows for v in row), default=0) or 1
+    return "\n".join(
+        "".join(SHADES[max(1, v * len(SHADES) // (vmax + 1)) if v else 0] for v in row)
+        for row in rows
+    )
+
+
+def _print_heavy_tiles(result: Dict) -> None:
+    """Print heavy tiles report."""
+    print(f"{result['id']} ({result['tms']}, zoom {result['zoom']})")
+    print(f"{'tile':<20} {'features':>10} {'vertices':>12}")
+    for t in result["tiles"]:
+        tile = f"{t['z']}/{t['x']}/{t['y']}"
+        print(f"{tile:<20} {t['features']:>10} {t['vertices']:>12}")
+
+    print("\nsummary")
+    for key, value in result["summary"].items():
+        print(f"  {key:<14} {value}")
+
+    print("\nvertices per tile")
+    total = sum(h["tiles"] for h in result["histogram"]) or 1
+    for h in result["histogram"]:
+        bar = "#" * max(1, round(50 * h["tiles"] / total))
+        print(f"  >= {h['vertices']:<10} {h['tiles']:>8} {bar}")
+
+    cell_x, cell_y = result["heatmap"]["cell"]
+    print(f"\nheatmap (cell of {cell_x}x{cell_y} tiles)")
+    print(_heatmap(result["heatmap"]["vertices"]))
+
+
+async def _heavy_tiles(args: argparse.Namespace) -> Dict:
+    # `pg_mvt.db` reads the database settings on import
+    os.environ["PG_MVT_DATABASE_URL"] = args.database_url
+    from pg_mvt.db import table_index
+
+    pool = await asyncpg.create_pool_b(args.database_url, min_size=1, max_size=1)
+    try:
+        catalog = {r["id"]: r for r in await table_index(pool)}
+        if args.layer not in catalog:
+            raise SystemExit(f"Table '{args.layer}' not found.")
+
+        kwargs = {}
+        if args.filter:
+            kwargs = {"filter": args.filter, "filter-lang": args.filter_lang}
+
+        return await heavy_tiles(
+            pool,
+            Table(**catalog[args.layer]),
+            args.zoom,
+            morecantile.tms.get(args.tms),
+            limit=args.limit,
+            grid_size=args.grid_size,
+            **kwargs,
+        )
+    finally:
+        await pool.close()
+
+
+def _print_replay(result: Dict) -> None:
+    """Print replay report."""
+    print(
+        f"{result['total']['requests']} requests in {result['duration']}s "
+        f"(max lag {result['max_lag']}s)"
+    )
+    header = f"{'layer':<30} {'zoom':>4} {'requests':>9} {'errors':>7}"
+    print(f"{header} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for g in result["groups"] + [{"layer": "total", "zoom": None, **result["total"]}]:
+        zoom = "" if g["zoom"] is None else g["zoom"]
+        print(
+            f"{g['layer']:<30} {zoom:>4} {g['requests']:>9} {g['errors']:>7} "
+            f"{g['p50']:>9} {g['p90']:>9} {g['p99']:>9} {g['max']:>9}"
+        )
+    print("(latencies in ms)")
+
+    pool = result["pool"]
+    if pool["samples"]:
+        print(
+            f"\ndatabase pool: mean usage {pool['mean_usage']:.0%}, "
+            f"max usage {pool['max_usage']:.0%}, saturated {pool['saturated']:.0%} "
+            f"({pool['workers']} worker(s) sampled)"
+        )
+
+
+def _replay(args: argparse.Namespace) -> None:
+    from pg_mvt.replay import parse_log, replay
+
+    if args.log == "-":
+        requests = parse_log(sys.stdin, rate=args.rate)
+    else:
+        with open(args.log) as f:
+            requests = parse_log(f, rate=args.rate)
+
+    headers = []
+    for header in args.header:
+        name, _, value = header.partition(":")
+        headers.append((name.strip(), value.strip()))
+
+    result = asyncio.run(
+        replay(
+            args.url,
+            requests,
+            speed=args.speed,
+            timeout=args.timeout,
+            headers=headers,
+            pool_interval=args.pool_interval,
+        )
+    )
+    if args.json:
+        print(json.dumps(result))
+    else:
+        _print_replay(result)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """pg_mvt command line."""
+    parser = argparse.ArgumentParser(prog="pg_mvt")
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("PG_MVT_DATABASE_URL") or os.environ.get("DATABASE_URL"),
+        help="PostgreSQL connection string (default: $PG_MVT_DATABASE_URL).",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    heavy = commands.add_parser(
+        "heavy-tiles",
+        help="Rank a table's tiles by feature and vertex count for a zoom level.",
+    )
+    heavy.add_argument("layer", help="Table layer id (e.g public.roads).")
+    heavy.add_argument("--zoom", "-z", type=int, required=True, help="Zoom level.")
+    heavy.add_argument("--tms", default="WebMercatorQuad", help="TileMatrixSet id.")
+    heavy.add_argument("--limit", type=int, default=20, help="Tiles to list.")
+    heavy.add_argument("--grid-size", type=int, default=16, help="Heatmap size.")
+    heavy.add_argument("--filter", help="CQL2 filter on the table's properties.")
+    heavy.add_argument("--filter-lang", default="cql2-text")
+    heavy.add_argument("--json", action="store_true", help="Print JSON output.")
+
+    server = commands.add_parser(
+        "serve",
+        help="Load the catalog once and serve pg_mvt with forked workers.",
+    )
+    server.add_argument("--host", default="127.0.0.1", help="Bind socket to host.")
+    server.add_argument("--port", type=int, default=8081, help="Bind socket to port.")
+    server.add_argument("--workers", type=int, default=1, help="Worker processes.")
+    server.add_argument(
+        "--no-precompute-tms",
+        dest="precompute_tms",
+        action="store_false",
+        help="Do not compute the TileMatrixSets' context before forking.",
+    )
+    server.add_argument("--log-level", default="info", help="uvicorn log level.")
+
+    replay = commands.add_parser(
+        "replay",
+        help="Replay an access log against a pg_mvt instance (open-loop).",
+    )
+    replay.add_argument("log", help="Access log file ('-' for stdin).")
+    replay.add_argument(
+        "--url", default="http://127.0.0.1:8081", help="pg_mvt base url."
+    )
+    replay.add_argument(
+        "--speed", type=float, default=1.0, help="Replay speed (2 is twice faster)."
+    )
+    replay.add_argument(
+        "--rate",
+        type=float,
+        default=10,
+        help="Requests per second for log lines without time.",
+    )
+    replay.add_argument("--timeout", type=float, default=30, help="Request timeout.")
+    replay.add_argument(
+        "--header", "-H", action="append", default=[], help="Header (Name: value)."
+    )
+    replay.add_argument(
+        "--pool-interval",
+        type=float,
+        default=1,
+        help="Database pool sampling interval (0 to disable).",
+    )
+    replay.add_argument("--json", action="store_true", help="Print JSON output.")
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        sys.exit(1)
+
+    if args.command == "replay":
+        _replay(args)
+        return
+
+    if not args.database_url:
+        parser.error("--database-url (or PG_MVT_DATABASE_URL) is required.")
+
+    if args.command == "serve":
+        # `pg_mvt.db` reads the database settings on import
+        os.environ["PG_MVT_DATABASE_URL"] = args.database_url
+        from pg_mvt.server import serve
+
+        serve(
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            precompute_tms=args.precompute_tms,
+            log_level=args.log_level,
+        )
+        return
+
+    result = asyncio.run(_heavy_tiles(args))
+    if args.json:
+        print(json.dumps(result))
+    else:
+        _print_heavy_tiles(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""pg_mvt.cluster: Peer-to-peer tile cache (cluster mode).
+
+Each node of the cluster owns a shard of the tile keys (consistent hashing of
+the cache keys on the peers' urls). On a cache miss, a node fetches the tile
+from the owner node, which renders it once (and caches it) for the whole
+cluster. Peers requests are regular tile requests with the `X-PG-MVT-Peer`
+header, so the owner renders the tile itself instead of forwarding it.
+
+e.g two nodes on one machine (the tile cache must be enabled):
+
+    PG_MVT_CACHE_DISABLE=FALSE \
+    PG_MVT_CACHE_PEERS='["http://127.0.0.1:8081","http://127.0.0.1:8082"]' \
+    PG_MVT_CACHE_PEER_SELF=http://127.0.0.1:8081 uvicorn pg_mvt.main:app --port 8081
+
+    PG_MVT_CACHE_DISABLE=FALSE \
+    PG_MVT_CACHE_PEERS='["http://127.0.0.1:8081","http://127.0.0.1:8082"]' \
+    PG_MVT_CACHE_PEER_SELF=http://127.0.0.1:8082 uvicorn pg_mvt.main:app --port 8082
+
+"""
+
+import asyncio
+import bisect
+import hashlib
+import warnings
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, urlsplit
+
+from pg_mvt.settings import CacheSettings
+
+PEER_HEADER = "X-PG-MVT-Peer"
+
+# Errors of `http_get` requests (connection, timeout, truncated or invalid response)
+HTTP_ERRORS = (
+    OSError,
+    asyncio.IncompleteReadError,
+    asyncio.TimeoutError,
+    ValueError,
+    IndexError,
+)
+
+# Set while handling a peer's request (the tile is rendered, not forwarded)
+peer_request: ContextVar[bool] = ContextVar("peer_request", default=False)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent hashing ring.
+
+    Attributes:
+        nodes (list): Nodes.
+        replicas (int): Number of points of each node on the ring.
+
+    """
+
+    def __init__(self, nodes: Sequence[str], replicas: int = 64):
+        """Create ring."""
+        self.nodes = list(nodes)
+        self.replicas = replicas
+        points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        """Return the node owning a key."""
+        idx = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[idx]
+
+
+def peer_url(peer: str, key: str) -> str:
+    """Return a peer's url of a tile (from the tile's cache key)."""
+    path, _, query = key.partition("?")
+    layer_id, tms_id, z, x, y = path.rsplit("/", 4)
+    url = (
+        f"{peer.rstrip('/')}/tiles/{tms_id}/{quote(layer_id, safe='')}/{z}/{x}/{y}.pbf"
+    )
+    return f"{url}?{query}" if query else url
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+    """Read an HTTP/1.1 response body."""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+        return body
+
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"]))
+
+    return await reader.read()
+
+
+async def read_response(
+    reader: asyncio.StreamReader,
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Read an HTTP/1.1 response.
+
+    Returns:
+        tuple: Response status code, headers (lower case names) and body.
+
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before the response")
+
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    return status, headers, await _read_body(reader, headers)
+
+
+async def http_get(
+    url: str, headers: Sequence[Tuple[str, str]] = ()
+) -> Tuple[int, bytes]:
+    """Send a GET request (HTTP/1.1, one connection per request).
+
+    Returns:
+        tuple: Response status code and body.
+
+    """
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+
+    reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=https)
+    try:
+        request = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        request += [f"{name}: {value}" for name, value in headers]
+        request += ["Connection: close", "", ""]
+        writer.write("\r\n".join(request).encode())
+        await writer.drain()
+
+        status, _, body = await read_response(reader)
+        return status, body
+    finally:
+        writer.close()
+
+
+class Cluster:
+    """Cluster of pg_mvt nodes sharing their tile caches.
+
+    Attributes:
+        peers (list): Nodes' base urls (including this node).
+        self_url (str): This node's base url.
+        timeout (float): Peer requests timeout, in seconds.
+
+    """
+
+    def __init__(
+        self,
+        peers: Sequence[str],
+        self_url: str,
+        replicas: int = 64,
+        timeout: float = 2.0,
+    ):
+        """Create cluster."""
+        self.peers = list(peers)
+        self.self_url = self_url
+        self.timeout = timeout
+        self.ring = HashRing(self.peers, replicas=replicas)
+
+    def owner(self, key: str) -> Optional[str]:
+        """Return the url of the peer owning a tile, None if this node owns it."""
+        owner = self.ring.owner(key)
+        return None if owner == self.self_url else owner
+
+    async def fetch(self, peer: str, key: str) -> Optional[bytes]:
+        """Fetch a tile from a peer (None if the peer failed)."""
+        try:
+            status, content = await asyncio.wait_for(
+                http_get(peer_url(peer, key), headers=[(PEER_HEADER, "1")]),
+                self.timeout,
+            )
+        except HTTP_ERRORS:
+            return None
+
+        return content if status == 200 else None
+
+
+@lru_cache()
+def get_cluster() -> Optional[Cluster]:
+    """Return the cluster (None if cluster mode is disabled)."""
+    settings = CacheSettings()
+    if not settings.peers or not settings.peer_self:
+        return None
+
+    if settings.disable:
+        warnings.warn(
+            "Cluster mode with the tile cache disabled (PG_MVT_CACHE_DISABLE): "
+            "tiles are rendered by their owner for each request.",
+            RuntimeWarning,
+        )
+
+    self_url = settings.peer_self.rstrip("/")
+    peers: List[str] = list(
+        dict.fromkeys([*(p.rstrip("/") for p in settings.peers), self_url])
+    )
+    return Cluster(
+        peers,
+        self_url,
+        replicas=settings.peer_replicas,
+        timeout=settings.peer_timeout,
+    )
@@ -0,0 +1,208 @@
+"""pg_mvt.dataset: In-memory vector datasets (GeoParquet, FlatGeobuf, ...)."""
+
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pg_mvt.errors import InvalidDataset
+
+try:
+    import numpy
+    import pyarrow
+    import pyarrow.parquet
+    import shapely
+    from pyproj import CRS, Transformer
+except ImportError:  # pragma: nocover
+    numpy = None  # type: ignore
+    pyarrow = None  # type: ignore
+    shapely = None  # type: ignore
+    CRS = None  # type: ignore
+    Transformer = None  # type: ignore
+
+try:
+    import pyogrio
+except ImportError:  # pragma: nocover
+    pyogrio = None  # type: ignore
+
+
+# Map of Arrow types to PostgreSQL `udt_name` (same as the Table properties)
+ARROW_TYPES = {
+    "int8": "int2",
+    "int16": "int2",
+    "int32": "int4",
+    "int64": "int8",
+    "uint8": "int2",
+    "uint16": "int4",
+    "uint32": "int8",
+    "uint64": "int8",
+    "float": "float4",
+    "double": "float8",
+    "bool": "bool",
+    "string": "text",
+    "large_string": "text",
+    "date32[day]": "date",
+}
+
+GEOMETRY_TYPES = {
+    0: "POINT",
+    1: "LINESTRING",
+    2: "LINESTRING",
+    3: "POLYGON",
+    4: "MULTIPOINT",
+    5: "MULTILINESTRING",
+    6: "MULTIPOLYGON",
+    7: "GEOMETRYCOLLECTION",
+}
+
+
+def _read_geoparquet(path: str) -> Tuple["pyarrow.Table", str, "CRS"]:
+    """Read GeoParquet file."""
+    try:
+        table = pyarrow.parquet.read_table(path)
+    except pyarrow.ArrowException as e:
+        raise InvalidDataset(f"{path} is not a valid Parquet file: {e}") from e
+
+    metadata = table.schema.metadata or {}
+    if b"geo" not in metadata:
+        raise InvalidDataset(f"{path} is not a GeoParquet file.")
+
+    geo = json.loads(metadata[b"geo"])
+    geometry_column = geo["primary_column"]
+    column_metadata = geo["columns"][geometry_column]
+    if column_metadata.get("encoding", "WKB").upper() != "WKB":
+        raise InvalidDataset(f"Unsupported geometry encoding for {path}.")
+
+    # Missing CRS means OGC:CRS84 (GeoParquet specification)
+    crs = column_metadata.get("crs", "OGC:CRS84") or "OGC:CRS84"
+    crs = CRS.from_json_dict(crs) if isinstance(crs, dict) else CRS.from_user_input(crs)
+
+    return table, geometry_column, crs
+
+
+def _read_ogr(path: str) -> Tuple["pyarrow.Table", str, "CRS"]:
+    """Read OGR supported file (e.g FlatGeobuf)."""
+    assert pyogrio is not None, "'pyogrio' must be installed to read non-parquet files"
+
+    try:
+        meta, table = pyogrio.read_arrow(path)
+    except pyogrio.errors.DataSourceError as e:
+        raise InvalidDataset(f"{path} is not a supported dataset: {e}") from e
+    crs = CRS.from_user_input(meta["crs"]) if meta.get("crs") else CRS("OGC:CRS84")
+
+    return table, meta.get("geometry_name") or "wkb_geometry", crs
+
+
+class Dataset:
+    """In-memory vector dataset.
+
+    Geometries are stored as a shapely array indexed with an STR-tree and the
+    attributes are kept in columnar (Arrow) arrays.
+
+    Attributes:
+        path (str): Dataset path.
+        geometries (numpy.ndarray): Geometries (shapely).
+        attributes (pyarrow.Table): Attributes.
+        crs (pyproj.CRS): Dataset's CRS.
+        tree (shapely.STRtree): Spatial index.
+        geometry_type (str): Geometry type (e.g MULTIPOLYGON).
+        properties (dict): Properties name and types.
+        bounds (list): Dataset's bounds in WGS84.
+
+    """
+
+    def __init__(self, path: str):
+        """Load dataset in memory and create its spatial index."""
+        assert shapely is not None, "'shapely' and 'pyarrow' must be installed"
+
+        self.path = path
+
+        if path.lower().endswith((".parquet", ".geoparquet")):
+            table, geometry_column, self.crs = _read_geoparquet(path)
+        else:
+            table, geometry_column, self.crs = _read_ogr(path)
+
+        self.crs_wkt = self.crs.to_wkt()
+        self.geometries = shapely.from_wkb(
+            numpy.asarray(table.column(geometry_column).to_pylist(), dtype=object)
+        )
+        self.attributes = table.drop([geometry_column])
+        self.tree = shapely.STRtree(self.geometries)
+
+        self.properties = {
+            field.name: ARROW_TYPES.get(str(field.type), str(field.type))
+            for field in self.attributes.schema
+        }
+
+        valid = self.geometries[~shapely.is_missing(self.geometries)]
+        types = set(shapely.get_type_id(valid).tolist())
+        self.geometry_type = (
+            GEOMETRY_TYPES[types.pop()] if len(types) == 1 else "GEOMETRY"
+        )
+
+        if len(self.geometries):
+            to_wgs84 = Transformer.from_crs(self.crs, "epsg:4326", always_xy=True)
+            left, bottom, right, top = shapely.total_bounds(self.geometries)
+            self.bounds = list(
+                to_wgs84.transform_bounds(left, bottom, right, top, densify_pts=21)
+            )
+        else:
+            self.bounds = [-180.0, -90.0, 180.0, 90.0]
+
+        self._transformers: Dict[str, "Transformer"] = {}
+
+    def query(
+        self,
+        bbox: Sequence[float],
+        bbox_crs: "CRS",
+        bbox_crs_id: str,
+        limit: Optional[int] = None,
+    ) -> "numpy.ndarray":
+        """Return indices of the features intersecting the bbox.
+
+        Args:
+            bbox (sequence): Bounding box (left, bottom, right, top).
+            bbox_crs (pyproj.CRS): CRS of the bounding box.
+            bbox_crs_id (str): Identifier for the CRS (used as cache key, e.g TMS identifier).
+            limit (int, optional): Maximum number of features to return.
+
+        """
+        transformer = self._transformers.get(bbox_crs_id)
+        if transformer is None:
+            transformer = Transformer.from_crs(bbox_crs, self.crs, always_xy=True)
+            self._transformers[bbox_crs_id] = transformer
+
+        left, bottom, right, top = bbox
+        bounds = transformer.transform_bounds(left, bottom, right, top, densify_pts=21)
+        indices = self.tree.query(shapely.box(*bounds), predicate="intersects")
+        indices.sort()
+
+        if limit is not None:
+            indices = indices[:limit]
+
+        return indices
+
+    def wkb(self, indices: "numpy.ndarray") -> "numpy.ndarray":
+        """Return WKB geometries for the features."""
+        return shapely.to_wkb(self.geometries[indices])
+
+    def rows(self, indices: "numpy.ndarray", columns: Sequence[str]) -> List[Dict]:
+        """Return properties for the features."""
+        if not columns:
+            return [{} for _ in indices]
+
+        subset = self.attributes.select(list(columns)).take(pyarrow.array(indices))
+        return subset.to_pylist()
+
+
+@lru_cache(maxsize=16)
+def _open_dataset(path: str, mtime: float) -> Dataset:
+    return Dataset(path)
+
+
+def open_dataset(path: str) -> Dataset:
+    """Open (and cache) a dataset, reloading it when the file changes."""
+    if not os.path.exists(path):
+        raise InvalidDataset(f"{path} does not exist.")
+
+    return _open_dataset(path, os.path.getmtime(path))
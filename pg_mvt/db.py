@@ -1,16 +1,27 @@
 """pg_mvt.db: database events."""
 
+import asyncio
+import hashlib
 import json
-from typing import Sequence
+import warnings
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
 
 from buildpg import asyncpg
 
-from pg_mvt.settings import PgSettings
+from pg_mvt.functions import registry as FunctionRegistry
+from pg_mvt.layer import Layer, Table
+from pg_mvt.purge import purge_hooks, purged
+from pg_mvt.settings import CacheSettings, PgSettings
 
 from starlite import Starlite
 
 pg_settings = PgSettings()
 
+# Catalog loaded by the parent process of the pre-fork server (`pg_mvt serve`)
+# and inherited by the workers
+shared_catalog: Optional[Sequence[Dict]] = None
+
 
 async def table_index(db_pool: asyncpg.BuildPgPool) -> Sequence:
     """Fetch Table index."""
@@ -51,7 +62,24 @@ async def table_index(db_pool: asyncpg.BuildPgPool) -> Sequence:
                                 ST_MakeEnvelope(-180, -90, 180, 90, 4326)
                             ) as geom
                     ) AS extent
-                ) AS bounds
+                ) AS bounds,
+                (
+                    SELECT
+                        jsonb_build_object(
+                            'geometry_index', coalesce(bool_or(am.amname IS NOT NULL), false),
+                            'clustered', coalesce(bool_or(i.indisclustered AND am.amname IS NOT NULL), false),
+                            'row_estimate', max(c.reltuples)::bigint
+                        )
+                    FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    LEFT JOIN pg_index i ON i.indrelid = c.oid
+                    LEFT JOIN pg_class ic ON ic.oid = i.indexrelid
+                    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = ANY(i.indkey)
+                    LEFT JOIN pg_am am ON am.oid = ic.relam
+                        AND am.amname IN ('gist', 'spgist', 'brin')
+                        AND a.attname = f_geometry_column
+                    WHERE n.nspname = f_table_schema AND c.relname = f_table_name
+                ) AS stats
             FROM
                 information_schema.columns,
                 geo_tables
@@ -77,7 +105,7 @@ async def table_index(db_pool: asyncpg.BuildPgPool) -> Sequence:
                         'geometry_type', type,
                         'properties', coldict,
                         'bounds', bounds
-                    )
+                    ) || coalesce(stats, '{}'::jsonb)
                 )
             FROM t
             ;
@@ -88,18 +116,165 @@ async def table_index(db_pool: asyncpg.BuildPgPool) -> Sequence:
     return json.loads(content)
 
 
-async def connect_to_db(app: Starlite) -> None:
-    """Connect."""
+async def table_versions(db_pool: asyncpg.BuildPgPool) -> Dict[str, str]:
+    """Fetch tables' data version tokens.
+
+    The token changes with the table's file node (e.g `TRUNCATE`, `VACUUM FULL`
+    or `REFRESH MATERIALIZED VIEW`) and the cumulative number of inserted,
+    updated and deleted rows (statistics collector). Views and partitioned
+    tables are not tracked.
+
+    """
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT
+                concat(n.nspname, '.', c.relname) AS id,
+                concat_ws(':', c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del) AS state
+            FROM geometry_columns g
+            JOIN pg_namespace n ON n.nspname = g.f_table_schema
+            JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = g.f_table_name
+            LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+            WHERE c.relkind IN ('r', 'm')
+            """
+        )
+
+    return {
+        r["id"]: hashlib.blake2b(r["state"].encode(), digest_size=6).hexdigest()
+        for r in rows
+    }
+
+
+def set_table_versions(app: Starlite, versions: Dict[str, str]) -> List[str]:
+    """Update the catalog's data versions, return the ids of the changed tables."""
+    changed = []
+    for r in app.state.table_catalog:
+        version = versions.get(r["id"])
+        if r.get("version") != version:
+            r["version"] = version
+            changed.append(r["id"])
+
+    return changed
+
+
+async def watch_table_versions(app: Starlite, interval: float) -> None:
+    """Refresh the tables' data versions every `interval` seconds.
+
+    The catalog version is incremented when a table has changed so the cached
+    catalog and TileJSON documents reference the new data versions, the changed
+    tables' tiles are removed from the tile cache and a purge event is emitted
+    for their surrogate keys.
+
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            versions = await table_versions(app.state.pool)
+        except Exception:  # database unavailable, retry later
+            continue
+
+        changed = set_table_versions(app, versions)
+        if changed:
+            app.state.catalog_version += 1
+            # Invalidate the local cache first so the CDN doesn't refetch stale tiles
+            app.state.cache.invalidate(partial(purged, keys=changed))
+            try:
+                await purge_hooks.emit(changed)
+            except Exception as e:
+                warnings.warn(f"Purge hook failed: {e!r}", RuntimeWarning)
+
+
+async def connect_to_db(
+    app: Starlite,
+    init: Optional[Callable[[asyncpg.BuildPgConnection], Awaitable]] = None,
+) -> None:
+    """Connect.
+
+    Args:
+        app (Starlite): Starlite application.
+        init (callable, optional): Coroutine called on each new connection
+            (defaults to `PG_MVT_DB_CONNECTION_INIT`).
+
+    """
+    init = init or pg_settings.db_connection_init
     app.state.pool = await asyncpg.create_pool_b(
         pg_settings.connection_string,
         min_size=pg_settings.db_min_conn_size,
         max_size=pg_settings.db_max_conn_size,
         max_queries=pg_settings.db_max_queries,
         max_inactive_connection_lifetime=pg_settings.db_max_idle,
+        server_settings=pg_settings.db_server_settings or None,
+        init=init,
     )
-    app.state.table_catalog = await table_index(app.state.pool)
+
+    # Refresh-ahead renders use their own connections, so they are not queued
+    # behind the requests when the pool is saturated
+    cache_settings = CacheSettings()
+    app.state.refresh_pool = None
+    if not cache_settings.disable and cache_settings.refresh_ahead > 0:
+        app.state.refresh_pool = await asyncpg.create_pool_b(
+            pg_settings.connection_string,
+            min_size=0,
+            max_size=cache_settings.refresh_connections,
+            max_inactive_connection_lifetime=pg_settings.db_max_idle,
+            server_settings=pg_settings.db_server_settings or None,
+            init=init,
+        )
+
+    if shared_catalog is not None:
+        # Loaded, with the data versions, and checked by the parent process
+        app.state.table_catalog = shared_catalog
+    else:
+        app.state.table_catalog = await table_index(app.state.pool)
+        set_table_versions(app, await table_versions(app.state.pool))
+        if pg_settings.db_unindexed_tables != "ignore":
+            check_tables(app.state.table_catalog, pg_settings.db_unindexed_min_rows)
+
+    # Catalog version, used as cache key for the catalog documents
+    app.state.catalog_version = getattr(app.state, "catalog_version", 0) + 1
+
+    if pg_settings.db_warmup_layers:
+        catalog = {r["id"]: r for r in app.state.table_catalog}
+        layers = [
+            FunctionRegistry.get(id) or Table(**catalog[id])
+            for id in pg_settings.db_warmup_layers
+            if FunctionRegistry.get(id) or id in catalog
+        ]
+        await warmup(app.state.pool, layers)
+
+
+def check_tables(catalog: Sequence[Dict], min_rows: int) -> None:
+    """Warn about tables without spatial index and more than `min_rows` rows."""
+    for r in catalog:
+        table = Table(**r)
+        if table.is_unindexed(min_rows):
+            warnings.warn(
+                f"Table '{table.id}' ({table.row_estimate} rows) has no spatial index "
+                f"on '{table.geometry_column}'.",
+                UserWarning,
+            )
+
+
+async def warmup(db_pool: asyncpg.BuildPgPool, layers: Sequence[Layer]) -> None:
+    """Prepare the layers' queries on `min_size` connections of the pool.
+
+    Args:
+        db_pool (asyncpg.BuildPgPool): AsyncPG database connection pool.
+        layers (list): Layers to prepare.
+
+    """
+
+    async def _prepare():
+        async with db_pool.acquire() as conn:
+            for layer in layers:
+                await layer.prepare(conn)
+
+    # Hold connections concurrently so each of them is prepared
+    await asyncio.gather(*[_prepare() for _ in range(db_pool.get_min_size())])
 
 
 async def close_db_connection(app: Starlite) -> None:
     """Close connection."""
     await app.state.pool.close()
+    if getattr(app.state, "refresh_pool", None) is not None:
+        await app.state.refresh_pool.close()
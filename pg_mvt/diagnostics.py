@@ -0,0 +1,357 @@
+"""pg_mvt.diagnostics: Layer diagnostics."""
+
+import json
+import time
+from typing import Any, Dict, Iterable, List
+
+from buildpg import Var as pg_variable
+from buildpg import asyncpg, funcs, render
+from buildpg.components import RawDangerous
+from buildpg.logic import SqlBlock
+from morecantile import Tile, TileMatrixSet
+
+from pg_mvt.filters import parse_filter, to_sql
+from pg_mvt.layer import Table, set_local
+from pg_mvt.settings import PgSettings
+from pg_mvt.tms import get_context
+
+# WebMercatorQuad extent, in degrees
+WORLD_WIDTH = 360.0
+WORLD_HEIGHT = 2 * 85.051129
+
+
+def table_diagnostics(table: Table, min_rows: int = 100000) -> Dict:
+    """Return a table's spatial index information and expected tile cost.
+
+    The cost is the number of rows expected to be read to create a tile at the
+    layer's min zoom: the rows intersecting a tile (assuming evenly distributed
+    features within the table's bounds) when the geometry column is indexed,
+    or every row of the table otherwise (sequential scan).
+
+    Args:
+        table (Table): Table layer.
+        min_rows (int): Tables with fewer rows are not reported as unindexed.
+
+    Returns:
+        dict: Table's diagnostics.
+
+    """
+    rows = max(table.row_estimate or 0, 0)
+
+    cost = float(rows)
+    if table.geometry_index:
+        left, bottom, right, top = table.bounds
+        area = max(right - left, 1e-9) * max(top - bottom, 1e-9)
+        tile_area = (WORLD_WIDTH * WORLD_HEIGHT) / 4 ** max(table.minzoom, 0)
+        cost = rows * min(1.0, tile_area / area)
+
+    issues: List[str] = []
+    if table.geometry_index is False:
+        issues.append(f"no spatial index on '{table.geometry_column}'")
+        if table.is_unindexed(min_rows):
+            issues.append("large table without spatial index")
+    elif table.geometry_index and not table.clustered and rows >= min_rows:
+        issues.append("table is not clustered on its spatial index")
+    if table.row_estimate is not None and table.row_estimate < 0:
+        issues.append("table has never been analyzed")
+
+    return {
+        "id": table.id,
+        "geometry_column": table.geometry_column,
+        "geometry_index": table.geometry_index,
+        "clustered": table.clustered,
+        "row_estimate": table.row_estimate,
+        "minzoom": table.minzoom,
+        "rows_per_tile": int(cost),
+        "issues": issues,
+    }
+
+
+def rank_tables(tables: Iterable[Table], min_rows: int = 100000) -> List[Dict]:
+    """Return tables' diagnostics, sorted by expected tile cost (highest first)."""
+    return sorted(
+        (table_diagnostics(table, min_rows=min_rows) for table in tables),
+        key=lambda d: d["rows_per_tile"],
+        reverse=True,
+    )
+
+
+# Last statement of the `Table` tile query and the statements used to time the
+# query stages (each stage includes the previous ones).
+TILE_SELECT = "SELECT ST_AsMVT(mvtgeom.*) FROM mvtgeom"
+TILE_STAGES = {
+    "envelope": "SELECT count(geom) FROM bounds_tmscrs",
+    "transform": "SELECT count(geom) FROM bounds_geomcrs",
+    "asmvtgeom": "SELECT count(geom) FROM mvtgeom",
+    "asmvt": TILE_SELECT,
+}
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _param(value: Any) -> Any:
+    """Return JSON serializable query parameter."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+async def explain_tile(
+    pool: asyncpg.BuildPgPool,
+    table: Table,
+    tile: Tile,
+    tms: TileMatrixSet,
+    **kwargs: Any,
+) -> Dict:
+    """Return the SQL, query plan and timings of a Table tile.
+
+    The tile query is run once as it is when serving the tile (same layer's
+    settings), then with `EXPLAIN (ANALYZE, BUFFERS)` and finally once for each
+    of its stages to time them. Stages timings are the differences between
+    the execution times of consecutive stages, so they are only indicative.
+
+    Args:
+        pool (asyncpg.BuildPgPool): AsyncPG database connection pool.
+        table (Table): Table layer.
+        tile (Tile): Tile object with X,Y,Z indices.
+        tms (TileMatrixSet): Tile Matrix Set.
+        kwargs (any, optional): Tile query parameters (e.g `limit`, `filter`).
+
+    Returns:
+        dict: SQL, parameters, plan and timings (in milliseconds).
+
+    """
+    start = time.perf_counter()
+    q, p = table.tile_query(tile, tms, **kwargs)
+    build_time = time.perf_counter() - start
+
+    prefix, _, _ = q.rpartition(TILE_SELECT)
+    settings = PgSettings().db_layer_settings.get(table.id) or {}
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if settings:
+                await set_local(conn, settings)
+
+            start = time.perf_counter()
+            content = await conn.fetchval(q, *p)
+            fetch_time = time.perf_counter() - start
+
+            explain = await conn.fetchval(
+                f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {q}", *p
+            )
+            plan = (json.loads(explain) if isinstance(explain, str) else explain)[0]
+
+            stages: Dict[str, float] = {}
+            previous = 0.0
+            for name, select in TILE_STAGES.items():
+                explain = await conn.fetchval(
+                    f"EXPLAIN (ANALYZE, FORMAT JSON) {prefix}{select}", *p
+                )
+                explain = json.loads(explain) if isinstance(explain, str) else explain
+                duration = explain[0]["Execution Time"]
+                stages[name] = round(max(duration - previous, 0.0), 3)
+                previous = duration
+
+    server_time = plan["Planning Time"] + plan["Execution Time"]
+
+    return {
+        "id": table.id,
+        "tms": tms.identifier,
+        "tile": {"z": tile.z, "x": tile.x, "y": tile.y},
+        "sql": q,
+        "params": [_param(v) for v in p],
+        "settings": settings,
+        "size": len(content or b""),
+        "plan": plan,
+        "stages": stages,
+        "timings": {
+            "query_build": _ms(build_time),
+            "fetch": _ms(fetch_time),
+            "planning": plan["Planning Time"],
+            "execution": plan["Execution Time"],
+            # Time spent outside of the database (driver, network, event loop)
+            "client_overhead": round(max(_ms(fetch_time) - server_time, 0.0), 3),
+        },
+    }
+
+
+async def heavy_tiles(
+    pool: asyncpg.BuildPgPool,
+    table: Table,
+    zoom: int,
+    tms: TileMatrixSet,
+    limit: int = 100,
+    grid_size: int = 16,
+    **kwargs: Any,
+) -> Dict:
+    """Rank a Table's tiles by feature and vertex count for a zoom level.
+
+    Features are mapped to the keys of the tiles their bounding box intersects
+    and aggregated in a single SQL query (tiles are not rendered). A feature's
+    vertices are counted in each tile it intersects.
+
+    Args:
+        pool (asyncpg.BuildPgPool): AsyncPG database connection pool.
+        table (Table): Table layer.
+        zoom (int): Zoom level.
+        tms (TileMatrixSet): Tile Matrix Set.
+        limit (int): Number of tiles to return.
+        grid_size (int): Maximum heatmap width and height (in cells).
+        kwargs (any, optional): `filter` and `filter-lang` options.
+
+    Returns:
+        dict: Ranked tiles, summary, histogram of vertex counts (power of 2
+            buckets) and heatmap (vertex count per cell of tiles).
+
+    """
+    ctx = get_context(tms)
+
+    # We only support TMS with valid EPSG code
+    if not ctx.epsg:
+        raise Exception(f"{tms.identifier}'s CRS does not have a valid EPSG code.")
+
+    origin_x, origin_y, tile_width, tile_height = ctx.matrix(zoom)
+    matrix = tms.matrix(zoom)
+    width, height = matrix.matrixWidth, matrix.matrixHeight
+    cell_x = -(-width // grid_size)
+    cell_y = -(-height // grid_size)
+
+    where = SqlBlock(RawDangerous("TRUE"))
+    if kwargs.get("filter"):
+        cols = {k: v for k, v in table.properties.items() if k != table.geometry_column}
+        expr = parse_filter(kwargs["filter"], kwargs.get("filter-lang", "cql2-text"))
+        where = to_sql(expr, cols, alias="t")
+
+    sql_query = """
+        WITH
+        bounds_geomcrs AS (
+            SELECT
+                ST_Transform(
+                    ST_Segmentize(
+                        ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, :tms_srid),
+                        :seg_size
+                    ),
+                    :geometry_srid
+                ) AS geom
+        ),
+        features AS (
+            SELECT
+                ST_Transform(
+                    ST_ClipByBox2D(ST_Envelope(t.:geometry_column), bounds_geomcrs.geom::box2d),
+                    :tms_srid
+                ) AS bbox,
+                ST_NPoints(t.:geometry_column) AS npoints
+            FROM :tablename t, bounds_geomcrs
+            WHERE ST_Intersects(t.:geometry_column, bounds_geomcrs.geom)
+            AND :where
+        ),
+        keys AS (
+            SELECT
+                greatest(floor((ST_XMin(bbox) - :origin_x) / :tile_width), 0)::int AS x0,
+                least(floor((ST_XMax(bbox) - :origin_x) / :tile_width), :max_x)::int AS x1,
+                greatest(floor((:origin_y - ST_YMax(bbox)) / :tile_height), 0)::int AS y0,
+                least(floor((:origin_y - ST_YMin(bbox)) / :tile_height), :max_y)::int AS y1,
+                npoints
+            FROM features
+        ),
+        tiles AS (
+            SELECT x, y, count(*) AS features, sum(npoints)::bigint AS vertices
+            FROM keys, generate_series(x0, x1) AS x, generate_series(y0, y1) AS y
+            GROUP BY x, y
+        )
+        SELECT jsonb_build_object(
+            'tiles', (
+                SELECT coalesce(jsonb_agg(r), '[]'::jsonb)
+                FROM (
+                    SELECT x, y, features, vertices
+                    FROM tiles
+                    ORDER BY vertices DESC, features DESC
+                    LIMIT :limit
+                ) r
+            ),
+            'summary', (
+                SELECT jsonb_build_object(
+                    'tiles', count(*),
+                    'features', coalesce(sum(features), 0),
+                    'vertices', coalesce(sum(vertices), 0),
+                    'max_features', max(features),
+                    'max_vertices', max(vertices),
+                    'p50_vertices', percentile_disc(0.5) WITHIN GROUP (ORDER BY vertices),
+                    'p90_vertices', percentile_disc(0.9) WITHIN GROUP (ORDER BY vertices),
+                    'p99_vertices', percentile_disc(0.99) WITHIN GROUP (ORDER BY vertices)
+                )
+                FROM tiles
+            ),
+            'histogram', (
+                SELECT coalesce(jsonb_agg(h ORDER BY h.vertices), '[]'::jsonb)
+                FROM (
+                    SELECT
+                        (2 ^ floor(log(2, greatest(vertices, 1)::numeric)))::bigint AS vertices,
+                        count(*) AS tiles
+                    FROM tiles
+                    GROUP BY 1
+                ) h
+            ),
+            'heatmap', (
+                SELECT coalesce(jsonb_agg(g), '[]'::jsonb)
+                FROM (
+                    SELECT x / :cell_x AS x, y / :cell_y AS y, sum(vertices) AS vertices
+                    FROM tiles
+                    GROUP BY 1, 2
+                ) g
+            )
+        )
+    """
+    q, p = render(
+        sql_query,
+        tablename=pg_variable(table.id),
+        geometry_column=pg_variable(table.geometry_column),
+        xmin=origin_x,
+        ymin=origin_y - height * tile_height,
+        xmax=origin_x + width * tile_width,
+        ymax=origin_y,
+        seg_size=tile_width,
+        tms_srid=ctx.epsg,
+        geometry_srid=funcs.cast(table.geometry_srid, "int"),
+        origin_x=origin_x,
+        origin_y=origin_y,
+        tile_width=tile_width,
+        tile_height=tile_height,
+        max_x=width - 1,
+        max_y=height - 1,
+        cell_x=cell_x,
+        cell_y=cell_y,
+        where=where,
+        limit=limit,
+    )
+
+    async with pool.acquire() as conn:
+        content = await conn.fetchval(q, *p)
+
+    result = json.loads(content) if isinstance(content, str) else content
+
+    heatmap = [[0] * -(-width // cell_x) for _ in range(-(-height // cell_y))]
+    for cell in result["heatmap"]:
+        heatmap[cell["y"]][cell["x"]] = cell["vertices"]
+
+    return {
+        "id": table.id,
+        "tms": tms.identifier,
+        "zoom": zoom,
+        "tiles": [
+            {
+                "z": zoom,
+                "x": t["x"],
+                "y": t["y"],
+                "features": t["features"],
+                "vertices": t["vertices"],
+            }
+            for t in result["tiles"]
+        ],
+        "summary": result["summary"],
+        "histogram": result["histogram"],
+        "heatmap": {"cell": [cell_x, cell_y], "vertices": heatmap},
+    }
@@ -1,5 +1,11 @@
 """pg_mvt.errors: Error classes."""
 
+from typing import Callable, Dict, Type
+
+from morecantile.errors import InvalidIdentifier
+
+from starlite import MediaType, Request, Response
+
 
 class TilerError(Exception):
     """Base exception class."""
@@ -7,3 +13,55 @@ class TilerError(Exception):
 
 class TableNotFound(TilerError):
     """Invalid table name."""
+
+
+class InvalidFilter(TilerError):
+    """Invalid filter expression."""
+
+
+class TileNotFound(TilerError):
+    """Tile outside of the TileMatrixSet's matrix."""
+
+
+class UnindexedTable(TilerError):
+    """Table without spatial index (refused by the server's policy)."""
+
+
+class InvalidArchive(TilerError):
+    """Invalid or unsupported tile archive."""
+
+
+class InvalidDataset(TilerError):
+    """Invalid or unsupported vector dataset."""
+
+
+DEFAULT_STATUS_CODES: Dict[Type[Exception], int] = {
+    TableNotFound: 404,
+    InvalidFilter: 400,
+    InvalidIdentifier: 404,
+    TileNotFound: 404,
+    UnindexedTable: 503,
+    # Registered files which were removed or replaced by unsupported files
+    InvalidArchive: 500,
+    InvalidDataset: 500,
+}
+
+
+def exception_handler_factory(status_code: int) -> Callable:
+    """Create a Starlite exception handler returning `status_code`."""
+
+    def handler(request: Request, exc: Exception) -> Response:
+        return Response(
+            content={"detail": str(exc)},
+            status_code=status_code,
+            media_type=MediaType.JSON,
+        )
+
+    return handler
+
+
+def exception_handlers(
+    status_codes: Dict[Type[Exception], int] = DEFAULT_STATUS_CODES
+) -> Dict:
+    """Return Starlite exception handlers for pg_mvt errors."""
+    return {exc: exception_handler_factory(code) for exc, code in status_codes.items()}
@@ -1,27 +1,52 @@
 """pg_mvt.factory: router factories."""
 
 import json
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import os
+from functools import lru_cache, partial
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 from urllib.parse import urlencode
 
 from morecantile import Tile, TileMatrixSet
 
+from pg_mvt import flatgeobuf
+from pg_mvt.cache import cache_key
+from pg_mvt.cluster import PEER_HEADER, peer_request
 from pg_mvt.dependencies import (
     LayerParams,
     TileMatrixSetNames,
     TileMatrixSetParams,
     TileParams,
 )
+from pg_mvt.diagnostics import explain_tile, heavy_tiles, rank_tables
 from pg_mvt.functions import registry as FunctionRegistry
-from pg_mvt.layer import Function, Layer, Table
+from pg_mvt.layer import Archive, FileTable, Function, Layer, Table
 from pg_mvt.models.mapbox import TileJSON
 from pg_mvt.models.OGC import TileMatrixSetList
+from pg_mvt.purge import purge_hooks, purge_keys, purged, surrogate_keys
+from pg_mvt.settings import APISettings, PgSettings
+from pg_mvt.tiles import get_tile
 
-from starlite import Parameter, Provide, Request, controller, get
+from starlite import HTTPException, MediaType, Parameter, Provide, Request
+from starlite import Response as JSONResponse
+from starlite import controller, get, post
 
 from starlette.datastructures import QueryParams, URLPath
+from starlette.responses import Response, StreamingResponse
 from starlette.routing import NoMatchFound, compile_path
-from starlette.templating import Jinja2Templates
 
 try:
     from importlib.resources import files as resources_files  # type: ignore
@@ -30,7 +55,19 @@ except ImportError:
     from importlib_resources import files as resources_files  # type: ignore
 
 
-templates = Jinja2Templates(directory=str(resources_files(__package__) / "templates"))  # type: ignore
+FEATURES_FORMATS = {
+    "geojson": "application/geo+json",
+    "ndjson": "application/x-ndjson",
+    "fgb": "application/flatgeobuf",
+}
+
+
+@lru_cache()
+def get_templates() -> Any:
+    """Return the HTML templates (Jinja2 is imported on the first HTML request)."""
+    from starlette.templating import Jinja2Templates
+
+    return Jinja2Templates(directory=str(resources_files(__package__) / "templates"))  # type: ignore
 
 
 def queryparams_to_kwargs(q: QueryParams, ignore_keys: List = []) -> Dict:
@@ -47,6 +84,25 @@ def queryparams_to_kwargs(q: QueryParams, ignore_keys: List = []) -> Dict:
     return values
 
 
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON (same as Starlite responses)."""
+    return JSONResponse(
+        content=content, status_code=200, media_type=MediaType.JSON
+    ).body
+
+
+def parse_bbox(bbox: str) -> List[float]:
+    """Parse a `minx,miny,maxx,maxy` bounding box (HTTP 400 if invalid)."""
+    try:
+        bounds = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        bounds = []
+    if len(bounds) != 4:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox '{bbox}'.")
+
+    return bounds
+
+
 def replace_params(
     path: str,
     path_params: Dict[str, str],
@@ -66,6 +122,8 @@ def replace_params(
 class Controller(controller.Controller):
     """Custom controller class."""
 
+    _reverse_routes: Optional[Dict[str, List[Tuple[str, Set[str]]]]] = None
+
     def url_for(self, request: Request, name: str, **path_params: Any) -> str:
         """Return full url (with prefix) for a specific endpoint."""
         url_path = self.url_path_for(name, **path_params)
@@ -76,25 +134,100 @@ class Controller(controller.Controller):
 
         return url_path.make_absolute_url(base_url=base_url)
 
+    def reverse_routes(self) -> Dict[str, List[Tuple[str, Set[str]]]]:
+        """Return reverse routing index (handler name -> [(path format, path params)]).
+
+        The index is computed once per controller class.
+
+        """
+        cls = type(self)
+        index = cls.__dict__.get("_reverse_routes")
+        if index is None:
+            index = {}
+            for route in self.get_route_handlers():
+                _, path_format, param_convertors = compile_path(route.path)
+                index.setdefault(route.fn.__name__, []).append(
+                    (path_format, set(param_convertors.keys()))
+                )
+            cls._reverse_routes = index
+
+        return index
+
     def url_path_for(self, name: str, **path_params: Any) -> URLPath:
         """return path for a controller handler."""
-        for route in self.get_route_handlers():
-            path_regex, path_format, param_convertors = compile_path(route.path)
-            try:
-                seen_params = set(path_params.keys())
-                expected_params = set(param_convertors.keys())
-
-                if name != route.fn.__name__ or seen_params != expected_params:
-                    raise NoMatchFound()
+        seen_params = set(path_params.keys())
+        for path_format, expected_params in self.reverse_routes().get(name, []):
+            if seen_params != expected_params:
+                continue
 
-                path, remaining_params = replace_params(path_format, path_params)
-                assert not remaining_params
-                return URLPath(path=path, protocol="http")
-            except NoMatchFound:
-                pass
+            path, remaining_params = replace_params(path_format, dict(path_params))
+            assert not remaining_params
+            return URLPath(path=path, protocol="http")
 
         raise NoMatchFound()
 
+    def cached_json(
+        self,
+        request: Request,
+        content: Callable[[], Any],
+        stream: bool = False,
+        data_version: Optional[str] = None,
+    ) -> Response:
+        """Return JSON response, cached for the catalog version and request url.
+
+        Args:
+            request (Request): Starlite request.
+            content (callable): Return the content to serialize (on cache miss).
+            stream (bool): `content` returns an iterable of items, serialized and
+                streamed one by one as a JSON array (on cache miss).
+            data_version (str, optional): Data version of the content (e.g the
+                layer's data version, for files which change between catalog versions).
+
+        Returns:
+            Response: JSON response.
+
+        """
+        version = (
+            getattr(request.app.state, "catalog_version", 0),
+            FunctionRegistry.version,
+            data_version,
+        )
+        cache = request.app.state.documents
+        key = f"{version}:{request.url}"
+
+        body = cache.get(key)
+        if body is not None:
+            return Response(content=body, media_type=MediaType.JSON)
+
+        if not stream:
+            body = dumps(content())
+            cache.set(key, body)
+            return Response(content=body, media_type=MediaType.JSON)
+
+        def _iter() -> Iterator[bytes]:
+            chunks = [b"["]
+            size = 0
+            start = 0
+            for i, item in enumerate(content()):
+                chunk = dumps(item)
+                if i:
+                    chunk = b"," + chunk
+                chunks.append(chunk)
+                size += len(chunk)
+
+                # Send items by batches of ~64KB
+                if size >= 2**16:
+                    yield b"".join(chunks[start:])
+                    start = len(chunks)
+                    size = 0
+
+            chunks.append(b"]")
+            yield b"".join(chunks[start:])
+
+            cache.set(key, b"".join(chunks))
+
+        return StreamingResponse(_iter(), media_type=MediaType.JSON)
+
 
 class TilerEndpoints(Controller):
     """Tiler endpoints."""
@@ -112,18 +245,115 @@ class TilerEndpoints(Controller):
         prefix: str = "",
         tms_dependency: Callable = None,
         layer_dependency: Callable = None,
+        viewer: bool = True,
     ) -> Type["TilerEndpoints"]:
-        """Edit TilerEndpoints class."""
+        """Edit TilerEndpoints class (`viewer=False` removes the HTML viewer)."""
         new_deps = {}
         if tms_dependency:
             new_deps["tms"] = Provide(tms_dependency)
         if layer_dependency:
             new_deps["layer"] = Provide(layer_dependency)
 
-        return type(
-            "TilerEndpoints",
-            (cls,),
-            {"path": prefix, "dependencies": {**cls.dependencies, **new_deps}},
+        attrs: Dict[str, Any] = {
+            "path": prefix,
+            "dependencies": {**cls.dependencies, **new_deps},
+        }
+        if not viewer:
+            attrs["viewer"] = None
+
+        return type("TilerEndpoints", (cls,), attrs)
+
+    async def _tile(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        tile: Tile,
+    ) -> Response:
+        """Return vector tile response."""
+        pool = request.app.state.pool
+        cache = request.app.state.cache
+
+        # NOTE: the data version (`v`) is part of the cache key so a new version
+        # is never served from a tile cached for a previous version.
+        kwargs = queryparams_to_kwargs(
+            request.query_params, ignore_keys=["tilematrixsetid"]
+        )
+        # Requests from cluster peers are rendered, not forwarded
+        token = peer_request.set(PEER_HEADER in request.headers)
+        try:
+            content = await get_tile(
+                pool,
+                cache,
+                layer,
+                tile,
+                tms,
+                refresh_pool=getattr(request.app.state, "refresh_pool", None),
+                **kwargs,
+            )
+        finally:
+            peer_request.reset(token)
+
+        # NOTE: peers' requests are counted by the requesting node, and the tiles
+        # are warmed up for the data version of the next run (not the counted one)
+        popularity = getattr(request.app.state, "popularity", None)
+        if popularity is not None and PEER_HEADER not in request.headers:
+            params = {k: v for k, v in kwargs.items() if k != "v"}
+            popularity.add(layer.id, cache_key(layer.id, tms.identifier, tile, params))
+
+        settings = APISettings()
+        headers = {}
+        version = layer.data_version()
+        if version is not None and request.query_params.get("v") == version:
+            headers["Cache-Control"] = settings.cachecontrol_immutable
+
+        if settings.surrogate_key_headers:
+            keys = surrogate_keys(layer.id, tile, tms, settings.surrogate_key_zoom)
+            for header in settings.surrogate_key_headers:
+                # Cache-Tag (e.g Cloudflare) values are comma separated
+                sep = "," if header.lower() == "cache-tag" else " "
+                headers[header] = sep.join(keys)
+
+        return Response(
+            bytes(content), media_type="application/x-protobuf", headers=headers
+        )
+
+    def _tilejson(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        tile_endpoint: str,
+        minzoom: Optional[int] = None,
+        maxzoom: Optional[int] = None,
+        qs_key_to_remove: List[str] = ["minzoom", "maxzoom"],
+    ) -> TileJSON:
+        """Create TileJSON document."""
+        query_params = [
+            (key, value)
+            for (key, value) in request.query_params._list
+            if key.lower() not in qs_key_to_remove and key != "v"
+        ]
+
+        # Data version token, tiles requested with the current version are immutable
+        version = layer.data_version()
+        if version is not None:
+            query_params.append(("v", version))
+
+        if query_params:
+            tile_endpoint += f"?{urlencode(query_params)}"
+
+        minzoom = minzoom if minzoom is not None else (layer.minzoom or tms.minzoom)
+        maxzoom = maxzoom if maxzoom is not None else (layer.maxzoom or tms.maxzoom)
+
+        return TileJSON(
+            **{
+                "minzoom": minzoom,
+                "maxzoom": maxzoom,
+                "name": layer.id,
+                "bounds": layer.bounds,
+                "tiles": [tile_endpoint],
+            }
         )
 
     @get(
@@ -131,11 +361,6 @@ class TilerEndpoints(Controller):
         dependencies={"tile": Provide(TileParams)},
         media_type="application/x-protobuf",
     )
-    # @get(
-    #     path="/tiles/{TileMatrixSetId:str}/{layer:str}/{z:int}/{x:int}/{y:int}.pbf",
-    #     dependencies={"tile": Provide(TileParams)},
-    #     media_type="application/x-protobuf",
-    # )
     async def tile(
         self,
         request: Request,
@@ -144,17 +369,101 @@ class TilerEndpoints(Controller):
         tile: Tile,
     ) -> bytes:
         """Return vector tile."""
-        pool = request.app.state.pool
+        return await self._tile(request, tms, layer, tile)  # type: ignore
+
+    @get(
+        path="/tiles/{TileMatrixSetId:str}/{layer:str}/{z:int}/{x:int}/{y:int}.pbf",
+        dependencies={"tile": Provide(TileParams)},
+        media_type="application/x-protobuf",
+    )
+    async def tms_tile(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        tile: Tile,
+    ) -> bytes:
+        """Return vector tile for a TileMatrixSet."""
+        return await self._tile(request, tms, layer, tile)  # type: ignore
+
+    @get(path="/features/{layer:str}")
+    async def features(
+        self,
+        request: Request,
+        layer: Layer,
+        bbox: Optional[str] = Parameter(
+            required=False,
+            description="Features bounding box (WGS84 minx,miny,maxx,maxy).",
+        ),
+        limit: Optional[int] = Parameter(
+            required=False, ge=0, description="Maximum number of features."
+        ),
+        f: str = Parameter(
+            default="geojson",
+            description="Output format: `geojson` (FeatureCollection), `ndjson` (one feature per line) or `fgb` (FlatGeobuf, without spatial index).",
+        ),
+    ) -> Response:
+        """Stream a Table's features (filtered with `columns`, `filter` and `bbox`)."""
+        if not isinstance(layer, Table):
+            raise HTTPException(
+                status_code=400, detail=f"'{layer.id}' is not a Table layer."
+            )
+
+        if f not in FEATURES_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid format '{f}'.")
 
         kwargs = queryparams_to_kwargs(
-            request.query_params, ignore_keys=["tilematrixsetid"]
+            request.query_params, ignore_keys=["bbox", "limit", "f"]
+        )
+        features = layer.iter_features(
+            request.app.state.pool,
+            bbox=parse_bbox(bbox) if bbox is not None else None,
+            limit=limit,
+            **kwargs,
         )
-        content = await layer.get_tile(pool, tile, tms, **kwargs)
 
-        return bytes(content)
+        if f == "fgb":
+            columns = layer.columns(kwargs.get("columns"))
+            start = flatgeobuf.header(layer.id, layer.geometry_type, columns)
+            end = b""
+
+            def _encode(i: int, feature: str) -> bytes:
+                return flatgeobuf.feature(json.loads(feature), columns)
+
+        elif f == "ndjson":
+            start, end = b"", b""
+
+            def _encode(i: int, feature: str) -> bytes:
+                return feature.encode() + b"\n"
+
+        else:
+            start, end = b'{"type":"FeatureCollection","features":[', b"]}"
+
+            def _encode(i: int, feature: str) -> bytes:
+                return b"," + feature.encode() if i else feature.encode()
+
+        async def _iter() -> AsyncIterator[bytes]:
+            chunks = [start]
+            size = 0
+            i = 0
+            async for feature in features:
+                chunk = _encode(i, feature)
+                chunks.append(chunk)
+                size += len(chunk)
+                i += 1
+
+                # Send features by batches of ~64KB
+                if size >= 2**16:
+                    yield b"".join(chunks)
+                    chunks = []
+                    size = 0
+
+            chunks.append(end)
+            yield b"".join(chunks)
+
+        return StreamingResponse(_iter(), media_type=FEATURES_FORMATS[f])
 
     @get(path="/{layer:str}/tilejson.json")
-    # @get(path="/{TileMatrixSetId:str}/{layer:str}/tilejson.json")
     async def tilejson(
         self,
         request: Request,
@@ -169,7 +478,6 @@ class TilerEndpoints(Controller):
     ) -> TileJSON:
         """Return TileJSON document."""
         path_params: Dict[str, Any] = {
-            # "TileMatrixSetId": tms.identifier,
             "layer": layer.id,
             "z": "{z}",
             "x": "{x}",
@@ -177,32 +485,71 @@ class TilerEndpoints(Controller):
         }
         tile_endpoint = self.url_for(request, "tile", **path_params)
 
-        # qs_key_to_remove = ["tilematrixsetid", "minzoom", "maxzoom"]
-        qs_key_to_remove = ["minzoom", "maxzoom"]
-        query_params = [
-            (key, value)
-            for (key, value) in request.query_params._list
-            if key.lower() not in qs_key_to_remove
-        ]
-
-        if query_params:
-            tile_endpoint += f"?{urlencode(query_params)}"
-
-        minzoom = minzoom if minzoom is not None else (layer.minzoom or tms.minzoom)
-        maxzoom = maxzoom if maxzoom is not None else (layer.maxzoom or tms.maxzoom)
+        return self.cached_json(  # type: ignore
+            request,
+            lambda: self._tilejson(
+                request, tms, layer, tile_endpoint, minzoom=minzoom, maxzoom=maxzoom
+            ),
+            data_version=layer.data_version(),
+        )
 
-        return TileJSON(
-            **{
-                "minzoom": minzoom,
-                "maxzoom": maxzoom,
-                "name": layer.id,
-                "bounds": layer.bounds,
-                "tiles": [tile_endpoint],
-            }
+    @get(path="/{TileMatrixSetId:str}/{layer:str}/tilejson.json")
+    async def tms_tilejson(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        minzoom: Optional[int] = Parameter(
+            required=False, description="Overwrite default minzoom."
+        ),
+        maxzoom: Optional[int] = Parameter(
+            required=False, description="Overwrite default maxzoom."
+        ),
+    ) -> TileJSON:
+        """Return TileJSON document for a TileMatrixSet."""
+        path_params: Dict[str, Any] = {
+            "TileMatrixSetId": tms.identifier,
+            "layer": layer.id,
+            "z": "{z}",
+            "x": "{x}",
+            "y": "{y}",
+        }
+        tile_endpoint = self.url_for(request, "tms_tile", **path_params)
+
+        return self.cached_json(  # type: ignore
+            request,
+            lambda: self._tilejson(
+                request,
+                tms,
+                layer,
+                tile_endpoint,
+                minzoom=minzoom,
+                maxzoom=maxzoom,
+                qs_key_to_remove=["tilematrixsetid", "minzoom", "maxzoom"],
+            ),
+            data_version=layer.data_version(),
         )
 
     @get(path="/tables.json")
-    async def tables_index(self, request: Request) -> List[Table]:
+    async def tables_index(
+        self,
+        request: Request,
+        limit: Optional[int] = Parameter(
+            required=False, ge=0, description="Maximum number of tables to return."
+        ),
+        offset: Optional[int] = Parameter(
+            required=False, ge=0, description="Number of tables to skip."
+        ),
+        dbschema: Optional[str] = Parameter(
+            query="schema", required=False, description="Filter by schema."
+        ),
+        geometry_type: Optional[str] = Parameter(
+            required=False, description="Filter by geometry type (e.g polygon)."
+        ),
+        prefix: Optional[str] = Parameter(
+            required=False, description="Filter by table name prefix."
+        ),
+    ) -> List[Table]:
         """Index of tables."""
 
         def _get_tiles_url(id: str) -> str:
@@ -213,14 +560,33 @@ class TilerEndpoints(Controller):
             except NoMatchFound:
                 return None
 
-        return [
-            Table(**r, tileurl=_get_tiles_url(r["id"]))
-            for r in request.app.state.table_catalog
-        ]
+        def _tables() -> Iterable[Table]:
+            records: Iterable[Dict] = request.app.state.table_catalog
+            if dbschema is not None:
+                records = (r for r in records if r["schema"] == dbschema)
+            if geometry_type is not None:
+                records = (
+                    r
+                    for r in records
+                    if r["geometry_type"].lower() == geometry_type.lower()
+                )
+            if prefix is not None:
+                records = (r for r in records if r["table"].startswith(prefix))
+
+            start = offset or 0
+            stop = start + limit if limit is not None else None
+            for r in islice(records, start, stop):
+                yield Table(**r, tileurl=_get_tiles_url(r["id"]))
+
+        return self.cached_json(request, _tables, stream=True)  # type: ignore
 
     @get(path="/table/{layer:str}.json")
     async def table_metadata(self, request: Request, layer: Layer) -> Table:
         """Return table metadata."""
+        if not isinstance(layer, Table):
+            raise HTTPException(
+                status_code=404, detail=f"Table '{layer.id}' not found."
+            )
 
         def _get_tiles_url(id) -> str:
             try:
@@ -233,8 +599,77 @@ class TilerEndpoints(Controller):
         layer.tileurl = _get_tiles_url(layer.id)
         return Table(**layer.dict(by_alias=True))
 
+    @get(path="/files.json")
+    async def files_index(
+        self,
+        request: Request,
+        limit: Optional[int] = Parameter(
+            required=False, ge=0, description="Maximum number of files to return."
+        ),
+        offset: Optional[int] = Parameter(
+            required=False, ge=0, description="Number of files to skip."
+        ),
+        prefix: Optional[str] = Parameter(
+            required=False, description="Filter by layer name prefix."
+        ),
+    ) -> List[Union[Archive, FileTable]]:
+        """Index of file layers (archives and datasets)."""
+
+        def _get_tiles_url(id: str) -> str:
+            try:
+                return self.url_for(
+                    request, "tile", layer=id, z="{z}", x="{x}", y="{y}"
+                )
+            except NoMatchFound:
+                return None
+
+        def _files() -> Iterable[Union[Archive, FileTable]]:
+            layers = (
+                layer
+                for id, layer in FunctionRegistry.funcs.items()
+                if isinstance(layer, (Archive, FileTable))
+                and (prefix is None or id.startswith(prefix))
+            )
+
+            start = offset or 0
+            stop = start + limit if limit is not None else None
+            for layer in islice(layers, start, stop):
+                yield layer.copy(update={"tileurl": _get_tiles_url(layer.id)})
+
+        return self.cached_json(request, _files, stream=True)  # type: ignore
+
+    @get(path="/file/{layer:str}.json")
+    async def file_metadata(
+        self, request: Request, layer: Layer
+    ) -> Union[Archive, FileTable]:
+        """Return file layer metadata."""
+        if not isinstance(layer, (Archive, FileTable)):
+            raise HTTPException(status_code=404, detail=f"File '{layer.id}' not found.")
+
+        def _get_tiles_url(id) -> str:
+            try:
+                return self.url_for(
+                    request, "tile", layer=id, z="{z}", x="{x}", y="{y}"
+                )
+            except NoMatchFound:
+                return None
+
+        return layer.copy(update={"tileurl": _get_tiles_url(layer.id)})
+
     @get(path="/functions.json")
-    async def functions_index(self, request: Request) -> List[Function]:
+    async def functions_index(
+        self,
+        request: Request,
+        limit: Optional[int] = Parameter(
+            required=False, ge=0, description="Maximum number of functions to return."
+        ),
+        offset: Optional[int] = Parameter(
+            required=False, ge=0, description="Number of functions to skip."
+        ),
+        prefix: Optional[str] = Parameter(
+            required=False, description="Filter by function name prefix."
+        ),
+    ) -> List[Function]:
         """Index of functions."""
 
         def _get_tiles_url(id: str) -> str:
@@ -245,14 +680,30 @@ class TilerEndpoints(Controller):
             except NoMatchFound:
                 return None
 
-        return [
-            Function(**func.dict(exclude_none=True), tileurl=_get_tiles_url(id))
-            for id, func in FunctionRegistry.funcs.items()
-        ]
+        def _functions() -> Iterable[Function]:
+            funcs = (
+                func
+                for id, func in FunctionRegistry.funcs.items()
+                if isinstance(func, Function)
+                and (prefix is None or id.startswith(prefix))
+            )
+
+            start = offset or 0
+            stop = start + limit if limit is not None else None
+            for func in islice(funcs, start, stop):
+                yield Function(
+                    **func.dict(exclude_none=True), tileurl=_get_tiles_url(func.id)
+                )
+
+        return self.cached_json(request, _functions, stream=True)  # type: ignore
 
     @get(path="/function/{layer:str}.json")
     async def function_metadata(self, request: Request, layer: Layer) -> Function:
         """Return function metadata."""
+        if not isinstance(layer, Function):
+            raise HTTPException(
+                status_code=404, detail=f"Function '{layer.id}' not found."
+            )
 
         def _get_tiles_url(id) -> str:
             try:
@@ -271,7 +722,7 @@ class TilerEndpoints(Controller):
         """Viewer."""
         tile_url = self.url_for(request, "tilejson", layer=layer.id)
 
-        return templates.TemplateResponse(  # type: ignore
+        return get_templates().TemplateResponse(
             name="viewer.html",
             context={"endpoint": tile_url, "request": request},
             media_type="text/html",
@@ -348,3 +799,135 @@ class TMSEndpoints(Controller):
         # TODO: returning Dict is not enough because there are models within the model
         # we will need to iterate through all items
         return json.loads(tms.json(exclude_none=True))
+
+
+class AdminEndpoints(Controller):
+    """Admin (diagnostics) endpoints."""
+
+    path = "/admin"
+
+    dependencies = {
+        "layer": Provide(LayerParams),
+        "tms": Provide(TileMatrixSetParams),
+    }
+
+    @classmethod
+    def factory(
+        cls,
+        prefix: str = "/admin",
+        tms_dependency: Callable = None,
+        layer_dependency: Callable = None,
+    ) -> Type["AdminEndpoints"]:
+        """Edit AdminEndpoints class."""
+        new_deps = {}
+        if tms_dependency:
+            new_deps["tms"] = Provide(tms_dependency)
+        if layer_dependency:
+            new_deps["layer"] = Provide(layer_dependency)
+
+        return type(
+            "AdminEndpoints",
+            (cls,),
+            {"path": prefix, "dependencies": {**cls.dependencies, **new_deps}},
+        )
+
+    @get(path="/layers.json")
+    async def layers_diagnostics(self, request: Request) -> List[Dict]:
+        """Return the table layers ranked by expected tile cost."""
+        min_rows = PgSettings().db_unindexed_min_rows
+        tables = (Table(**r) for r in request.app.state.table_catalog)
+        return rank_tables(tables, min_rows=min_rows)
+
+    @get(path="/pool.json")
+    async def pool_stats(self, request: Request) -> Dict:
+        """Return the database pool usage (connections open, idle and max).
+
+        With several workers, the usage is the pool of the worker (`pid`) which
+        answered the request.
+
+        """
+        pool = request.app.state.pool
+        return {
+            "pid": os.getpid(),
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "max_size": pool.get_max_size(),
+        }
+
+    @get(
+        path="/explain/{layer:str}/{z:int}/{x:int}/{y:int}",
+        dependencies={"tile": Provide(TileParams)},
+    )
+    async def explain(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        tile: Tile,
+    ) -> Dict:
+        """Return the SQL, `EXPLAIN (ANALYZE, BUFFERS)` plan and timings of a tile."""
+        if not isinstance(layer, Table):
+            raise HTTPException(
+                status_code=400, detail=f"'{layer.id}' is not a Table layer."
+            )
+
+        kwargs = queryparams_to_kwargs(
+            request.query_params, ignore_keys=["tilematrixsetid"]
+        )
+        return await explain_tile(request.app.state.pool, layer, tile, tms, **kwargs)
+
+    @get(path="/heavy-tiles/{layer:str}/{z:int}")
+    async def layer_heavy_tiles(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        z: int = Parameter(ge=0, le=30, description="Zoom level"),
+        limit: int = Parameter(
+            default=100, ge=1, description="Number of tiles to return."
+        ),
+        grid_size: int = Parameter(
+            default=16, ge=1, le=256, description="Maximum heatmap width/height."
+        ),
+    ) -> Dict:
+        """Return a Table's tiles ranked by feature and vertex count for a zoom."""
+        if not isinstance(layer, Table):
+            raise HTTPException(
+                status_code=400, detail=f"'{layer.id}' is not a Table layer."
+            )
+
+        kwargs = queryparams_to_kwargs(
+            request.query_params,
+            ignore_keys=["tilematrixsetid", "limit", "grid_size"],
+        )
+        return await heavy_tiles(
+            request.app.state.pool,
+            layer,
+            z,
+            tms,
+            limit=limit,
+            grid_size=grid_size,
+            **kwargs,
+        )
+
+    @post(path="/purge/{layer:str}", status_code=200)
+    async def purge(
+        self,
+        request: Request,
+        tms: TileMatrixSet,
+        layer: Layer,
+        bbox: Optional[str] = Parameter(
+            required=False,
+            description="Region to purge (minx,miny,maxx,maxy), default to the whole layer.",
+        ),
+    ) -> Dict:
+        """Purge a layer (or a region of a layer) from the tile cache and emit a purge event."""
+        bounds = parse_bbox(bbox) if bbox is not None else None
+        zoom = APISettings().surrogate_key_zoom
+        keys = purge_keys(layer.id, tms, bounds, zoom=zoom)
+
+        # Invalidate the local cache first so the CDN doesn't refetch stale tiles
+        request.app.state.cache.invalidate(partial(purged, keys=keys, zoom=zoom))
+        await purge_hooks.emit(keys)
+
+        return {"keys": keys}
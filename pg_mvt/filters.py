@@ -0,0 +1,362 @@
+"""pg_mvt.filters: CQL2 filter parsing and SQL compilation.
+
+Supports a subset of OGC CQL2 (text and JSON encodings):
+
+- logical operators: `AND`, `OR`, `NOT`
+- comparisons: `=`, `<>`, `<`, `<=`, `>`, `>=`
+- `LIKE`, `IN (...)`, `BETWEEN ... AND ...`, `IS NULL`
+
+Filters are parsed to the CQL2-JSON representation and then compiled to a
+parameterized `buildpg` SQL block. Property names are validated against the
+layer's properties and literals are converted to the column's type so the
+query planner can use indexes.
+
+"""
+
+import datetime
+import json
+import re
+import uuid
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from buildpg import Var as pg_variable
+from buildpg import funcs
+from buildpg.components import RawDangerous
+from buildpg.logic import SqlBlock
+
+from pg_mvt.errors import InvalidFilter
+
+COMPARISON_OPERATORS = {"=", "<>", "<", "<=", ">", ">="}
+
+TEXT_TYPES = {"text", "varchar", "bpchar", "char", "name", "citext"}
+
+
+def _temporal(value: Any) -> str:
+    """Return ISO string from a CQL2 temporal literal."""
+    if isinstance(value, dict):
+        value = value.get("date") or value.get("timestamp")
+    return str(value).replace("Z", "+00:00")
+
+
+def _integer(value: Any) -> int:
+    """Return int from an integral literal (`2.5` is not truncated)."""
+    if isinstance(value, bool):
+        raise TypeError(f"{value!r} is not an integer")
+
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{value!r} is not an integer")
+        return int(value)
+
+    return int(value)
+
+
+def _boolean(value: Any) -> bool:
+    """Return bool from a `true`/`false` literal."""
+    if isinstance(value, bool):
+        return value
+
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+
+    raise ValueError(f"{value!r} is not a boolean")
+
+
+# Map of PostgreSQL `udt_name` to python value converter
+TYPE_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "int2": _integer,
+    "int4": _integer,
+    "int8": _integer,
+    "float4": float,
+    "float8": float,
+    "numeric": lambda v: Decimal(str(v)),
+    "bool": _boolean,
+    "date": lambda v: datetime.date.fromisoformat(_temporal(v)),
+    "timestamp": lambda v: datetime.datetime.fromisoformat(_temporal(v)),
+    "timestamptz": lambda v: datetime.datetime.fromisoformat(_temporal(v)),
+    "uuid": lambda v: uuid.UUID(str(v)),
+    **{t: str for t in TEXT_TYPES},
+}
+
+TOKEN_REGEX = re.compile(
+    r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+        |(?P<string>'(?:[^']|'')*')
+        |(?P<quoted>"[^"]+")
+        |(?P<operator><>|!=|<=|>=|=|<|>)
+        |(?P<punct>[(),])
+        |(?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )""",
+    re.VERBOSE,
+)
+
+KEYWORDS = {"AND", "OR", "NOT", "IN", "LIKE", "BETWEEN", "IS", "NULL", "TRUE", "FALSE"}
+
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    """Split a CQL2-text expression in tokens."""
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN_REGEX.match(text, pos)
+        if not match or match.end() == pos:
+            raise InvalidFilter(f"Invalid filter syntax at position {pos}: {text!r}")
+
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            try:
+                tokens.append(("literal", json.loads(value)))
+            except ValueError as e:
+                raise InvalidFilter(f"Invalid number {value!r}.") from e
+        elif kind == "string":
+            tokens.append(("literal", value[1:-1].replace("''", "'")))
+        elif kind == "quoted":
+            tokens.append(("property", value[1:-1]))
+        elif kind == "operator":
+            tokens.append(("operator", "<>" if value == "!=" else value))
+        elif kind == "punct":
+            tokens.append((value, value))
+        elif value.upper() in ("TRUE", "FALSE"):
+            tokens.append(("literal", value.upper() == "TRUE"))
+        elif value.upper() in KEYWORDS:
+            tokens.append(("keyword", value.upper()))
+        else:
+            tokens.append(("property", value))
+
+    return tokens
+
+
+class _TextParser:
+    """Recursive descent parser for CQL2-text (subset)."""
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def _peek(self) -> Tuple[str, Any]:
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return ("eof", None)
+
+    def _next(self) -> Tuple[str, Any]:
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _accept(self, kind: str, value: Any = None) -> bool:
+        token = self._peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, kind: str, value: Any = None) -> Any:
+        token = self._next()
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise InvalidFilter(f"Expected {value or kind}, got {token[1]!r}.")
+        return token[1]
+
+    def parse(self) -> Dict:
+        expr = self._or()
+        if self._peek()[0] != "eof":
+            raise InvalidFilter(f"Unexpected token {self._peek()[1]!r}.")
+        return expr
+
+    def _or(self) -> Dict:
+        args = [self._and()]
+        while self._accept("keyword", "OR"):
+            args.append(self._and())
+        return args[0] if len(args) == 1 else {"op": "or", "args": args}
+
+    def _and(self) -> Dict:
+        args = [self._not()]
+        while self._accept("keyword", "AND"):
+            args.append(self._not())
+        return args[0] if len(args) == 1 else {"op": "and", "args": args}
+
+    def _not(self) -> Dict:
+        if self._accept("keyword", "NOT"):
+            return {"op": "not", "args": [self._not()]}
+        return self._predicate()
+
+    def _literal(self) -> Any:
+        kind, value = self._peek()
+        # Temporal literals: DATE('2020-01-01') or TIMESTAMP('2020-01-01T00:00:00Z')
+        if kind == "property" and value.upper() in ("DATE", "TIMESTAMP"):
+            self.pos += 1
+            self._expect("(")
+            literal = self._expect("literal")
+            self._expect(")")
+            return {value.lower(): literal}
+
+        return self._expect("literal")
+
+    def _predicate(self) -> Dict:
+        if self._accept("("):
+            expr = self._or()
+            self._expect(")")
+            return expr
+
+        prop = {"property": self._expect("property")}
+
+        kind, value = self._next()
+        if kind == "operator":
+            return {"op": value, "args": [prop, self._literal()]}
+
+        if kind == "keyword" and value == "IS":
+            negate = self._accept("keyword", "NOT")
+            self._expect("keyword", "NULL")
+            expr = {"op": "isNull", "args": [prop]}
+            return {"op": "not", "args": [expr]} if negate else expr
+
+        negate = False
+        if kind == "keyword" and value == "NOT":
+            negate = True
+            kind, value = self._next()
+
+        if kind == "keyword" and value == "LIKE":
+            expr = {"op": "like", "args": [prop, self._literal()]}
+
+        elif kind == "keyword" and value == "IN":
+            self._expect("(")
+            values = [self._literal()]
+            while self._accept(","):
+                values.append(self._literal())
+            self._expect(")")
+            expr = {"op": "in", "args": [prop, values]}
+
+        elif kind == "keyword" and value == "BETWEEN":
+            low = self._literal()
+            self._expect("keyword", "AND")
+            expr = {"op": "between", "args": [prop, low, self._literal()]}
+
+        else:
+            raise InvalidFilter(f"Unsupported operator {value!r}.")
+
+        return {"op": "not", "args": [expr]} if negate else expr
+
+
+def parse_filter(filter: str, filter_lang: str = "cql2-text") -> Dict:
+    """Parse a CQL2 filter to its JSON representation.
+
+    Args:
+        filter (str): CQL2 filter expression.
+        filter_lang (str): Filter encoding, `cql2-text` (default) or `cql2-json`.
+
+    Returns:
+        dict: CQL2-JSON expression.
+
+    """
+    if filter_lang == "cql2-text":
+        return _TextParser(filter).parse()
+
+    elif filter_lang == "cql2-json":
+        try:
+            return json.loads(filter)
+        except ValueError as e:
+            raise InvalidFilter(f"Invalid CQL2-JSON filter: {e}") from e
+
+    raise InvalidFilter(f"Unsupported filter-lang '{filter_lang}'.")
+
+
+def _property(arg: Any, properties: Dict[str, str]) -> str:
+    """Validate a property reference against the layer's properties."""
+    if not isinstance(arg, dict) or "property" not in arg:
+        raise InvalidFilter("Left-hand side of a predicate must be a property.")
+
+    name = arg["property"]
+    if name not in properties:
+        raise InvalidFilter(f"Invalid property '{name}'.")
+
+    return name
+
+
+def _value(value: Any, udt_name: str, name: str) -> Any:
+    """Convert a literal to the python type matching the column type."""
+    converter = TYPE_CONVERTERS.get(udt_name)
+    if converter is None:
+        raise InvalidFilter(f"Filtering on '{name}' ({udt_name}) is not supported.")
+
+    try:
+        return converter(value)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        raise InvalidFilter(
+            f"Invalid value {value!r} for '{name}' ({udt_name})."
+        ) from e
+
+
+def to_sql(  # noqa: C901
+    expr: Dict, properties: Dict[str, str], alias: str = "t"
+) -> SqlBlock:
+    """Compile a CQL2-JSON expression to a parameterized SQL block.
+
+    Args:
+        expr (dict): CQL2-JSON expression.
+        properties (dict): Layer's properties (column name to `udt_name`).
+        alias (str): Table alias used to prefix column names.
+
+    Returns:
+        SqlBlock: buildpg SQL block.
+
+    """
+    if not isinstance(expr, dict) or not isinstance(expr.get("op"), str):
+        raise InvalidFilter("Invalid filter expression.")
+
+    op = expr["op"].lower()
+    args = expr.get("args") or []
+    if not isinstance(args, list):
+        raise InvalidFilter(f"'{expr['op']}' arguments must be a list.")
+
+    if op in ("and", "or"):
+        if not args:
+            raise InvalidFilter(f"'{op}' needs at least one argument.")
+        clauses = [to_sql(arg, properties, alias=alias) for arg in args]
+        return funcs.AND(*clauses) if op == "and" else funcs.OR(*clauses)
+
+    if op == "not":
+        if len(args) != 1:
+            raise InvalidFilter("'not' needs one argument.")
+        return funcs.NOT(to_sql(args[0], properties, alias=alias))
+
+    name = _property(args[0] if args else None, properties)
+    udt_name = properties[name]
+    column_name = f"{alias}.{name}" if alias else name
+    # NOTE: buildpg operations mutate the variable so we create one per clause
+    column = pg_variable(column_name)
+
+    if op == "isnull":
+        return column.is_(RawDangerous("NULL"))
+
+    if op in COMPARISON_OPERATORS and len(args) == 2:
+        value = _value(args[1], udt_name, name)
+        return {
+            "=": column.__eq__,
+            "<>": column.__ne__,
+            "<": column.__lt__,
+            "<=": column.__le__,
+            ">": column.__gt__,
+            ">=": column.__ge__,
+        }[op](value)
+
+    if op == "like" and len(args) == 2:
+        if udt_name not in TEXT_TYPES:
+            raise InvalidFilter(
+                f"LIKE is only supported on text properties ('{name}')."
+            )
+        return column.like(_value(args[1], udt_name, name))
+
+    if op == "in" and len(args) == 2 and isinstance(args[1], list) and args[1]:
+        values = [_value(v, udt_name, name) for v in args[1]]
+        return column == funcs.any(values)
+
+    if op == "between" and len(args) == 3:
+        low = _value(args[1], udt_name, name)
+        high = _value(args[2], udt_name, name)
+        return funcs.AND(column >= low, pg_variable(column_name) <= high)
+
+    raise InvalidFilter(f"Unsupported filter operator '{expr['op']}'.")
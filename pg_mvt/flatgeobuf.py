@@ -0,0 +1,287 @@
+"""pg_mvt.flatgeobuf: Streaming FlatGeobuf writer.
+
+Files are written without spatial index (`index_node_size=0`) and with an
+unknown number of features (`features_count=0`), so the header can be sent
+before the features are read. Features are written from GeoJSON features
+(2D coordinates).
+
+The FlatBuffers tables are serialized front to back: each table is preceded by
+its vtable and followed by the objects (vectors, strings and tables) it refers
+to, so all the offsets point forward.
+
+See https://flatgeobuf.org/ and https://github.com/flatgeobuf/flatgeobuf/tree/master/src/fbs
+
+"""
+
+import json
+import struct
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+MAGIC_BYTES = b"fgb\x03fgb\x01"
+
+GEOMETRY_TYPES = {
+    "Unknown": 0,
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+    "GeometryCollection": 7,
+}
+
+# Column types: (FlatGeobuf type, value format)
+BOOL = (2, "?")
+SHORT = (3, "<h")
+INT = (5, "<i")
+LONG = (7, "<q")
+FLOAT = (9, "<f")
+DOUBLE = (10, "<d")
+STRING = (11, None)
+JSON = (12, None)
+DATETIME = (13, None)
+
+# PostgreSQL types (udt_name) of the columns, String for the other types
+COLUMN_TYPES = {
+    "bool": BOOL,
+    "int2": SHORT,
+    "int4": INT,
+    "int8": LONG,
+    "float4": FLOAT,
+    "float8": DOUBLE,
+    "numeric": DOUBLE,
+    "json": JSON,
+    "jsonb": JSON,
+    "date": DATETIME,
+    "timestamp": DATETIME,
+    "timestamptz": DATETIME,
+}
+
+Field = Tuple[int, str, Any]
+
+
+class _Builder:
+    """FlatBuffers serializer (objects written front to back)."""
+
+    def __init__(self):
+        self.buf = bytearray(4)  # root table offset
+
+    def pad(self, align: int, extra: int = 0):
+        """Pad so `extra` bytes after the end of the buffer are aligned."""
+        self.buf += bytes(-(len(self.buf) + extra) % align)
+
+    def patch(self, pos: int, target: int):
+        """Set the offset at `pos` to `target` (uoffset, relative)."""
+        struct.pack_into("<I", self.buf, pos, target - pos)
+
+    def string(self, value: str) -> int:
+        """Write a string, return its position."""
+        data = value.encode()
+        self.pad(4)
+        pos = len(self.buf)
+        self.buf += struct.pack("<I", len(data)) + data + b"\x00"
+        return pos
+
+    def vector(self, fmt: str, values: Sequence) -> int:
+        """Write a vector of scalars (`struct` format), return its position."""
+        size = struct.calcsize(fmt)
+        self.pad(max(size, 4), 4)
+        pos = len(self.buf)
+        self.buf += struct.pack(f"<I{len(values)}{fmt}", len(values), *values)
+        return pos
+
+    def tables(self, tables: Sequence[Sequence[Field]]) -> int:
+        """Write a vector of tables, return its position."""
+        self.pad(4)
+        pos = len(self.buf)
+        self.buf += struct.pack("<I", len(tables)) + bytes(4 * len(tables))
+        for i, fields in enumerate(tables):
+            self.patch(pos + 4 + 4 * i, self.table(fields))
+        return pos
+
+    def table(self, fields: Sequence[Field]) -> int:
+        """Write a table.
+
+        Args:
+            fields (list): Fields' (index, format, value): scalars' format is a
+                `struct` format, `string` for strings, `table` for tables (list
+                of fields), `tables` for vectors of tables and `[<format>` for
+                vectors of scalars.
+
+        """
+        # Inline fields, largest first (aligned), after the vtable offset
+        inline = sorted(
+            fields,
+            key=lambda f: struct.calcsize(f[1]) if len(f[1]) == 1 else 4,
+            reverse=True,
+        )
+        offsets: Dict[int, int] = {}
+        size = 4
+        align = 4
+        for index, fmt, _ in inline:
+            field_size = struct.calcsize(fmt) if len(fmt) == 1 else 4
+            size += -size % field_size
+            offsets[index] = size
+            size += field_size
+            align = max(align, field_size)
+        size += -size % align
+
+        vtable = [0] * (max(offsets) + 1 if offsets else 0)
+        for index, offset in offsets.items():
+            vtable[index] = offset
+
+        self.pad(2)
+        vtable_pos = len(self.buf)
+        self.buf += struct.pack(
+            f"<HH{len(vtable)}H", 4 + 2 * len(vtable), size, *vtable
+        )
+
+        self.pad(align)
+        pos = len(self.buf)
+        self.buf += bytes(size)
+        struct.pack_into("<i", self.buf, pos, pos - vtable_pos)
+
+        for index, fmt, value in inline:
+            if len(fmt) == 1:
+                struct.pack_into(f"<{fmt}", self.buf, pos + offsets[index], value)
+
+        # Referenced objects
+        write: Dict[str, Callable[..., int]] = {
+            "string": self.string,
+            "table": self.table,
+            "tables": self.tables,
+        }
+        for index, fmt, value in fields:
+            if len(fmt) == 1:
+                continue
+
+            if fmt.startswith("["):
+                target = self.vector(fmt[1:], value)
+            else:
+                target = write[fmt](value)
+            self.patch(pos + offsets[index], target)
+
+        return pos
+
+    def finish(self, fields: Sequence[Field]) -> bytes:
+        """Write the root table and return the size-prefixed buffer."""
+        self.patch(0, self.table(fields))
+        self.pad(4)
+        return struct.pack("<I", len(self.buf)) + bytes(self.buf)
+
+
+def column_type(udt_name: str) -> Tuple[int, Optional[str]]:
+    """Return the column type of a PostgreSQL type."""
+    return COLUMN_TYPES.get(udt_name, STRING)
+
+
+def header(
+    name: str,
+    geometry_type: str,
+    columns: Dict[str, str],
+    srid: int = 4326,
+) -> bytes:
+    """Return the magic bytes and the header of a streamed FlatGeobuf file.
+
+    Args:
+        name (str): Dataset name.
+        geometry_type (str): PostGIS geometry type (e.g MULTIPOLYGON).
+        columns (dict): Columns' names and PostgreSQL types (udt_name).
+        srid (int): EPSG code of the features' coordinates.
+
+    """
+    geometry_types = {k.upper(): v for k, v in GEOMETRY_TYPES.items()}
+    fields: List[Field] = [
+        (0, "string", name),
+        (2, "B", geometry_types.get(geometry_type.upper(), 0)),
+        (8, "Q", 0),  # unknown number of features
+        (9, "H", 0),  # no spatial index
+        (10, "table", [(0, "string", "EPSG"), (1, "i", srid)]),
+    ]
+    if columns:
+        fields.append(
+            (
+                7,
+                "tables",
+                [
+                    [(0, "string", column), (1, "B", column_type(udt_name)[0])]
+                    for column, udt_name in columns.items()
+                ],
+            )
+        )
+
+    return MAGIC_BYTES + _Builder().finish(fields)
+
+
+def _geometry(geometry: Dict) -> List[Field]:
+    """Return the FlatBuffers fields of a GeoJSON geometry."""
+    geometry_type = geometry["type"]
+    fields: List[Field] = [(6, "B", GEOMETRY_TYPES[geometry_type])]
+
+    if geometry_type in ("MultiPolygon", "GeometryCollection"):
+        parts = (
+            [{"type": "Polygon", "coordinates": c} for c in geometry["coordinates"]]
+            if geometry_type == "MultiPolygon"
+            else geometry["geometries"]
+        )
+        fields.append((7, "tables", [_geometry(part) for part in parts]))
+        return fields
+
+    coordinates = geometry["coordinates"]
+    if geometry_type == "Point":
+        points = [coordinates] if coordinates else []
+    elif geometry_type in ("LineString", "MultiPoint"):
+        points = coordinates
+    else:
+        # Polygon rings or MultiLineString lines: end index of each part
+        points = [point for part in coordinates for point in part]
+        ends: List[int] = []
+        for part in coordinates:
+            ends.append((ends[-1] if ends else 0) + len(part))
+        fields.append((0, "[I", ends))
+
+    fields.append((1, "[d", [v for point in points for v in point[:2]]))
+    return fields
+
+
+def _value(value: Any, fmt: Optional[str]) -> bytes:
+    """Encode a property value."""
+    if fmt is None:
+        if not isinstance(value, str):
+            value = json.dumps(value)
+        data = value.encode()
+        return struct.pack("<I", len(data)) + data
+
+    if fmt in ("<f", "<d"):
+        value = float(value)
+
+    return struct.pack(fmt, value)
+
+
+def feature(content: Dict, columns: Dict[str, str]) -> bytes:
+    """Return a size-prefixed FlatGeobuf feature from a GeoJSON feature.
+
+    Args:
+        content (dict): GeoJSON feature.
+        columns (dict): Columns' names and PostgreSQL types (udt_name), in the
+            header's order.
+
+    """
+    properties = bytearray()
+    values = content.get("properties") or {}
+    for i, (column, udt_name) in enumerate(columns.items()):
+        value = values.get(column)
+        if value is None:
+            continue
+
+        properties += struct.pack("<H", i)
+        properties += _value(value, column_type(udt_name)[1])
+
+    fields: List[Field] = []
+    geometry = content.get("geometry")
+    if geometry:
+        fields.append((0, "table", _geometry(geometry)))
+    if properties:
+        fields.append((1, "[B", bytes(properties)))
+
+    return _Builder().finish(fields)
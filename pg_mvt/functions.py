@@ -3,14 +3,15 @@
 from dataclasses import dataclass
 from typing import ClassVar, Dict
 
-from pg_mvt.layer import Function
+from pg_mvt.layer import Layer
 
 
 @dataclass
 class Registry:
     """function registry"""
 
-    funcs: ClassVar[Dict[str, Function]] = {}
+    funcs: ClassVar[Dict[str, Layer]] = {}
+    version: ClassVar[int] = 0  # Incremented each time the registry changes
 
     @classmethod
     def get(cls, key: str):
@@ -18,10 +19,12 @@ class Registry:
         return cls.funcs.get(key)
 
     @classmethod
-    def register(cls, *args: Function):
-        """register function(s)"""
+    def register(cls, *args: Layer):
+        """register function(s) or archive(s)"""
         for func in args:
             cls.funcs[func.id] = func
 
+        cls.version += 1
+
 
 registry = Registry()
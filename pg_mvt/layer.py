@@ -1,21 +1,53 @@
 """pg_mvt Table/Function layer."""
 
 import abc
+import hashlib
 import json
-from typing import Any, Dict, List, Optional
+import os
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
+import morecantile
 from buildpg import Func
 from buildpg import Var as pg_variable
 from buildpg import asyncpg, clauses, funcs, render, select_fields
+from buildpg.components import RawDangerous
+from buildpg.logic import SqlBlock
 from morecantile import Tile, TileMatrixSet
+from morecantile.errors import InvalidIdentifier
 
-from pg_mvt.settings import TileSettings
+from pg_mvt.archive import open_archive
+from pg_mvt.batch import tile_batcher
+from pg_mvt.errors import InvalidFilter, TileNotFound, UnindexedTable
+from pg_mvt.filters import parse_filter, to_sql
+from pg_mvt.mvt import encode_async
+from pg_mvt.settings import PgSettings, TileSettings
+from pg_mvt.style import style_registry, typed_filter
+from pg_mvt.tms import get_context
+
+from starlette.concurrency import run_in_threadpool
 
 from pydantic import BaseModel, Field, root_validator
 
 tile_settings = TileSettings()
 
 
+async def set_local(conn: asyncpg.BuildPgConnection, settings: Dict[str, str]) -> None:
+    """Set PostgreSQL settings for the current transaction (`SET LOCAL`)."""
+    await conn.execute(
+        "SELECT set_config(name, value, true) FROM unnest($1::text[], $2::text[]) AS s(name, value)",
+        list(settings.keys()),
+        [str(v) for v in settings.values()],
+    )
+
+
+def file_version(path: str) -> str:
+    """Return a data version token for a file (modification time and size)."""
+    stat = os.stat(path)
+    state = f"{stat.st_mtime_ns}:{stat.st_size}".encode()
+    return hashlib.blake2b(state, digest_size=6).hexdigest()
+
+
 class Layer(BaseModel, metaclass=abc.ABCMeta):
     """Layer's Abstract BaseClass.
 
@@ -25,6 +57,7 @@ class Layer(BaseModel, metaclass=abc.ABCMeta):
         minzoom (int): Layer's min zoom level.
         maxzoom (int): Layer's max zoom level.
         tileurl (str, optional): Layer's tiles url.
+        overzoom (bool): Derive tiles above maxzoom from the tile at maxzoom.
 
     """
 
@@ -33,6 +66,7 @@ class Layer(BaseModel, metaclass=abc.ABCMeta):
     minzoom: int = tile_settings.default_minzoom
     maxzoom: int = tile_settings.default_maxzoom
     tileurl: Optional[str]
+    overzoom: bool = tile_settings.overzoom
 
     @abc.abstractmethod
     async def get_tile(
@@ -56,6 +90,14 @@ class Layer(BaseModel, metaclass=abc.ABCMeta):
         """
         ...
 
+    async def prepare(self, conn: asyncpg.BuildPgConnection) -> None:
+        """Prepare the layer's queries on a database connection (warm-up)."""
+        pass
+
+    def data_version(self) -> Optional[str]:
+        """Return the layer's data version token (`None` if the data is not tracked)."""
+        return None
+
 
 class Table(Layer):
     """Table Reader.
@@ -66,12 +108,17 @@ class Table(Layer):
         minzoom (int): Layer's min zoom level.
         maxzoom (int): Layer's max zoom level.
         tileurl (str, optional): Layer's tiles url.
+        overzoom (bool): Derive tiles above maxzoom from the tile at maxzoom.
         type (str): Layer's type.
         schema (str): Table's database schema (e.g public).
         geometry_type (str): Table's geometry type (e.g polygon).
         srid (int): Table's SRID
         geometry_column (str): Name of the geomtry column in the table.
         properties (Dict): Properties available in the table.
+        geometry_index (bool, optional): The geometry column has a spatial index (GiST, SP-GiST or BRIN).
+        clustered (bool, optional): The table is clustered on its spatial index.
+        row_estimate (int, optional): Planner's estimate of the number of rows (-1 if never analyzed).
+        version (str, optional): Data version token (changes when the table's data changes).
 
     """
 
@@ -82,16 +129,38 @@ class Table(Layer):
     geometry_column: str
     geometry_srid: int
     properties: Dict[str, str]
+    geometry_index: Optional[bool]
+    clustered: Optional[bool]
+    row_estimate: Optional[int]
+    version: Optional[str]
+
+    def data_version(self) -> Optional[str]:
+        """Return the table's data version token."""
+        return self.version
+
+    def is_unindexed(self, min_rows: int) -> bool:
+        """Check if the table has no spatial index and more than `min_rows` rows."""
+        return self.geometry_index is False and (self.row_estimate or 0) >= min_rows
+
+    def columns(self, columns: Optional[str] = None) -> Dict[str, str]:
+        """Return the properties' names and types (comma-separated `columns` only)."""
+        cols = {k: v for k, v in self.properties.items() if k != self.geometry_column}
+        if columns is not None:
+            include_cols = [c.strip() for c in columns.split(",")]
+            cols = {k: v for k, v in cols.items() if k in include_cols}
 
-    async def get_tile(
-        self,
-        pool: asyncpg.BuildPgPool,
-        tile: Tile,
-        tms: TileMatrixSet,
-        **kwargs: Any,
-    ):
-        """Get Tile Data."""
-        bbox = tms.xy_bounds(tile)
+        return cols
+
+    def _query_values(
+        self, tms: TileMatrixSet, zoom: Optional[int] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        """Return the tile query values which do not depend on the tile.
+
+        With a layer style, only the properties used (unless `columns` is set)
+        and the features displayed at the zoom level are selected.
+
+        """
+        ctx = get_context(tms)
 
         limit = kwargs.get(
             "limit", str(tile_settings.max_features_per_tile)
@@ -109,92 +178,454 @@ class Table(Layer):
         buffer = kwargs.get(
             "buffer", str(tile_settings.tile_buffer)
         )  # Size of extra data to add for a tile.
+        filter = kwargs.get("filter")  # CQL2 filter on the table's properties
+        filter_lang = kwargs.get("filter-lang", "cql2-text")
 
         # create list of columns to return
         geometry_column = self.geometry_column
         geometry_srid = self.geometry_srid
-        cols = self.properties
-        if geometry_column in cols:
-            del cols[geometry_column]
+        cols = self.columns()
+
+        # Validate the filter against all the table's properties (not only the
+        # ones returned in the tile)
+        where = SqlBlock(RawDangerous("TRUE"))
+        if filter:
+            where = to_sql(parse_filter(filter, filter_lang), cols, alias="t")
+
+        style = style_registry.get(self.id)
+        pruning = (
+            style.prune(zoom, self.maxzoom) if style and zoom is not None else None
+        )
+        if pruning is not None:
+            properties, expr = pruning
+            if columns is None:
+                columns = ",".join(properties)
+
+            expr = typed_filter(expr, cols) if expr is not None else None
+            if expr is not None:
+                try:
+                    style_where = to_sql(expr, cols, alias="t")
+                except InvalidFilter:
+                    # The style's filter uses properties the table doesn't have
+                    pass
+                else:
+                    where = funcs.AND(where, style_where) if filter else style_where
 
         if columns is not None:
-            include_cols = [c.strip() for c in columns.split(",")]
-            for c in cols.copy():
-                if c not in include_cols:
-                    del cols[c]
+            cols = self.columns(columns)
+
+        return dict(
+            tablename=pg_variable(self.id),
+            geometry_column=pg_variable(geometry_column),
+            # NOTE: NULL values are not encoded (tiles without properties)
+            fields=select_fields(*cols)
+            if cols
+            else SqlBlock(RawDangerous("NULL AS pg_mvt_none")),
+            geometry_srid=funcs.cast(geometry_srid, "int"),
+            tms_proj=ctx.proj,
+            tms_srid=ctx.epsg,
+            tile_resolution=int(resolution),
+            tile_buffer=int(buffer),
+            where=where,
+            limit=limit,
+        )
+
+    def tile_query(
+        self, tile: Tile, tms: TileMatrixSet, **kwargs: Any
+    ) -> Tuple[str, List[Any]]:
+        """Return the tile SQL query and its parameters."""
+        bbox = get_context(tms).xy_bounds(tile)
+        values = self._query_values(tms, tile.z, **kwargs)
+
+        sql_query = """
+            WITH
+            -- bounds (the tile envelope) in TMS's CRS (SRID)
+            bounds_tmscrs AS (
+                SELECT
+                    ST_Segmentize(
+                        ST_MakeEnvelope(
+                            :xmin,
+                            :ymin,
+                            :xmax,
+                            :ymax,
+                            -- If EPSG is null we set it to 0
+                            coalesce(:tms_srid, 0)
+                        ),
+                        :seg_size
+                    ) AS geom
+            ),
+            bounds_geomcrs AS (
+                SELECT
+                    CASE WHEN coalesce(:tms_srid, 0) != 0 THEN
+                        ST_Transform(bounds_tmscrs.geom, :geometry_srid)
+                    ELSE
+                        ST_Transform(bounds_tmscrs.geom, :tms_proj, :geometry_srid)
+                    END as geom
+                FROM bounds_tmscrs
+            ),
+            mvtgeom AS (
+                SELECT ST_AsMVTGeom(
+                    CASE WHEN :tms_srid IS NOT NULL THEN
+                        ST_Transform(t.:geometry_column, :tms_srid)
+                    ELSE
+                        ST_Transform(t.:geometry_column, :tms_proj)
+                    END,
+                    bounds_tmscrs.geom,
+                    :tile_resolution,
+                    :tile_buffer
+                ) AS geom, :fields
+                FROM :tablename t, bounds_tmscrs, bounds_geomcrs
+                -- Find where geometries intersect with input Tile
+                -- Intersects test is made in table geometry's CRS (e.g WGS84)
+                WHERE ST_Intersects(
+                    t.:geometry_column, bounds_geomcrs.geom
+                )
+                -- Attribute filter (parameterized)
+                AND :where
+                LIMIT :limit
+            )
+            SELECT ST_AsMVT(mvtgeom.*) FROM mvtgeom
+        """
 
-        segSize = bbox.right - bbox.left
+        return render(
+            sql_query,
+            xmin=bbox.left,
+            ymin=bbox.bottom,
+            xmax=bbox.right,
+            ymax=bbox.top,
+            seg_size=bbox.right - bbox.left,
+            **values,
+        )
 
-        tms_srid = tms.crs.to_epsg()
-        tms_proj = tms.crs.to_proj4()
+    def tiles_query(
+        self, tiles: Sequence[Tile], tms: TileMatrixSet, **kwargs: Any
+    ) -> Tuple[str, List[Any]]:
+        """Return the SQL query and its parameters for tiles of a zoom level.
 
-        async with pool.acquire() as conn:
-            sql_query = """
-                WITH
-                -- bounds (the tile envelope) in TMS's CRS (SRID)
-                bounds_tmscrs AS (
-                    SELECT
-                        ST_Segmentize(
-                            ST_MakeEnvelope(
-                                :xmin,
-                                :ymin,
-                                :xmax,
-                                :ymax,
-                                -- If EPSG is null we set it to 0
-                                coalesce(:tms_srid, 0)
-                            ),
-                            :seg_size
-                        ) AS geom
-                ),
-                bounds_geomcrs AS (
-                    SELECT
-                        CASE WHEN coalesce(:tms_srid, 0) != 0 THEN
-                            ST_Transform(bounds_tmscrs.geom, :geometry_srid)
-                        ELSE
-                            ST_Transform(bounds_tmscrs.geom, :tms_proj, :geometry_srid)
-                        END as geom
-                    FROM bounds_tmscrs
-                ),
-                mvtgeom AS (
-                    SELECT ST_AsMVTGeom(
-                        CASE WHEN :tms_srid IS NOT NULL THEN
-                            ST_Transform(t.:geometry_column, :tms_srid)
-                        ELSE
-                            ST_Transform(t.:geometry_column, :tms_proj)
-                        END,
-                        bounds_tmscrs.geom,
-                        :tile_resolution,
-                        :tile_buffer
-                    ) AS geom, :fields
-                    FROM :tablename t, bounds_tmscrs, bounds_geomcrs
-                    -- Find where geometries intersect with input Tile
-                    -- Intersects test is made in table geometry's CRS (e.g WGS84)
-                    WHERE ST_Intersects(
-                        t.:geometry_column, bounds_geomcrs.geom
-                    ) LIMIT :limit
+        The query returns one `(idx, mvt)` row per tile, `idx` being the tile's
+        index in `tiles`.
+
+        """
+        ctx = get_context(tms)
+        bounds = [ctx.xy_bounds(tile) for tile in tiles]
+        values = self._query_values(tms, tiles[0].z, **kwargs)
+
+        sql_query = """
+            WITH
+            -- tiles' envelopes in TMS's CRS (SRID)
+            bounds_tmscrs AS (
+                SELECT
+                    b.idx,
+                    ST_Segmentize(
+                        ST_MakeEnvelope(
+                            b.xmin,
+                            b.ymin,
+                            b.xmax,
+                            b.ymax,
+                            -- If EPSG is null we set it to 0
+                            coalesce(:tms_srid, 0)
+                        ),
+                        b.xmax - b.xmin
+                    ) AS geom
+                FROM unnest(
+                    :idx::int[], :xmin::float8[], :ymin::float8[], :xmax::float8[], :ymax::float8[]
+                ) AS b(idx, xmin, ymin, xmax, ymax)
+            ),
+            bounds AS (
+                SELECT
+                    idx,
+                    geom AS tmsgeom,
+                    CASE WHEN coalesce(:tms_srid, 0) != 0 THEN
+                        ST_Transform(geom, :geometry_srid)
+                    ELSE
+                        ST_Transform(geom, :tms_proj, :geometry_srid)
+                    END as geom
+                FROM bounds_tmscrs
+            )
+            SELECT
+                bounds.idx,
+                (
+                    SELECT ST_AsMVT(mvtgeom.*) FROM (
+                        SELECT ST_AsMVTGeom(
+                            CASE WHEN :tms_srid IS NOT NULL THEN
+                                ST_Transform(t.:geometry_column, :tms_srid)
+                            ELSE
+                                ST_Transform(t.:geometry_column, :tms_proj)
+                            END,
+                            bounds.tmsgeom,
+                            :tile_resolution,
+                            :tile_buffer
+                        ) AS geom, :fields
+                        FROM :tablename t
+                        WHERE ST_Intersects(t.:geometry_column, bounds.geom)
+                        -- Attribute filter (parameterized)
+                        AND :where
+                        LIMIT :limit
+                    ) AS mvtgeom
+                ) AS mvt
+            FROM bounds
+        """
+
+        return render(
+            sql_query,
+            idx=list(range(len(tiles))),
+            xmin=[b.left for b in bounds],
+            ymin=[b.bottom for b in bounds],
+            xmax=[b.right for b in bounds],
+            ymax=[b.top for b in bounds],
+            **values,
+        )
+
+    def features_query(
+        self, tile: Tile, tms: TileMatrixSet, **kwargs: Any
+    ) -> Tuple[str, List[Any]]:
+        """Return the tile's features SQL query and its parameters.
+
+        Geometries are returned as WKB in TMS's CRS, snapped to the tile grid
+        (`resolution`), to be clipped and encoded by the application.
+
+        """
+        bbox = get_context(tms).xy_bounds(tile)
+        values = self._query_values(tms, tile.z, **kwargs)
+
+        sql_query = """
+            WITH
+            -- bounds (the tile envelope) in TMS's CRS (SRID)
+            bounds_tmscrs AS (
+                SELECT
+                    ST_Segmentize(
+                        ST_MakeEnvelope(
+                            :xmin,
+                            :ymin,
+                            :xmax,
+                            :ymax,
+                            -- If EPSG is null we set it to 0
+                            coalesce(:tms_srid, 0)
+                        ),
+                        :seg_size
+                    ) AS geom
+            ),
+            bounds_geomcrs AS (
+                SELECT
+                    CASE WHEN coalesce(:tms_srid, 0) != 0 THEN
+                        ST_Transform(bounds_tmscrs.geom, :geometry_srid)
+                    ELSE
+                        ST_Transform(bounds_tmscrs.geom, :tms_proj, :geometry_srid)
+                    END as geom
+                FROM bounds_tmscrs
+            )
+            SELECT ST_AsBinary(
+                ST_SnapToGrid(
+                    CASE WHEN :tms_srid IS NOT NULL THEN
+                        ST_Transform(t.:geometry_column, :tms_srid)
+                    ELSE
+                        ST_Transform(t.:geometry_column, :tms_proj)
+                    END,
+                    :xmin,
+                    :ymin,
+                    :cell_size,
+                    :cell_size
                 )
-                SELECT ST_AsMVT(mvtgeom.*) FROM mvtgeom
-            """
+            ) AS pg_mvt_geom, :fields
+            FROM :tablename t, bounds_geomcrs
+            -- Find where geometries intersect with input Tile
+            -- Intersects test is made in table geometry's CRS (e.g WGS84)
+            WHERE ST_Intersects(
+                t.:geometry_column, bounds_geomcrs.geom
+            )
+            -- Attribute filter (parameterized)
+            AND :where
+            LIMIT :limit
+        """
 
-            q, p = render(
-                sql_query,
-                tablename=pg_variable(self.id),
-                geometry_column=pg_variable(geometry_column),
-                fields=select_fields(*cols),
-                xmin=bbox.left,
-                ymin=bbox.bottom,
-                xmax=bbox.right,
-                ymax=bbox.top,
-                geometry_srid=funcs.cast(geometry_srid, "int"),
-                tms_proj=tms_proj,
-                tms_srid=tms_srid,
-                seg_size=segSize,
-                tile_resolution=int(resolution),
-                tile_buffer=int(buffer),
-                limit=limit,
+        return render(
+            sql_query,
+            xmin=bbox.left,
+            ymin=bbox.bottom,
+            xmax=bbox.right,
+            ymax=bbox.top,
+            seg_size=bbox.right - bbox.left,
+            cell_size=(bbox.right - bbox.left) / values["tile_resolution"],
+            **values,
+        )
+
+    def is_app_encoded(self) -> bool:
+        """Check if the layer's tiles are encoded by the application."""
+        layers = tile_settings.app_encoding_layers
+        return self.id in layers or "*" in layers
+
+    async def _fetch(
+        self, pool: asyncpg.BuildPgPool, method: str, q: str, p: List[Any]
+    ) -> Any:
+        """Run a query (with the layer's `SET LOCAL` settings)."""
+        async with pool.acquire() as conn:
+            settings = PgSettings().db_layer_settings.get(self.id)
+            if not settings:
+                return await getattr(conn, method)(q, *p)
+
+            async with conn.transaction():
+                await set_local(conn, settings)
+                return await getattr(conn, method)(q, *p)
+
+    async def prepare(self, conn: asyncpg.BuildPgConnection) -> None:
+        """Add the default tile query to the connection's statement cache."""
+        # `LIMIT 0` plans the query without reading the table
+        q, p = self.tile_query(
+            Tile(0, 0, 0), morecantile.tms.get("WebMercatorQuad"), limit="0"
+        )
+        await conn.fetchval(q, *p)
+
+    async def get_tile(
+        self,
+        pool: asyncpg.BuildPgPool,
+        tile: Tile,
+        tms: TileMatrixSet,
+        **kwargs: Any,
+    ):
+        """Get Tile Data."""
+        pg_settings = PgSettings()
+        if pg_settings.db_unindexed_tables == "refuse" and self.is_unindexed(
+            pg_settings.db_unindexed_min_rows
+        ):
+            raise UnindexedTable(
+                f"Table '{self.id}' has no spatial index on '{self.geometry_column}'."
+            )
+
+        style = style_registry.get(self.id)
+        if style is not None and style.prune(tile.z, self.maxzoom) is None:
+            # No style rule uses the layer at this zoom level
+            return b""
+
+        if self.is_app_encoded():
+            return await self._encode_tile(pool, tile, tms, **kwargs)
+
+        if pg_settings.db_batch_window > 0:
+            # Tiles are batched with the other tiles of the same layer, TMS, zoom
+            # level and query parameters requested within the batch window
+            key = (self.id, tms.identifier, tile.z, json.dumps(kwargs, sort_keys=True))
+            return await tile_batcher.get(
+                key, tile, partial(self.get_tiles, pool, tms=tms, **kwargs)
+            )
+
+        q, p = self.tile_query(tile, tms, **kwargs)
+        return await self._fetch(pool, "fetchval", q, p)
+
+    async def _encode_tile(
+        self,
+        pool: asyncpg.BuildPgPool,
+        tile: Tile,
+        tms: TileMatrixSet,
+        **kwargs: Any,
+    ) -> bytes:
+        """Get Tile Data, features are clipped and encoded in a process pool."""
+        q, p = self.features_query(tile, tms, **kwargs)
+        rows = await self._fetch(pool, "fetch", q, p)
+        if not rows:
+            return b""
+
+        return await encode_async(
+            [r["pg_mvt_geom"] for r in rows],
+            [{k: v for k, v in r.items() if k != "pg_mvt_geom"} for r in rows],
+            tuple(get_context(tms).xy_bounds(tile)),
+            extent=int(kwargs.get("resolution", tile_settings.tile_resolution)),
+            buffer=int(kwargs.get("buffer", tile_settings.tile_buffer)),
+        )
+
+    async def get_tiles(
+        self,
+        pool: asyncpg.BuildPgPool,
+        tiles: Sequence[Tile],
+        tms: TileMatrixSet,
+        **kwargs: Any,
+    ) -> List[bytes]:
+        """Get Tiles Data (tiles of the same zoom level, in one query)."""
+        q, p = self.tiles_query(tiles, tms, **kwargs)
+        rows = await self._fetch(pool, "fetch", q, p)
+
+        content = {row[0]: row[1] for row in rows}
+        return [content.get(idx) for idx in range(len(tiles))]
+
+    def export_query(
+        self,
+        bbox: Optional[Sequence[float]] = None,
+        limit: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Tuple[str, List[Any]]:
+        """Return the features export SQL query and its parameters.
+
+        The query returns one GeoJSON feature (text, in WGS84) per row.
+
+        Args:
+            bbox (list, optional): Features bounding box (WGS84 minx, miny, maxx, maxy).
+            limit (int, optional): Maximum number of features (all if not set).
+            kwargs (any): `columns`, `filter` and `filter-lang` options.
+
+        """
+        # NOTE: the TMS is only used by the tile options
+        values = self._query_values(morecantile.tms.get("WebMercatorQuad"), **kwargs)
+
+        sql_query = """
+            SELECT ST_AsGeoJSON(f.*, 'pg_mvt_geom')
+            FROM (
+                SELECT ST_Transform(t.:geometry_column, 4326) AS pg_mvt_geom, :fields
+                FROM :tablename t
+                WHERE :bbox_where
+                -- Attribute filter (parameterized)
+                AND :where
+                LIMIT :limit
+            ) AS f
+        """
+
+        bbox_where = SqlBlock(RawDangerous("TRUE"))
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = map(float, bbox)
+            bbox_where = Func(
+                "ST_Intersects",
+                pg_variable(f"t.{self.geometry_column}"),
+                Func(
+                    "ST_Transform",
+                    Func("ST_MakeEnvelope", xmin, ymin, xmax, ymax, 4326),
+                    values["geometry_srid"],
+                ),
             )
 
-            return await conn.fetchval(q, *p)
+        return render(
+            sql_query,
+            **{**values, "limit": limit, "bbox_where": bbox_where},
+        )
+
+    def iter_features(
+        self,
+        pool: asyncpg.BuildPgPool,
+        bbox: Optional[Sequence[float]] = None,
+        limit: Optional[int] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        """Iterate over the layer's features (GeoJSON) with a server-side cursor.
+
+        Rows are fetched by batches of `db_cursor_prefetch` rows, so memory use
+        doesn't depend on the number of features. The query is built (and the
+        filter validated) before the iteration starts.
+
+        """
+        q, p = self.export_query(bbox, limit, **kwargs)
+        return self._cursor(pool, q, p)
+
+    async def _cursor(
+        self, pool: asyncpg.BuildPgPool, q: str, p: List[Any]
+    ) -> AsyncIterator[str]:
+        pg_settings = PgSettings()
+        async with pool.acquire() as conn:
+            # Cursors only exist within a transaction
+            async with conn.transaction():
+                settings = pg_settings.db_layer_settings.get(self.id)
+                if settings:
+                    await set_local(conn, settings)
+
+                async for row in conn.cursor(
+                    q, *p, prefetch=pg_settings.db_cursor_prefetch
+                ):
+                    yield row[0]
 
 
 class Function(Layer):
@@ -206,6 +637,7 @@ class Function(Layer):
         minzoom (int): Layer's min zoom level.
         maxzoom (int): Layer's max zoom level.
         tileurl (str, optional): Layer's tiles url.
+        overzoom (bool): Derive tiles above maxzoom from the tile at maxzoom.
         type (str): Layer's type.
         function_name (str): Name of the SQL function to call. Defaults to `id`.
         sql (str): Valid SQL function which returns Tile data.
@@ -242,11 +674,13 @@ class Function(Layer):
         **kwargs: Any,
     ):
         """Get Tile Data."""
+        ctx = get_context(tms)
+
         # We only support TMS with valid EPSG code
-        if not tms.crs.to_epsg():
+        if not ctx.epsg:
             raise Exception(f"{tms.identifier}'s CRS does not have a valid EPSG code.")
 
-        bbox = tms.xy_bounds(tile)
+        bbox = ctx.xy_bounds(tile)
 
         async with pool.acquire() as conn:
             transaction = conn.transaction()
@@ -254,6 +688,10 @@ class Function(Layer):
             # Register the custom function
             await conn.execute(self.sql)
 
+            settings = PgSettings().db_layer_settings.get(self.id)
+            if settings:
+                await set_local(conn, settings)
+
             # Build the query
             sql_query = clauses.Select(
                 Func(
@@ -272,7 +710,7 @@ class Function(Layer):
                 ymin=bbox.bottom,
                 xmax=bbox.right,
                 ymax=bbox.top,
-                epsg=tms.crs.to_epsg(),
+                epsg=ctx.epsg,
                 query_params=json.dumps(kwargs),
             )
 
@@ -283,3 +721,148 @@ class Function(Layer):
             await transaction.rollback()
 
         return content
+
+
+class Archive(Layer):
+    """MBTiles/PMTiles archive Reader.
+
+    Tiles are read directly from a local archive (no database connection is
+    used).
+
+    Attributes:
+        id (str): Layer's name.
+        bounds (list): Layer's bounds (left, bottom, right, top).
+        minzoom (int): Layer's min zoom level.
+        maxzoom (int): Layer's max zoom level.
+        tileurl (str, optional): Layer's tiles url.
+        overzoom (bool): Derive tiles above maxzoom from the tile at maxzoom.
+        type (str): Layer's type.
+        path (str): Path to the `.mbtiles` or `.pmtiles` archive.
+
+    """
+
+    type: str = "Archive"
+    path: str
+
+    @classmethod
+    def from_file(cls, id: str, infile: str, **kwargs: Any):
+        """Create Layer from an archive, using its bounds and zooms as defaults."""
+        info = open_archive(infile).info
+        options = {
+            "bounds": info.bounds,
+            "minzoom": info.minzoom,
+            "maxzoom": info.maxzoom,
+            **kwargs,
+        }
+        return cls(id=id, path=infile, **options)
+
+    async def get_tile(
+        self,
+        pool: asyncpg.BuildPgPool,
+        tile: Tile,
+        tms: TileMatrixSet,
+        **kwargs: Any,
+    ):
+        """Get Tile Data."""
+        # MBTiles and PMTiles archives are stored in WebMercatorQuad
+        if tms.identifier != "WebMercatorQuad":
+            raise InvalidIdentifier(f"{self.id} only supports the WebMercatorQuad TMS.")
+
+        if not (0 <= tile.x < 1 << tile.z and 0 <= tile.y < 1 << tile.z):
+            raise TileNotFound(f"Tile {tile.z}/{tile.x}/{tile.y} does not exist.")
+
+        return open_archive(self.path).get(tile.z, tile.x, tile.y) or b""
+
+    def data_version(self) -> Optional[str]:
+        """Return the archive's data version token (archives are reopened on change)."""
+        return file_version(self.path)
+
+
+class FileTable(Layer):
+    """File (GeoParquet, FlatGeobuf, ...) Reader.
+
+    The dataset is loaded in memory (columnar arrays + STR-tree index) and the
+    tiles are encoded in a process pool. The dataset is reloaded when the file
+    changes.
+
+    Attributes:
+        id (str): Layer's name.
+        bounds (list): Layer's bounds (left, bottom, right, top).
+        minzoom (int): Layer's min zoom level.
+        maxzoom (int): Layer's max zoom level.
+        tileurl (str, optional): Layer's tiles url.
+        overzoom (bool): Derive tiles above maxzoom from the tile at maxzoom.
+        type (str): Layer's type.
+        path (str): Path to the dataset.
+        geometry_type (str): Dataset's geometry type (e.g polygon).
+        properties (Dict): Properties available in the dataset.
+
+    """
+
+    type: str = "FileTable"
+    path: str
+    geometry_type: str
+    properties: Dict[str, str]
+
+    @classmethod
+    def from_file(cls, id: str, infile: str, **kwargs: Any):
+        """Load dataset from file."""
+        # NOTE: imported on use, the dataset dependencies are slow to import
+        from pg_mvt.dataset import open_dataset
+
+        dataset = open_dataset(infile)
+        options = {
+            "bounds": dataset.bounds,
+            "geometry_type": dataset.geometry_type,
+            "properties": dataset.properties,
+            **kwargs,
+        }
+        return cls(id=id, path=infile, **options)
+
+    async def get_tile(
+        self,
+        pool: asyncpg.BuildPgPool,
+        tile: Tile,
+        tms: TileMatrixSet,
+        **kwargs: Any,
+    ):
+        """Get Tile Data."""
+        ctx = get_context(tms)
+        bbox = ctx.xy_bounds(tile)
+
+        limit = kwargs.get("limit", str(tile_settings.max_features_per_tile))
+        limit = min(int(limit), tile_settings.max_features_per_tile)
+        if limit == -1:
+            limit = tile_settings.max_features_per_tile
+
+        columns = kwargs.get("columns")
+        resolution = kwargs.get("resolution", str(tile_settings.tile_resolution))
+        buffer = kwargs.get("buffer", str(tile_settings.tile_buffer))
+
+        cols = list(self.properties)
+        if columns is not None:
+            include_cols = [c.strip() for c in columns.split(",")]
+            cols = [c for c in cols if c in include_cols]
+
+        from pg_mvt.dataset import open_dataset
+
+        # NOTE: (re)loading a changed dataset and querying its index are blocking
+        dataset = await run_in_threadpool(open_dataset, self.path)
+        indices = await run_in_threadpool(
+            dataset.query, bbox, tms.crs, tms.identifier, limit=limit
+        )
+        if not len(indices):
+            return b""
+
+        return await encode_async(
+            dataset.wkb(indices),
+            dataset.rows(indices, cols),
+            tuple(bbox),
+            extent=int(resolution),
+            buffer=int(buffer),
+            crs=(dataset.crs_wkt, ctx.wkt),
+        )
+
+    def data_version(self) -> Optional[str]:
+        """Return the dataset's data version token (datasets are reloaded on change)."""
+        return file_version(self.path)
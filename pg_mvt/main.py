@@ -1,34 +1,36 @@
 """pg_mvt app."""
 
-from typing import Dict
-
-from pg_mvt.db import close_db_connection, connect_to_db
-from pg_mvt.factory import TilerEndpoints, TMSEndpoints
+import asyncio
+import warnings
+from typing import Any, Dict, List
+
+from pg_mvt.cache import create_cache, create_document_cache
+from pg_mvt.db import close_db_connection, connect_to_db, watch_table_versions
+from pg_mvt.errors import exception_handlers
+from pg_mvt.factory import AdminEndpoints, TilerEndpoints, TMSEndpoints, get_templates
 from pg_mvt.middleware import CacheControlMiddleware
-from pg_mvt.settings import APISettings
+from pg_mvt.mvt import shutdown_executor
+from pg_mvt.popularity import Popularity, persist_popularity, warm_popular_tiles
+from pg_mvt.settings import APISettings, CacheSettings, PgSettings, TileSettings
+from pg_mvt.style import style_registry
 from pg_mvt.version import __version__ as pg_mvt_version
 
 from starlite import MediaType, OpenAPIConfig, Request, Starlite, get
 
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware import Middleware
-from starlette.templating import Jinja2Templates
 from starlette_cramjam.middleware import CompressionMiddleware
 
-try:
-    from importlib.resources import files as resources_files  # type: ignore
-except ImportError:
-    from importlib_resources import files as resources_files  # type: ignore
-
-
 settings = APISettings()
-
-templates = Jinja2Templates(directory=str(resources_files(__package__) / "templates"))  # type: ignore
+pg_settings = PgSettings()
+cache_settings = CacheSettings()
+tile_settings = TileSettings()
 
 
 @get(path="/", media_type=MediaType.HTML, include_in_schema=False)
 def index(request: Request) -> str:
     """DEMO."""
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         name="index.html",
         context={"index": request.app.state.table_catalog, "request": request},
         media_type="text/html",
@@ -41,26 +43,34 @@ def ping() -> Dict:
     return {"ping": "pong!"}
 
 
+route_handlers: List[Any] = [
+    ping,
+    TilerEndpoints if settings.html_endpoints else TilerEndpoints.factory(viewer=False),
+    TMSEndpoints,
+]
+if settings.html_endpoints:
+    route_handlers.insert(0, index)
+if settings.admin_endpoints:
+    route_handlers.append(AdminEndpoints)
+
 app = Starlite(
-    route_handlers=[
-        index,
-        ping,
-        TilerEndpoints,
-        TMSEndpoints,
-    ],
+    route_handlers=route_handlers,
     middleware=[
         Middleware(
             CacheControlMiddleware,
             cachecontrol=settings.cachecontrol,
-            exclude_path={r"/healthz"},
+            exclude_path={r"/healthz", r"/admin/"},
         ),
         Middleware(CompressionMiddleware, minimum_size=0),
     ],
     cors_config=settings.cors_config,
+    exception_handlers=exception_handlers(),
     openapi_config=OpenAPIConfig(
         title=settings.name,
         version=pg_mvt_version,
-    ),
+    )
+    if settings.openapi_endpoints
+    else None,
 )
 
 
@@ -69,9 +79,59 @@ app = Starlite(
 async def startup_event():
     """Application startup: register the database connection and create table list."""
     await connect_to_db(app)
+    for path in tile_settings.style_files:
+        style_registry.load(path)
+    if pg_settings.db_version_interval > 0:
+        app.state.version_watcher = asyncio.create_task(
+            watch_table_versions(app, pg_settings.db_version_interval)
+        )
+    app.state.cache = create_cache()
+    app.state.documents = create_document_cache()
+
+    # Render the most popular tiles of the previous run in the background
+    app.state.popularity = None
+    if cache_settings.popularity_path:
+        # Counts since the last save (added to the saved sketch)
+        popularity = Popularity(k=cache_settings.popularity_top_k)
+        app.state.popularity = popularity
+        app.state.popularity_tasks = [
+            asyncio.create_task(
+                persist_popularity(
+                    popularity,
+                    cache_settings.popularity_path,
+                    cache_settings.popularity_interval,
+                )
+            ),
+        ]
+        if not cache_settings.disable:
+            app.state.popularity_tasks.append(
+                asyncio.create_task(
+                    warm_popular_tiles(
+                        app,
+                        Popularity.load(
+                            cache_settings.popularity_path,
+                            k=cache_settings.popularity_top_k,
+                        ),
+                        concurrency=cache_settings.popularity_warmup_concurrency,
+                    )
+                )
+            )
 
 
 @app.asgi_router.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown: de-register the database connection."""
+    watcher = getattr(app.state, "version_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
+    for task in getattr(app.state, "popularity_tasks", []):
+        task.cancel()
+    if getattr(app.state, "popularity", None) is not None:
+        try:
+            await run_in_threadpool(
+                app.state.popularity.save, cache_settings.popularity_path
+            )
+        except OSError as e:
+            warnings.warn(f"Cannot save tile popularity: {e!r}", RuntimeWarning)
     await close_db_connection(app)
+    shutdown_executor()
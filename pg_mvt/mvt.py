@@ -0,0 +1,203 @@
+"""pg_mvt.mvt: In-process Mapbox Vector Tile encoding."""
+
+import asyncio
+import datetime
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from pg_mvt.settings import TileSettings
+
+# NOTE: the encoding dependencies (mapbox-vector-tile, shapely, numpy, pyproj)
+# are imported on first use, so they don't slow down pg_mvt's import when tiles
+# are encoded by the database.
+
+tile_settings = TileSettings()
+
+_executor: Optional[Executor] = None
+
+
+@lru_cache(maxsize=32)
+def _transformer(src_crs: str, dst_crs: str) -> Any:
+    """Return cached pyproj Transformer."""
+    from pyproj import Transformer
+
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def _value(value: Any) -> Any:
+    """Convert a property value to a type supported by MVT."""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+
+    return str(value)
+
+
+def encode(
+    geometries: Sequence[Any],
+    properties: Sequence[Dict],
+    bbox: Tuple[float, float, float, float],
+    extent: int = 4096,
+    buffer: int = 256,
+    name: str = "default",
+    y_coord_down: bool = False,
+    crs: Optional[Tuple[str, str]] = None,
+) -> bytes:
+    """Clip, quantize and encode features in a Mapbox Vector Tile.
+
+    Args:
+        geometries (sequence): WKB geometries (or shapely geometries).
+        properties (sequence): Features properties.
+        bbox (tuple): Tile bounds in the geometries (output) CRS.
+        extent (int): Tile extent (resolution).
+        buffer (int): Tile buffer, in tile pixels.
+        name (str): MVT layer name.
+        y_coord_down (bool): Y coordinates are pointing down (tile space).
+        crs (tuple, optional): (source, destination) CRS to reproject the geometries.
+
+    Returns:
+        bytes: Mapbox Vector Tile.
+
+    """
+    import mapbox_vector_tile
+    import numpy
+    import shapely
+
+    geoms = numpy.asarray(geometries, dtype=object)
+    if len(geoms) and not isinstance(geoms[0], shapely.Geometry):
+        geoms = shapely.from_wkb(geoms)
+
+    if crs and crs[0] != crs[1]:
+        transformer = _transformer(*crs)
+        geoms = shapely.transform(
+            geoms, lambda c: numpy.column_stack(transformer.transform(c[:, 0], c[:, 1]))
+        )
+
+    minx, miny, maxx, maxy = bbox
+    pad_x = buffer * (maxx - minx) / extent
+    pad_y = buffer * (maxy - miny) / extent
+    geoms = shapely.clip_by_rect(
+        geoms, minx - pad_x, miny - pad_y, maxx + pad_x, maxy + pad_y
+    )
+
+    features = [
+        {
+            "geometry": geom,
+            "properties": {
+                k: _value(v) for k, v in (props or {}).items() if v is not None
+            },
+        }
+        for geom, props in zip(geoms, properties)
+        if geom is not None and not geom.is_empty
+    ]
+
+    return mapbox_vector_tile.encode(
+        [{"name": name, "features": features}],
+        default_options={
+            "quantize_bounds": bbox,
+            "extents": extent,
+            "y_coord_down": y_coord_down,
+        },
+    )
+
+
+def overzoom(
+    content: bytes,
+    parent: Tuple[int, int, int],
+    tile: Tuple[int, int, int],
+    buffer: int = 256,
+) -> bytes:
+    """Derive a child tile from one of its ancestor tiles.
+
+    The ancestor's features are decoded, clipped to the child tile (plus buffer)
+    and rescaled to the child tile extent.
+
+    Args:
+        content (bytes): Ancestor Mapbox Vector Tile.
+        parent (tuple): Ancestor tile (z, x, y).
+        tile (tuple): Child tile (z, x, y).
+        buffer (int): Tile buffer, in tile pixels.
+
+    Returns:
+        bytes: Mapbox Vector Tile.
+
+    """
+    import mapbox_vector_tile
+    import shapely.geometry
+
+    if not content:
+        return b""
+
+    pz, px, py = parent
+    z, x, y = tile
+    scale = 1 << (z - pz)
+
+    layers = mapbox_vector_tile.decode(content, default_options={"y_coord_down": True})
+
+    # A tile with multiple layers is the concatenation of single-layer tiles
+    data = b""
+    for name, layer in layers.items():
+        extent = layer["extent"]
+        size = extent / scale
+        minx = (x - px * scale) * size
+        miny = (y - py * scale) * size
+
+        features = layer["features"]
+        data += encode(
+            [shapely.geometry.shape(feat["geometry"]) for feat in features],
+            [feat["properties"] for feat in features],
+            (minx, miny, minx + size, miny + size),
+            extent=extent,
+            buffer=buffer,
+            name=name,
+            y_coord_down=True,
+        )
+
+    return data
+
+
+def get_executor() -> Optional[Executor]:
+    """Return the process pool used to encode tiles.
+
+    Returns `None` (default thread pool) when `PG_MVT_ENCODER_PROCESSES=0`.
+
+    """
+    global _executor
+
+    if tile_settings.encoder_processes == 0:
+        return None
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=tile_settings.encoder_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _executor
+
+
+def shutdown_executor():
+    """Shutdown the encoding process pool."""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def encode_async(*args: Any, **kwargs: Any) -> bytes:
+    """Encode features in a Mapbox Vector Tile, outside the event loop."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(), partial(encode, *args, **kwargs))
+
+
+async def overzoom_async(*args: Any, **kwargs: Any) -> bytes:
+    """Derive a child tile from an ancestor tile, outside the event loop."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        get_executor(), partial(overzoom, *args, **kwargs)
+    )
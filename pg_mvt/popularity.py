@@ -0,0 +1,369 @@
+"""pg_mvt.popularity: Tile popularity sketch (warm restarts).
+
+Tile requests are counted in a Count-Min sketch and the most requested tiles
+of each layer are kept in a top-K list. The sketch is persisted periodically so
+the most popular tiles can be rendered (and cached) again after a restart.
+
+Each process adds its counts to the sketch saved in the file (under a file
+lock), so workers sharing the same file persist all the requests.
+
+"""
+
+import asyncio
+import base64
+import hashlib
+import heapq
+import json
+import os
+import random
+import tempfile
+import time
+import warnings
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from morecantile import Tile, tms
+
+from pg_mvt.functions import registry as FunctionRegistry
+from pg_mvt.layer import Layer, Table
+from pg_mvt.tiles import get_tile
+
+from starlite import Starlite
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import fcntl
+except ImportError:  # pragma: nocover
+    fcntl = None  # type: ignore
+
+
+class CountMinSketch:
+    """Count-Min sketch (approximate counts, never under-estimated).
+
+    Attributes:
+        width (int): Number of counters per row.
+        depth (int): Number of rows (hash functions).
+
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        """Create empty sketch."""
+        self.width = width
+        self.depth = depth
+        self.counts = array("I", bytes(4 * width * depth))
+
+    def _indexes(self, key: str) -> List[int]:
+        """Return the counter index of the key in each row (stable hashes)."""
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [
+            row * self.width
+            + int.from_bytes(digest[4 * row : 4 * row + 4], "little") % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Count the key and return its estimated count."""
+        estimate = None
+        for idx in self._indexes(key):
+            value = min(self.counts[idx] + count, 2**32 - 1)
+            self.counts[idx] = value
+            estimate = value if estimate is None else min(estimate, value)
+
+        return estimate or 0
+
+    def estimate(self, key: str) -> int:
+        """Return the key's estimated count."""
+        return min(self.counts[idx] for idx in self._indexes(key))
+
+    def decay(self):
+        """Halve all the counts."""
+        for idx in range(len(self.counts)):
+            self.counts[idx] >>= 1
+
+    def merge(self, other: "CountMinSketch"):
+        """Add the counts of a sketch of the same size."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge sketches of different sizes.")
+
+        for idx, value in enumerate(other.counts):
+            self.counts[idx] = min(self.counts[idx] + value, 2**32 - 1)
+
+
+class TopK:
+    """Keys with the highest counts (min-heap with lazy updates)."""
+
+    def __init__(self, k: int = 1000):
+        """Create empty top-K."""
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def _push(self, key: str, count: int):
+        heapq.heappush(self._heap, (count, key))
+        # Drop outdated entries
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def update(self, key: str, count: int):
+        """Update the key's count."""
+        if key in self.counts or len(self.counts) < self.k:
+            self.counts[key] = count
+            self._push(key, count)
+            return
+
+        # Smallest (up-to-date) entry
+        while self._heap and self.counts.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        if self._heap and count > self._heap[0][0]:
+            _, evicted = heapq.heappop(self._heap)
+            del self.counts[evicted]
+            self.counts[key] = count
+            self._push(key, count)
+
+    def items(self) -> List[Tuple[str, int]]:
+        """Return keys and counts, most popular first."""
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+
+
+class Popularity:
+    """Tile popularity: Count-Min sketch and top-K tiles per layer.
+
+    Attributes:
+        k (int): Number of tiles kept per layer.
+        sketch (CountMinSketch): Tiles' counts.
+        top (dict): Top-K tiles for each layer.
+        decayed_at (float): Time of the last decay (epoch seconds).
+
+    """
+
+    def __init__(self, k: int = 1000, width: int = 2048, depth: int = 4):
+        """Create empty popularity sketch."""
+        self.k = k
+        self.sketch = CountMinSketch(width=width, depth=depth)
+        self.top: Dict[str, TopK] = {}
+        self.decayed_at = time.time()
+
+    def add(self, layer_id: str, key: str):
+        """Count a tile request (`key` is the tile's cache key)."""
+        count = self.sketch.add(key)
+        top = self.top.get(layer_id)
+        if top is None:
+            top = self.top[layer_id] = TopK(self.k)
+        top.update(key, count)
+
+    def tiles(self) -> List[str]:
+        """Return the top tiles' keys of all the layers, most popular first."""
+        items = [item for top in self.top.values() for item in top.items()]
+        return [key for key, _ in sorted(items, key=lambda item: item[1], reverse=True)]
+
+    def decay(self):
+        """Halve all the counts (older requests weight less)."""
+        self.sketch.decay()
+        for top in self.top.values():
+            for key, count in top.items():
+                top.counts[key] = count >> 1
+            top._heap = [(c, k) for k, c in top.counts.items()]
+            heapq.heapify(top._heap)
+        self.decayed_at = time.time()
+
+    def merge(self, other: "Popularity"):
+        """Add the counts of another sketch (e.g another process')."""
+        self.sketch.merge(other.sketch)
+        for layer_id, other_top in other.top.items():
+            top = self.top.get(layer_id)
+            if top is None:
+                top = self.top[layer_id] = TopK(self.k)
+            for key in [*top.counts, *other_top.counts]:
+                top.update(key, self.sketch.estimate(key))
+
+    def clear(self):
+        """Reset all the counts."""
+        self.sketch = CountMinSketch(width=self.sketch.width, depth=self.sketch.depth)
+        self.top = {}
+
+    def take(self) -> "Popularity":
+        """Return the counts in a new sketch and reset this one."""
+        taken = Popularity(k=self.k, width=self.sketch.width, depth=self.sketch.depth)
+        taken.sketch, self.sketch = self.sketch, taken.sketch
+        taken.top, self.top = self.top, taken.top
+        return taken
+
+    def dumps(self) -> bytes:
+        """Serialize the sketch."""
+        return json.dumps(
+            {
+                "k": self.k,
+                "width": self.sketch.width,
+                "depth": self.sketch.depth,
+                "counts": base64.b64encode(self.sketch.counts.tobytes()).decode(),
+                "top": {layer: dict(top.counts) for layer, top in self.top.items()},
+                "decayed_at": self.decayed_at,
+            }
+        ).encode()
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Popularity":
+        """Deserialize a sketch."""
+        content = json.loads(data)
+        popularity = cls(k=content["k"], width=content["width"], depth=content["depth"])
+        popularity.sketch.counts = array("I")
+        popularity.sketch.counts.frombytes(base64.b64decode(content["counts"]))
+        for layer, counts in content["top"].items():
+            top = popularity.top[layer] = TopK(popularity.k)
+            for key, count in counts.items():
+                top.update(key, count)
+        popularity.decayed_at = content.get("decayed_at", popularity.decayed_at)
+
+        return popularity
+
+    def save(self, path: str, decay_interval: Optional[float] = None):
+        """Add the sketch's counts to the sketch saved in a file.
+
+        The file is replaced atomically, under an exclusive lock (`{path}.lock`)
+        so processes sharing the file don't overwrite each other's counts.
+
+        Args:
+            path (str): Sketch file.
+            decay_interval (float, optional): Halve the saved counts if they were
+                not halved for `decay_interval` seconds.
+
+        """
+        with open(f"{path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+            saved = Popularity.load(path, k=self.k)
+            try:
+                saved.merge(self)
+            except ValueError:
+                # Sketch of another size: replaced
+                saved = Popularity.loads(self.dumps())
+
+            if decay_interval and time.time() - saved.decayed_at >= decay_interval:
+                saved.decay()
+
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(path) or None, prefix=f"{os.path.basename(path)}."
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(saved.dumps())
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    @classmethod
+    def load(cls, path: str, k: int = 1000) -> "Popularity":
+        """Read the sketch from a file (empty sketch if missing or invalid)."""
+        try:
+            with open(path, "rb") as f:
+                popularity = cls.loads(f.read())
+        except (OSError, ValueError, KeyError):
+            return cls(k=k)
+
+        popularity.k = k
+        return popularity
+
+
+def parse_cache_key(key: str) -> Tuple[str, str, Tile, Dict[str, Any]]:
+    """Return layer id, TMS id, tile and query parameters from a tile's cache key."""
+    path, _, query = key.partition("?")
+    layer_id, tms_id, z, x, y = path.rsplit("/", 4)
+
+    params: Dict[str, Any] = {}
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name in params:
+            previous = params[name]
+            params[name] = (
+                previous + [value] if isinstance(previous, list) else [previous, value]
+            )
+        else:
+            params[name] = value
+
+    return layer_id, tms_id, Tile(int(x), int(y), int(z)), params
+
+
+def _get_layer(app: Starlite, layer_id: str) -> Optional[Layer]:
+    """Return Function/Archive from the registry or Table from the catalog."""
+    layer = FunctionRegistry.get(layer_id)
+    if layer is not None:
+        return layer
+
+    for r in app.state.table_catalog:
+        if r["id"] == layer_id:
+            return Table(**r)
+
+    return None
+
+
+async def warm_popular_tiles(
+    app: Starlite, popularity: Popularity, concurrency: int = 4
+) -> int:
+    """Render (and cache) the most popular tiles, return the number of tiles.
+
+    Args:
+        app (Starlite): Starlite application (database pool, catalog and cache).
+        popularity (Popularity): Popularity sketch.
+        concurrency (int): Maximum number of tiles rendered concurrently.
+
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _render(key: str) -> bool:
+        layer_id, tms_id, tile, params = parse_cache_key(key)
+        layer = _get_layer(app, layer_id)
+        if layer is None:
+            return False
+
+        # Rendered for the current data version (the one of the TileJSON urls)
+        params.pop("v", None)
+        version = layer.data_version()
+        if version is not None:
+            params["v"] = version
+
+        async with semaphore:
+            try:
+                await get_tile(
+                    app.state.pool,
+                    app.state.cache,
+                    layer,
+                    tile,
+                    tms.get(tms_id),
+                    **params,
+                )
+            except Exception:
+                return False
+
+        return True
+
+    results = await asyncio.gather(*[_render(key) for key in popularity.tiles()])
+    return sum(results)
+
+
+async def persist_popularity(
+    popularity: Popularity, path: str, interval: float, decay: bool = True
+):
+    """Add the counts to the saved sketch about every `interval` seconds.
+
+    The saved counts are halved every `interval` seconds (if `decay`) and the
+    process' counts reset once saved. The sketch is saved in a thread (the file
+    is locked while other processes save theirs) and the interval is jittered
+    so processes started together don't save at the same time.
+
+    """
+    while True:
+        await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+        counts = popularity.take()
+        try:
+            await run_in_threadpool(
+                counts.save, path, decay_interval=interval if decay else None
+            )
+        except OSError as e:
+            warnings.warn(f"Cannot save tile popularity: {e!r}", RuntimeWarning)
+            # Saved with the next counts
+            popularity.merge(counts)
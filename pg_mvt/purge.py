@@ -0,0 +1,142 @@
+"""pg_mvt.purge: CDN surrogate keys and purge hooks.
+
+Tile responses are tagged with surrogate keys for the layer, the layer's zoom
+level and the layer's region (quadkey of the tile's ancestor at a coarse zoom
+level) so a CDN can purge a layer, a zoom level or a region of a layer.
+
+"""
+
+import inspect
+from dataclasses import dataclass
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Sequence
+
+import morecantile
+from morecantile import Tile, TileMatrixSet
+from morecantile.errors import InvalidIdentifier
+
+from pg_mvt.tiles import ancestor
+from pg_mvt.tms import get_context
+
+
+def quadkey(tile: Tile) -> str:
+    """Return the quadkey of a tile."""
+    digits = []
+    for z in range(tile.z, 0, -1):
+        mask = 1 << (z - 1)
+        digits.append(str((1 if tile.x & mask else 0) + (2 if tile.y & mask else 0)))
+
+    return "".join(digits)
+
+
+def region_key(layer_id: str, tms: TileMatrixSet, tile: Tile) -> str:
+    """Return the surrogate key of a layer's region (`{layer}/{tms}/q{quadkey}`)."""
+    return f"{layer_id}/{tms.identifier}/q{quadkey(tile)}"
+
+
+def surrogate_keys(
+    layer_id: str, tile: Tile, tms: TileMatrixSet, zoom: int = 6
+) -> List[str]:
+    """Return a tile's surrogate keys.
+
+    Args:
+        layer_id (str): Layer's id.
+        tile (Tile): Tile object with X,Y,Z indices.
+        tms (TileMatrixSet): Tile Matrix Set.
+        zoom (int): Zoom level of the region key (quadkey prefix length).
+
+    Returns:
+        list: layer, layer's zoom (`{layer}/{z}`) and, for quadtree TMS, layer's
+            region keys.
+
+    """
+    keys = [layer_id, f"{layer_id}/{tile.z}"]
+    if get_context(tms).is_quadtree:
+        region = ancestor(tile, zoom) if tile.z > zoom else tile
+        keys.append(region_key(layer_id, tms, region))
+
+    return keys
+
+
+def purge_keys(
+    layer_id: str,
+    tms: Optional[TileMatrixSet] = None,
+    bbox: Optional[Sequence[float]] = None,
+    zoom: int = 6,
+) -> List[str]:
+    """Return the surrogate keys to purge a layer or a region of a layer.
+
+    Args:
+        layer_id (str): Layer's id.
+        tms (TileMatrixSet, optional): Tile Matrix Set (for regions).
+        bbox (sequence, optional): Region bounds, in the TMS's geographic CRS.
+        zoom (int): Zoom level of the region keys.
+
+    Returns:
+        list: Surrogate keys (the layer's key if no region is given).
+
+    """
+    if bbox is None or tms is None or not get_context(tms).is_quadtree:
+        return [layer_id]
+
+    # Tiles below `zoom` are tagged with their own quadkey (all the prefixes)
+    keys: Dict[str, None] = {}
+    for tile in tms.tiles(*bbox, zooms=[zoom]):
+        for z in range(zoom + 1):
+            key = region_key(layer_id, tms, ancestor(tile, z))
+            keys[key] = None
+
+    return list(keys)
+
+
+def purged(key: str, keys: Sequence[str], zoom: int = 6) -> bool:
+    """Check if a cached tile is tagged with one of the purged surrogate keys.
+
+    Args:
+        key (str): Tile cache key (`{layer}/{tms}/{z}/{x}/{y}?{params}`).
+        keys (sequence): Purged surrogate keys.
+        zoom (int): Zoom level of the region keys.
+
+    """
+    path = key.partition("?")[0]
+    try:
+        layer_id, tms_id, z, x, y = path.rsplit("/", 4)
+        tile = Tile(int(x), int(y), int(z))
+    except ValueError:
+        return False
+
+    if layer_id in keys:
+        return True
+
+    if not any(k.startswith(f"{layer_id}/") for k in keys):
+        return False
+
+    try:
+        tms = morecantile.tms.get(tms_id)
+    except InvalidIdentifier:
+        # custom TileMatrixSet: purge all the layer's tiles
+        return True
+
+    return not set(surrogate_keys(layer_id, tile, tms, zoom)).isdisjoint(keys)
+
+
+@dataclass
+class PurgeHooks:
+    """purge hooks registry"""
+
+    hooks: ClassVar[List[Callable[[List[str]], Any]]] = []
+
+    @classmethod
+    def register(cls, *args: Callable[[List[str]], Any]):
+        """register purge hook(s), called (or awaited) with the keys to purge"""
+        cls.hooks.extend(args)
+
+    @classmethod
+    async def emit(cls, keys: List[str]):
+        """call the purge hooks"""
+        for hook in cls.hooks:
+            result = hook(keys)
+            if inspect.isawaitable(result):
+                await result
+
+
+purge_hooks = PurgeHooks()
@@ -0,0 +1,374 @@
+"""pg_mvt.replay: Access log replay (load testing).
+
+Requests of an access log are sent to a pg_mvt instance at their original
+times (or scaled with `speed`), whether the previous requests completed or not
+(open-loop arrival), so slow responses don't slow down the workload. Latencies
+are reported per layer and zoom level, with the database pool usage sampled
+from the `/admin/pool.json` endpoint (`PG_MVT_ADMIN_ENDPOINTS=TRUE`).
+
+Requests reuse keep-alive connections and accept gzip encoded responses, like
+browsers and tile clients, so latencies don't include a TCP connection setup
+per request. With several workers (`pg_mvt serve --workers`), each pool sample
+is the pool of the worker which answered it (the report has the number of
+workers sampled), not of the whole server.
+
+Supported logs (one request per line):
+
+- Common/Combined Log Format (e.g nginx, Apache):
+  `127.0.0.1 - - [10/Oct/2023:13:55:36 +0000] "GET /tiles/public.roads/1/0/0.pbf HTTP/1.1" 200 ...`
+- JSON lines with the request's time in seconds and path:
+  `{"t": 12.5, "path": "/tiles/public.roads/1/0/0.pbf"}`
+- Request paths (or lines without time, e.g uvicorn access logs), sent at
+  `rate` requests per second.
+
+"""
+
+import asyncio
+import json
+import math
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from pg_mvt.cluster import HTTP_ERRORS, read_response
+
+CLF_TIME = re.compile(r"\[(?P<time>[^\]]+)\]")
+REQUEST_LINE = re.compile(r'"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+"')
+TILE_PATH = re.compile(
+    r"/tiles/(?:[^/?]+/)?(?P<layer>[^/?]+)/(?P<z>\d+)/\d+/\d+(?:\.pbf)?(?:\?|$)"
+)
+
+
+@dataclass
+class ReplayRequest:
+    """Request to replay.
+
+    Attributes:
+        offset (float): Time, in seconds, from the start of the replay.
+        path (str): Request path (and query string).
+
+    """
+
+    offset: float
+    path: str
+
+
+def parse_line(line: str) -> Optional[Tuple[Optional[float], str]]:
+    """Return the time (epoch seconds, if any) and path of a log line's GET request."""
+    line = line.strip()
+    if not line:
+        return None
+
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+
+        path = record.get("path") or record.get("url")
+        if not path or record.get("method", "GET").upper() != "GET":
+            return None
+
+        t = record.get("t", record.get("time"))
+        return (float(t) if t is not None else None), path
+
+    if line.startswith("/"):
+        return None, line
+
+    request = REQUEST_LINE.search(line)
+    if request is None or request.group("method") != "GET":
+        return None
+
+    match = CLF_TIME.search(line)
+    if match:
+        try:
+            t = datetime.strptime(match.group("time"), "%d/%b/%Y:%H:%M:%S %z")
+        except ValueError:
+            pass
+        else:
+            return t.timestamp(), request.group("path")
+
+    return None, request.group("path")
+
+
+def parse_log(lines: Iterable[str], rate: float = 10) -> List[ReplayRequest]:
+    """Parse an access log into requests (sorted by offset).
+
+    Args:
+        lines (iterable): Log lines.
+        rate (float): Requests per second for requests without time.
+
+    """
+    entries = [e for e in map(parse_line, lines) if e is not None]
+    timed = [t for t, _ in entries if t is not None]
+    start = min(timed) if timed else 0.0
+
+    requests = []
+    for i, (t, path) in enumerate(entries):
+        # URLs are replayed against the target's host
+        parts = urlsplit(path)
+        if parts.scheme:
+            path = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        offset = t - start if t is not None else i / rate
+        requests.append(ReplayRequest(offset, path))
+
+    return sorted(requests, key=lambda r: r.offset)
+
+
+def request_group(path: str) -> Tuple[str, Optional[int]]:
+    """Return the layer and zoom level of a tile request (`other` otherwise)."""
+    match = TILE_PATH.search(path)
+    if match is None:
+        return "other", None
+
+    return match.group("layer"), int(match.group("z"))
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections, per host.
+
+    Connections are opened when none is idle (requests are never queued) and
+    up to `max_idle` connections per host are kept open once their response
+    was read.
+
+    Attributes:
+        max_idle (int): Maximum number of idle connections per host.
+
+    """
+
+    def __init__(self, max_idle: int = 32):
+        """Create pool."""
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple[str, int, bool], List] = defaultdict(list)
+
+    async def get(
+        self, url: str, headers: Sequence[Tuple[str, str]] = ()
+    ) -> Tuple[int, bytes]:
+        """Send a GET request.
+
+        A request failing on a reused connection (closed by the server while
+        idle) is sent again on a new connection.
+
+        Returns:
+            tuple: Response status code and body (not decoded).
+
+        """
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        host = (parts.hostname or "", parts.port or (443 if https else 80), https)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        request = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        request += [f"{name}: {value}" for name, value in headers]
+        if not any(name.lower() == "accept-encoding" for name, _ in headers):
+            request.append("Accept-Encoding: gzip")
+        data = "\r\n".join(request + ["", ""]).encode()
+
+        while True:
+            reused = bool(self._idle[host])
+            if reused:
+                reader, writer = self._idle[host].pop()
+            else:
+                reader, writer = await asyncio.open_connection(
+                    host[0], host[1], ssl=https
+                )
+
+            try:
+                writer.write(data)
+                await writer.drain()
+                status, response_headers, body = await read_response(reader)
+            except OSError:
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if (
+                response_headers.get("connection", "").lower() == "close"
+                or not (
+                    "content-length" in response_headers
+                    or "transfer-encoding" in response_headers
+                )
+                or len(self._idle[host]) >= self.max_idle
+            ):
+                writer.close()
+            else:
+                self._idle[host].append((reader, writer))
+
+            return status, body
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the `q` percentile (nearest rank) of sorted values."""
+    if not values:
+        return 0.0
+
+    rank = math.ceil(q / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+async def _sample_pool(
+    connections: ConnectionPool,
+    base_url: str,
+    interval: float,
+    samples: List[Dict],
+    headers: Sequence,
+) -> None:
+    """Sample the target's database pool usage until cancelled.
+
+    Each sample is the pool of the worker which answered the request.
+
+    """
+    headers = [*headers, ("Accept-Encoding", "identity")]
+    while True:
+        try:
+            status, body = await connections.get(f"{base_url}/admin/pool.json", headers)
+            if status == 200:
+                samples.append(json.loads(body))
+        except HTTP_ERRORS:
+            pass
+
+        await asyncio.sleep(interval)
+
+
+def _report(
+    results: List[Tuple[str, Optional[int], float, Optional[int]]],
+    pool_samples: List[Dict],
+    duration: float,
+    max_lag: float,
+) -> Dict[str, Any]:
+    """Summarize replay results."""
+    groups: Dict[Tuple[str, Optional[int]], List] = defaultdict(list)
+    for layer, z, latency, status in results:
+        groups[(layer, z)].append((latency, status))
+
+    def _stats(items: List) -> Dict[str, Any]:
+        latencies = sorted(latency for latency, _ in items)
+        errors = sum(1 for _, status in items if status is None or status >= 400)
+        return {
+            "requests": len(items),
+            "errors": errors,
+            "error_rate": round(errors / len(items), 4) if items else 0,
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p90": round(percentile(latencies, 90) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0,
+        }
+
+    pool: Dict[str, Any] = {"samples": len(pool_samples)}
+    if pool_samples:
+        usage = [
+            (s["size"] - s["idle"]) / s["max_size"]
+            for s in pool_samples
+            if s["max_size"]
+        ]
+        saturated = [
+            s for s in pool_samples if s["idle"] == 0 and s["size"] >= s["max_size"]
+        ]
+        pool.update(
+            {
+                "mean_usage": round(sum(usage) / len(usage), 4) if usage else 0,
+                "max_usage": round(max(usage), 4) if usage else 0,
+                "saturated": round(len(saturated) / len(pool_samples), 4),
+                "workers": len({s.get("pid") for s in pool_samples}),
+            }
+        )
+
+    return {
+        "duration": round(duration, 3),
+        "max_lag": round(max_lag, 3),
+        "total": _stats([(latency, status) for _, _, latency, status in results]),
+        "groups": [
+            {"layer": layer, "zoom": z, **_stats(items)}
+            for (layer, z), items in sorted(
+                groups.items(), key=lambda g: (g[0][0], g[0][1] or 0)
+            )
+        ],
+        "pool": pool,
+    }
+
+
+async def replay(
+    base_url: str,
+    requests: Sequence[ReplayRequest],
+    speed: float = 1.0,
+    timeout: float = 30.0,
+    headers: Sequence[Tuple[str, str]] = (),
+    pool_interval: float = 1.0,
+) -> Dict[str, Any]:
+    """Replay requests against a pg_mvt instance (open-loop).
+
+    Args:
+        base_url (str): pg_mvt base url (e.g http://127.0.0.1:8081).
+        requests (list): Requests to replay.
+        speed (float): Replay speed (2 sends the requests twice as fast).
+        timeout (float): Requests timeout, in seconds (timeouts are errors).
+        headers (list): Headers sent with each request.
+        pool_interval (float): Database pool sampling interval, in seconds
+            (0 to disable).
+
+    Returns:
+        dict: Latency percentiles (milliseconds) and error rates, overall and per
+            layer/zoom level, the database pool usage (and number of workers
+            sampled) and the replay's max lag (how late requests were sent, in
+            seconds).
+
+    """
+    base_url = base_url.rstrip("/")
+    results: List[Tuple[str, Optional[int], float, Optional[int]]] = []
+    pool_samples: List[Dict] = []
+    connections = ConnectionPool()
+
+    async def _send(request: ReplayRequest) -> None:
+        layer, z = request_group(request.path)
+        start = time.perf_counter()
+        status: Optional[int]
+        try:
+            status, _ = await asyncio.wait_for(
+                connections.get(base_url + request.path, headers), timeout
+            )
+        except HTTP_ERRORS:
+            status = None
+        results.append((layer, z, time.perf_counter() - start, status))
+
+    sampler = None
+    if pool_interval > 0:
+        sampler = asyncio.ensure_future(
+            _sample_pool(connections, base_url, pool_interval, pool_samples, headers)
+        )
+
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    max_lag = 0.0
+    tasks = []
+    for request in requests:
+        delay = start + request.offset / speed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            max_lag = max(max_lag, -delay)
+        tasks.append(asyncio.ensure_future(_send(request)))
+
+    await asyncio.gather(*tasks)
+    duration = loop.time() - start
+
+    if sampler is not None:
+        sampler.cancel()
+    connections.close()
+
+    return _report(results, pool_samples, duration, max_lag)
@@ -0,0 +1,214 @@
+"""pg_mvt.server: Pre-fork server.
+
+The table catalog is loaded (and the TileMatrixSets' context computed) once in
+the parent process, then the workers are forked: they inherit the catalog and
+the imported modules (copy-on-write) and only open their own database pool.
+
+"""
+
+import asyncio
+import gc
+import os
+import signal
+import sys
+import time
+import warnings
+from typing import Any, Callable, Dict, List, Sequence
+
+import morecantile
+from buildpg import asyncpg
+
+from pg_mvt import db
+from pg_mvt.settings import PgSettings
+from pg_mvt.tms import get_context
+
+# uvicorn's exit code when the application startup failed
+STARTUP_FAILURE = 3
+
+# Exit code when the workers keep crashing
+CRASH_LOOP = 1
+
+# A worker exiting less than MIN_UPTIME seconds after it was forked crashed: it
+# is replaced after RESTART_DELAY seconds, doubled for each consecutive crash (up
+# to MAX_RESTART_DELAY), and the server stops after MAX_RESTARTS consecutive
+# crashes
+MIN_UPTIME = 10.0
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+MAX_RESTARTS = 10
+
+
+async def load_catalog() -> Sequence[Dict]:
+    """Fetch the table catalog and the tables' data versions."""
+    pg_settings = PgSettings()
+    pool = await asyncpg.create_pool_b(
+        pg_settings.connection_string,
+        min_size=1,
+        max_size=1,
+        server_settings=pg_settings.db_server_settings or None,
+    )
+    try:
+        catalog = await db.table_index(pool)
+        versions = await db.table_versions(pool)
+    finally:
+        await pool.close()
+
+    for r in catalog:
+        r["version"] = versions.get(r["id"])
+
+    if pg_settings.db_unindexed_tables != "ignore":
+        db.check_tables(catalog, pg_settings.db_unindexed_min_rows)
+
+    return catalog
+
+
+def _spawn(server: Any, sockets: List[Any]) -> int:
+    """Fork a worker running the server, return its pid."""
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Worker: uvicorn handles the signals
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    try:
+        server.run(sockets=sockets)
+    except BaseException:
+        os._exit(1)
+
+    os._exit(0 if server.started else STARTUP_FAILURE)
+
+
+def _terminate(pids: Sequence[int]) -> None:
+    """Send SIGTERM to the processes (still running)."""
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def _sleep(seconds: float, stopped: Callable[[], bool]) -> None:
+    """Sleep `seconds`, unless `stopped()` (e.g set by a signal handler)."""
+    deadline = time.monotonic() + seconds
+    while not stopped() and time.monotonic() < deadline:
+        time.sleep(min(0.1, max(deadline - time.monotonic(), 0)))
+
+
+def _supervise(
+    server: Any,
+    sockets: List[Any],
+    workers: int,
+    restart_delay: float = RESTART_DELAY,
+    max_restarts: int = MAX_RESTARTS,
+    min_uptime: float = MIN_UPTIME,
+) -> int:
+    """Run the workers until SIGTERM/SIGINT (replacing dead workers).
+
+    Workers crashing right after they were forked are replaced with an
+    exponential delay, and the server stops after `max_restarts` consecutive
+    crashes.
+
+    Returns:
+        int: Exit status (`STARTUP_FAILURE` if a worker failed to start,
+            `CRASH_LOOP` if the workers kept crashing).
+
+    """
+    stopping = False
+    children: Dict[int, float] = {}  # pid: fork time
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        _terminate(list(children))
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    for _ in range(workers):
+        children[_spawn(server, sockets)] = time.monotonic()
+
+    status = 0
+    crashes = 0
+    while children:
+        try:
+            pid, code = os.wait()
+        except ChildProcessError:
+            break
+
+        started = children.pop(pid)
+        if stopping:
+            continue
+
+        if os.WIFEXITED(code) and os.WEXITSTATUS(code) == STARTUP_FAILURE:
+            status = STARTUP_FAILURE
+            _stop(signal.SIGTERM, None)
+            continue
+
+        crashes = crashes + 1 if time.monotonic() - started < min_uptime else 0
+        if crashes > max_restarts:
+            warnings.warn(
+                f"Workers crashed {crashes} times in a row, stopping the server.",
+                RuntimeWarning,
+            )
+            status = CRASH_LOOP
+            _stop(signal.SIGTERM, None)
+            continue
+
+        # Replace the worker (SIGTERM/SIGINT interrupt the delay)
+        if crashes:
+            delay = min(restart_delay * 2 ** (crashes - 1), MAX_RESTART_DELAY)
+            _sleep(delay, lambda: stopping)
+            if stopping:
+                continue
+
+        children[_spawn(server, sockets)] = time.monotonic()
+
+    return status
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8081,
+    workers: int = 1,
+    precompute_tms: bool = True,
+    **kwargs: Any,
+) -> None:
+    """Load the catalog once and serve pg_mvt with forked uvicorn workers.
+
+    Args:
+        host (str): Bind socket to this host.
+        port (int): Bind socket to this port.
+        workers (int): Number of worker processes.
+        precompute_tms (bool): Compute the TileMatrixSets' context before forking.
+        kwargs (any): Other uvicorn `Config` options (e.g `log_level`).
+
+    """
+    try:
+        import uvicorn
+    except ImportError:  # pragma: nocover
+        raise ImportError(
+            "uvicorn is required to run the server (pip install pg_mvt[server])."
+        )
+
+    db.shared_catalog = asyncio.run(load_catalog())
+    if precompute_tms:
+        for identifier in morecantile.tms.list():
+            get_context(morecantile.tms.get(identifier))
+
+    from pg_mvt.main import app
+
+    config = uvicorn.Config(app, host=host, port=port, **kwargs)
+    server = uvicorn.Server(config)
+    sockets = [config.bind_socket()]
+
+    # Objects created so far are never collected, so the garbage collector
+    # does not write to (and copy) the pages shared with the workers
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+    status = _supervise(server, sockets, workers)
+
+    for sock in sockets:
+        sock.close()
+
+    sys.exit(status)
@@ -1,7 +1,7 @@
 """pg_mvt config."""
 
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, List, Optional
 
 from starlite import CORSConfig
 
@@ -15,11 +15,32 @@ class _APISettings(pydantic.BaseSettings):
     cors_origins: str = "*"
     cachecontrol: str = "public, max-age=3600"
 
+    # Cache-Control for tiles requested with their layer's current data version
+    cachecontrol_immutable: str = "public, max-age=31536000, immutable"
+
+    # Tiles' surrogate keys headers (e.g `Surrogate-Key,Cache-Tag`, empty to disable)
+    # and zoom level of the region keys
+    surrogate_key_headers: str = "Surrogate-Key"
+    surrogate_key_zoom: int = 6
+
+    # Enable the `/admin` (diagnostics) endpoints
+    admin_endpoints: bool = False
+
+    # Enable the HTML endpoints (index and layers' viewer) and the OpenAPI
+    # endpoints (`/schema`), disable them to speed up startup
+    html_endpoints: bool = True
+    openapi_endpoints: bool = True
+
     @pydantic.validator("cors_origins")
     def parse_cors_origin(cls, v):
         """Parse CORS origins."""
         return [origin.strip() for origin in v.split(",")]
 
+    @pydantic.validator("surrogate_key_headers")
+    def parse_surrogate_key_headers(cls, v):
+        """Parse surrogate keys headers."""
+        return [header.strip() for header in v.split(",") if header.strip()]
+
     class Config:
         """model config"""
 
@@ -54,6 +75,47 @@ class _PgSettings(pydantic.BaseSettings):
     )
     db_max_idle: float = 300  # Maximum time, in seconds, that a connection can stay unused in the pool before being closed, and the pool shrunk.
 
+    # PostgreSQL settings (GUCs) set on each new connection
+    # e.g `{"jit": "off", "work_mem": "64MB", "search_path": "public"}`
+    db_server_settings: Dict[str, str] = {}
+
+    # Coroutine function called on each new connection, as a dotted import path
+    # e.g `mypackage.db.register_codecs`
+    db_connection_init: Optional[pydantic.PyObject] = None
+
+    # Per-layer PostgreSQL settings, set with `SET LOCAL` around the tile query
+    # e.g `{"public.roads": {"max_parallel_workers_per_gather": "0"}}`
+    db_layer_settings: Dict[str, Dict[str, str]] = {}
+
+    # Layers for which the tile query is prepared on each connection at startup
+    db_warmup_layers: List[str] = []
+
+    # Interval, in seconds, between checks of the tables' data versions (0 to disable)
+    db_version_interval: float = 60
+
+    # What to do with large tables without a spatial index on their geometry
+    # column: `ignore`, `warn` (when the catalog is loaded) or `refuse` (to serve them)
+    db_unindexed_tables: str = "warn"
+    db_unindexed_min_rows: int = 100000  # Tables with fewer rows are not checked
+
+    # Table tiles of the same layer, zoom level and query parameters requested
+    # within `db_batch_window` seconds (0 to disable) are rendered with one
+    # query (up to `db_batch_max_tiles` tiles per query)
+    db_batch_window: float = 0
+    db_batch_max_tiles: int = 64
+
+    # Number of rows fetched at once by the features export's server-side cursor
+    db_cursor_prefetch: int = 1000
+
+    @pydantic.validator("db_unindexed_tables")
+    def check_unindexed_tables(cls, v):
+        """Validate unindexed tables policy."""
+        if v not in ("ignore", "warn", "refuse"):
+            raise ValueError(
+                f"Invalid unindexed tables policy '{v}' (ignore, warn or refuse)."
+            )
+        return v
+
     class Config:
         """model config"""
 
@@ -81,6 +143,23 @@ class _TileSettings(pydantic.BaseSettings):
     default_minzoom: int = 0
     default_maxzoom: int = 22
 
+    # Number of processes used to encode tiles in-process (e.g FileTable layers).
+    # `None` uses the number of CPUs, `0` encodes in a thread (no process pool).
+    encoder_processes: Optional[int] = None
+
+    # Derive tiles above a layer's maxzoom from its ancestor tile at maxzoom
+    overzoom: bool = False
+
+    # Table layers for which the database only returns the features (WKB snapped
+    # to the tile grid) and the tiles are clipped and encoded by the application
+    # in the encoding process pool (`*` for all the tables). Requires the `file`
+    # extra (shapely, mapbox-vector-tile).
+    app_encoding_layers: List[str] = []
+
+    # Mapbox GL styles or layer style specs (see `pg_mvt.style`) used to select
+    # the properties and features of Table tiles for each zoom level
+    style_files: List[str] = []
+
     class Config:
         """model config"""
 
@@ -92,3 +171,69 @@ class _TileSettings(pydantic.BaseSettings):
 def TileSettings() -> _TileSettings:
     """Tile Settings."""
     return _TileSettings()
+
+
+class _CacheSettings(pydantic.BaseSettings):
+    """Tile cache settings."""
+
+    # The tile cache is opt-in: cached tiles are served until they expire, even
+    # if the table's data changed (unless the data version is requested)
+    disable: bool = True
+    # `memory` (per process) or `shared` (between the processes of a host)
+    backend: str = "memory"
+    maxsize: int = 512  # Maximum number of tiles in the cache (memory)
+    ttl: int = 300  # Time to live, in seconds
+
+    # Shared cache file (defaults to `pg_mvt_cache` in /dev/shm), data and index sizes
+    path: Optional[str] = None
+    shared_size: int = 256 * 2**20  # in bytes
+    shared_buckets: int = 2**16
+
+    @pydantic.validator("backend")
+    def check_backend(cls, v):
+        """Validate cache backend."""
+        if v not in ("memory", "shared"):
+            raise ValueError(f"Invalid cache backend '{v}' (memory or shared).")
+        return v
+
+    # Maximum number of catalog/TileJSON documents in the cache (0 to disable),
+    # documents are cached per catalog version (independently of `disable`)
+    documents_maxsize: int = 256
+
+    # Refresh-ahead: tiles hit at least `refresh_min_hits` times are re-rendered
+    # in the background when they expire in less than `refresh_ahead` seconds
+    # (0 to disable), using a dedicated pool of `refresh_connections` database
+    # connections and at most `refresh_rate` renders per second.
+    refresh_ahead: float = 0
+    refresh_min_hits: int = 3
+    refresh_connections: int = 1
+    refresh_rate: float = 10
+
+    # Popularity sketch file (disabled if not set), saved every
+    # `popularity_interval` seconds. The `popularity_top_k` most requested tiles
+    # of each layer are rendered again on startup, at most
+    # `popularity_warmup_concurrency` at a time.
+    popularity_path: Optional[str] = None
+    popularity_interval: float = 300
+    popularity_top_k: int = 1000
+    popularity_warmup_concurrency: int = 2
+
+    # Cluster mode: base urls of the cluster's nodes and of this node. Tiles are
+    # sharded between the nodes (consistent hashing with `peer_replicas` points
+    # per node) and cache misses are fetched from the tile's owner node.
+    peers: List[str] = []
+    peer_self: Optional[str] = None
+    peer_replicas: int = 64
+    peer_timeout: float = 2.0
+
+    class Config:
+        """model config"""
+
+        env_prefix = "PG_MVT_CACHE_"
+        env_file = ".env"
+
+
+@lru_cache()
+def CacheSettings() -> _CacheSettings:
+    """Cache Settings."""
+    return _CacheSettings()
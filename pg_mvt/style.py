@@ -0,0 +1,396 @@
+"""pg_mvt.style: Style-driven column and feature pruning.
+
+A layer's style lists, per zoom range, the properties used and the features
+displayed. Table tiles then only include the properties used at the tile's zoom
+level (unless `columns` is set) and the features matching one of the style's
+filters.
+
+Styles are either Mapbox GL style documents or declarative specs:
+
+    {
+        "public.roads": [
+            {"minzoom": 0, "maxzoom": 8, "properties": ["class"], "filter": "class = 'motorway'"},
+            {"minzoom": 8, "properties": ["class", "name"]}
+        ]
+    }
+
+`maxzoom` is exclusive (as in Mapbox GL styles) and `filter` is a CQL2-text (or
+CQL2-JSON) expression.
+
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, List, Optional, Sequence, Set, Tuple
+
+from pg_mvt.filters import TEXT_TYPES, parse_filter
+
+# Legacy Mapbox GL filter operators, with the property name as first argument
+LEGACY_OPERATORS = {"==", "!=", "<", "<=", ">", ">=", "in", "!in", "has", "!has"}
+
+COMPARISONS = {"==": "=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+NUMBER_TYPES = {"int2", "int4", "int8", "float4", "float8", "numeric"}
+
+TEMPORAL_TYPES = {"date", "timestamp", "timestamptz"}
+
+# Properties used in text fields (e.g `{name}`)
+TOKEN = re.compile(r"{([^{}]+)}")
+
+
+@dataclass
+class StyleRule:
+    """Properties used and features displayed in a zoom range.
+
+    Attributes:
+        minzoom (float): Min zoom level.
+        maxzoom (float): Max zoom level (exclusive).
+        properties (list): Properties used.
+        filter (dict, optional): CQL2-JSON filter (all the features if not set).
+
+    """
+
+    minzoom: float = 0
+    maxzoom: float = 24
+    properties: List[str] = field(default_factory=list)
+    filter: Optional[Dict] = None
+
+
+@dataclass
+class LayerStyle:
+    """Layer's style rules."""
+
+    rules: List[StyleRule] = field(default_factory=list)
+
+    def prune(
+        self, zoom: int, maxzoom: Optional[int] = None
+    ) -> Optional[Tuple[List[str], Optional[Dict]]]:
+        """Return the properties used and the features filter at a zoom level.
+
+        A tile is displayed from the previous zoom level (256px tiles) up to the
+        next one (512px tiles), and up to the style's max zoom at the layer's
+        `maxzoom` (overzoom).
+
+        Returns:
+            tuple: Properties and CQL2-JSON filter (None for all the features),
+                or None when no rule uses the layer at this zoom level.
+
+        """
+        overzoom = maxzoom is not None and zoom >= maxzoom
+        rules = [
+            rule
+            for rule in self.rules
+            if rule.maxzoom > zoom - 1 and (overzoom or rule.minzoom < zoom + 1)
+        ]
+        if not rules:
+            return None
+
+        properties: Dict[str, None] = {}
+        for rule in rules:
+            properties.update(dict.fromkeys(rule.properties))
+
+        filters = [rule.filter for rule in rules]
+        if any(f is None for f in filters):
+            return list(properties), None
+
+        expr = filters[0] if len(filters) == 1 else {"op": "or", "args": filters}
+        return list(properties), expr
+
+
+def _prop(name: str) -> Dict:
+    return {"property": name}
+
+
+def _key(arg: Any, legacy: bool) -> Optional[str]:
+    """Return the property name of a filter's first argument."""
+    if legacy and isinstance(arg, str) and not arg.startswith("$"):
+        return arg
+
+    if isinstance(arg, list) and len(arg) == 2 and arg[0] == "get":
+        if isinstance(arg[1], str):
+            return arg[1]
+
+    return None
+
+
+def _literal(value: Any) -> Any:
+    if isinstance(value, list) and len(value) == 2 and value[0] == "literal":
+        return value[1]
+    return value
+
+
+def _scalar(value: Any) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+def gl_filter(expr: Any) -> Optional[Dict]:  # noqa: C901
+    """Translate a Mapbox GL filter to CQL2-JSON.
+
+    Filters which cannot be translated (e.g `zoom` or geometry type expressions)
+    return None (all the features), so the result always includes the features
+    displayed by the style.
+
+    """
+    if not isinstance(expr, list) or not expr:
+        return None
+
+    op, args = expr[0], expr[1:]
+    if not isinstance(op, str):
+        return None
+
+    if op == "all":
+        clauses = [c for c in (gl_filter(arg) for arg in args) if c is not None]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"op": "and", "args": clauses}
+
+    if op == "any":
+        clauses = [gl_filter(arg) for arg in args]
+        if not clauses or any(c is None for c in clauses):
+            return None
+        return clauses[0] if len(clauses) == 1 else {"op": "or", "args": clauses}
+
+    if op in ("has", "!has") and len(args) == 1:
+        name = _key(args[0], legacy=True)
+        if name is None:
+            return None
+        isnull = {"op": "isNull", "args": [_prop(name)]}
+        return isnull if op == "!has" else {"op": "not", "args": [isnull]}
+
+    legacy = op in LEGACY_OPERATORS and len(args) > 0 and isinstance(args[0], str)
+    name = _key(args[0], legacy) if args else None
+    if name is None:
+        return None
+
+    if op in ("in", "!in"):
+        values = (
+            list(args[1:]) if legacy else _literal(args[1]) if len(args) == 2 else None
+        )
+        if not isinstance(values, list) or not values or not all(map(_scalar, values)):
+            return None
+        clause = {"op": "in", "args": [_prop(name), values]}
+        if op == "in":
+            return clause
+        # features without the property are displayed too
+        return {
+            "op": "or",
+            "args": [
+                {"op": "not", "args": [clause]},
+                {"op": "isNull", "args": [_prop(name)]},
+            ],
+        }
+
+    if len(args) != 2 or not _scalar(_literal(args[1])):
+        return None
+
+    value = _literal(args[1])
+    if op in COMPARISONS:
+        return {"op": COMPARISONS[op], "args": [_prop(name), value]}
+
+    if op == "!=":
+        return {
+            "op": "or",
+            "args": [
+                {"op": "<>", "args": [_prop(name), value]},
+                {"op": "isNull", "args": [_prop(name)]},
+            ],
+        }
+
+    return None
+
+
+def _typed(value: Any, udt_name: str) -> bool:
+    """Check a literal has the same type as the column (no conversion)."""
+    if isinstance(value, bool):
+        return udt_name == "bool"
+
+    if isinstance(value, float) and udt_name in ("int2", "int4", "int8"):
+        return value.is_integer()
+
+    if isinstance(value, (int, float)):
+        return udt_name in NUMBER_TYPES
+
+    if isinstance(value, str):
+        return udt_name in TEXT_TYPES
+
+    if isinstance(value, dict) and ("date" in value or "timestamp" in value):
+        return udt_name in TEMPORAL_TYPES
+
+    return False
+
+
+def typed_filter(expr: Dict, properties: Dict[str, str]) -> Optional[Dict]:
+    """Remove the predicates comparing properties with literals of another type.
+
+    Mapbox GL compares values strictly (`false != "yes"`) while SQL converts
+    the literals to the column's type, so such predicates would prune features
+    the style displays. Predicates are removed from `and` expressions, other
+    expressions return None (all the features).
+
+    """
+    op = expr.get("op")
+    args = expr.get("args") or []
+
+    if op == "and":
+        clauses = [typed_filter(arg, properties) for arg in args]
+        clauses = [c for c in clauses if c is not None]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"op": "and", "args": clauses}
+
+    if op == "or":
+        clauses = [typed_filter(arg, properties) for arg in args]
+        if not clauses or any(c is None for c in clauses):
+            return None
+        return {"op": "or", "args": clauses}
+
+    if op == "not":
+        # a relaxed predicate would select fewer features once negated
+        if len(args) != 1 or typed_filter(args[0], properties) != args[0]:
+            return None
+        return expr
+
+    if not args or not isinstance(args[0], dict):
+        return None
+
+    udt_name = properties.get(args[0].get("property"))
+    if udt_name is None:
+        return None
+
+    values: List[Any] = []
+    for arg in args[1:]:
+        values.extend(arg if isinstance(arg, list) else [arg])
+
+    return expr if all(_typed(v, udt_name) for v in values) else None
+
+
+def gl_properties(value: Any, properties: Set[str], text: bool = False) -> Set[str]:
+    """Collect the properties referenced in a Mapbox GL style value."""
+    if isinstance(value, list) and value:
+        op = value[0] if isinstance(value[0], str) else None
+        if op == "literal":
+            return properties
+
+        if op in ("get", "has") and len(value) == 2:
+            name = _key(value[1], legacy=True)
+            if name:
+                properties.add(name)
+
+        elif op in LEGACY_OPERATORS and len(value) > 1:
+            name = _key(value[1], legacy=True)
+            if name:
+                properties.add(name)
+
+        for item in value[1:]:
+            gl_properties(item, properties, text)
+
+    elif isinstance(value, dict):
+        # Legacy functions, e.g `{"property": "height", "stops": [...]}`
+        if isinstance(value.get("property"), str):
+            properties.add(value["property"])
+
+        for item in value.values():
+            gl_properties(item, properties, text)
+
+    elif isinstance(value, str) and text:
+        properties.update(TOKEN.findall(value))
+
+    return properties
+
+
+def _source_layer(source_id: str, source: Dict) -> str:
+    """Return the pg_mvt layer id of a style source (from its urls)."""
+    urls = [source.get("url") or ""] + list(source.get("tiles") or [])
+    for url in urls:
+        match = re.search(r"/([^/?]+)/tilejson\.json", url) or re.search(
+            r"/tiles/(?:[^/?]+/)?([^/?]+)/{z}/", url
+        )
+        if match:
+            return match.group(1)
+
+    return source_id
+
+
+def from_gl_style(style: Dict) -> Dict[str, LayerStyle]:
+    """Create layers' style rules from a Mapbox GL style document."""
+    sources = {
+        id: _source_layer(id, source)
+        for id, source in style.get("sources", {}).items()
+        if source.get("type") == "vector"
+    }
+
+    layers: Dict[str, LayerStyle] = {}
+    for layer in style.get("layers", []):
+        layer_id = sources.get(layer.get("source"))
+        layout = layer.get("layout") or {}
+        if layer_id is None or layout.get("visibility") == "none":
+            continue
+
+        properties: Set[str] = set()
+        gl_properties(layer.get("filter"), properties)
+        gl_properties(layer.get("paint"), properties)
+        for key, value in layout.items():
+            gl_properties(value, properties, text=key in ("text-field", "icon-image"))
+
+        rule = StyleRule(
+            minzoom=layer.get("minzoom", 0),
+            maxzoom=layer.get("maxzoom", 24),
+            properties=sorted(properties),
+            filter=gl_filter(layer["filter"]) if "filter" in layer else None,
+        )
+        layers.setdefault(layer_id, LayerStyle()).rules.append(rule)
+
+    return layers
+
+
+def from_spec(spec: Dict[str, Sequence[Dict]]) -> Dict[str, LayerStyle]:
+    """Create layers' style rules from a declarative spec."""
+    layers = {}
+    for layer_id, rules in spec.items():
+        style = LayerStyle()
+        for rule in rules:
+            filter = rule.get("filter")
+            if isinstance(filter, str):
+                filter = parse_filter(filter, rule.get("filter-lang", "cql2-text"))
+
+            style.rules.append(
+                StyleRule(
+                    minzoom=rule.get("minzoom", 0),
+                    maxzoom=rule.get("maxzoom", 24),
+                    properties=list(rule.get("properties", [])),
+                    filter=filter,
+                )
+            )
+        layers[layer_id] = style
+
+    return layers
+
+
+@dataclass
+class StyleRegistry:
+    """layer styles registry"""
+
+    styles: ClassVar[Dict[str, LayerStyle]] = {}
+
+    @classmethod
+    def get(cls, key: str) -> Optional[LayerStyle]:
+        """lookup layer style by layer id"""
+        return cls.styles.get(key)
+
+    @classmethod
+    def register(cls, styles: Dict[str, LayerStyle]):
+        """register layer styles"""
+        cls.styles.update(styles)
+
+    @classmethod
+    def load(cls, path: str):
+        """register layer styles from a Mapbox GL style or spec file"""
+        with open(path) as f:
+            content = json.load(f)
+
+        is_gl_style = "layers" in content and "version" in content
+        cls.register(from_gl_style(content) if is_gl_style else from_spec(content))
+
+
+style_registry = StyleRegistry()
@@ -0,0 +1,135 @@
+"""pg_mvt.tiles: Tile retrieval (cache and overzoom)."""
+
+import asyncio
+from functools import partial
+from typing import Any, Dict, Optional
+
+from buildpg import asyncpg
+from morecantile import Tile, TileMatrixSet
+
+from pg_mvt.cache import TileCache, cache_key
+from pg_mvt.cluster import get_cluster, peer_request
+from pg_mvt.layer import Layer
+from pg_mvt.mvt import overzoom_async
+from pg_mvt.settings import TileSettings
+from pg_mvt.tms import get_context
+
+tile_settings = TileSettings()
+
+# Tiles being fetched or rendered, by cache key (concurrent misses share the task)
+_inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+
+def ancestor(tile: Tile, zoom: int) -> Tile:
+    """Return the ancestor of a tile at a lower zoom level (quadtree TMS)."""
+    shift = tile.z - zoom
+    return Tile(tile.x >> shift, tile.y >> shift, zoom)
+
+
+async def get_tile(
+    pool: asyncpg.BuildPgPool,
+    cache: TileCache,
+    layer: Layer,
+    tile: Tile,
+    tms: TileMatrixSet,
+    refresh_pool: Optional[asyncpg.BuildPgPool] = None,
+    **kwargs: Any,
+) -> bytes:
+    """Return Tile Data from the cache or from the layer.
+
+    When the layer has `overzoom` enabled, tiles above the layer's maxzoom are
+    derived from their ancestor tile at maxzoom (itself cached) instead of
+    querying the layer. In cluster mode, tiles owned by another node are
+    fetched from that node (and rendered if it fails). Concurrent misses of a
+    tile are fetched or rendered once.
+
+    Args:
+        pool (asyncpg.BuildPgPool): AsyncPG database connection pool.
+        cache (TileCache): Tile cache.
+        layer (Layer): Layer.
+        tile (Tile): Tile object with X,Y,Z indices.
+        tms (TileMatrixSet): Tile Matrix Set.
+        refresh_pool (asyncpg.BuildPgPool, optional): Connection pool of the
+            refresh-ahead renders (defaults to `pool`).
+        kwargs (any, optiona): Optional parameters to forward to the layer.
+
+    Returns:
+        bytes: Mapbox Vector Tiles.
+
+    """
+    key = cache_key(layer.id, tms.identifier, tile, kwargs)
+    content = cache.get(key)
+    if content is not None:
+        cache.hit(
+            key,
+            partial(
+                render_tile, refresh_pool or pool, cache, layer, tile, tms, **kwargs
+            ),
+        )
+        return content
+
+    # Concurrent misses of a tile (local or peers' requests) wait for one render
+    task = _inflight.get(key)
+    if task is None or task.done():
+        task = _inflight[key] = asyncio.ensure_future(
+            _load_tile(key, pool, cache, layer, tile, tms, **kwargs)
+        )
+        task.add_done_callback(partial(_discard, key))
+
+    # NOTE: a cancelled request must not cancel the other requests of the tile
+    return await asyncio.shield(task)
+
+
+async def _load_tile(
+    key: str,
+    pool: asyncpg.BuildPgPool,
+    cache: TileCache,
+    layer: Layer,
+    tile: Tile,
+    tms: TileMatrixSet,
+    **kwargs: Any,
+) -> bytes:
+    """Fetch the tile from its owner node or render it, and cache it."""
+    # Cluster mode: the tile is rendered by the node owning it
+    content = None
+    cluster = get_cluster()
+    if cluster is not None and not peer_request.get():
+        owner = cluster.owner(key)
+        if owner is not None:
+            content = await cluster.fetch(owner, key)
+
+    if content is None:
+        content = await render_tile(pool, cache, layer, tile, tms, **kwargs)
+
+    cache.set(key, content)
+
+    return content
+
+
+def _discard(key: str, task: "asyncio.Future[bytes]"):
+    """Remove a finished task from the in-flight tiles."""
+    if _inflight.get(key) is task:
+        del _inflight[key]
+
+
+async def render_tile(
+    pool: asyncpg.BuildPgPool,
+    cache: TileCache,
+    layer: Layer,
+    tile: Tile,
+    tms: TileMatrixSet,
+    **kwargs: Any,
+) -> bytes:
+    """Return Tile Data from the layer (or from its cached ancestor tile)."""
+    # NOTE: overzoom is only possible when each tile has exactly 4 children
+    if layer.overzoom and tile.z > layer.maxzoom and get_context(tms).is_quadtree:
+        parent = ancestor(tile, layer.maxzoom)
+        parent_content = await get_tile(pool, cache, layer, parent, tms, **kwargs)
+        return await overzoom_async(
+            parent_content,
+            (parent.z, parent.x, parent.y),
+            (tile.z, tile.x, tile.y),
+            buffer=int(kwargs.get("buffer", tile_settings.tile_buffer)),
+        )
+
+    return bytes(await layer.get_tile(pool, tile, tms, **kwargs))
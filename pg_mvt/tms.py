@@ -0,0 +1,106 @@
+"""pg_mvt.tms: Precomputed TileMatrixSet context."""
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from morecantile import BoundingBox, Tile, TileMatrixSet
+
+
+@dataclass
+class TMSContext:
+    """TileMatrixSet values needed to create tiles, computed once per TMS.
+
+    Attributes:
+        identifier (str): TileMatrixSet identifier.
+        epsg (int, optional): TMS's CRS EPSG code.
+        proj (str): TMS's CRS Proj4 string.
+        wkt (str): TMS's CRS WKT.
+        minzoom (int): TMS's min zoom level.
+        maxzoom (int): TMS's max zoom level.
+        is_quadtree (bool): Each tile has exactly 4 children tiles.
+
+    """
+
+    tms: TileMatrixSet = field(repr=False)
+    identifier: str
+    epsg: Optional[int]
+    proj: str
+    wkt: str
+    minzoom: int
+    maxzoom: int
+    is_quadtree: bool
+    # zoom -> (origin x, origin y, tile width, tile height) in CRS units
+    _matrices: Dict[int, Tuple[float, float, float, float]] = field(
+        default_factory=dict, repr=False
+    )
+
+    @classmethod
+    def from_tms(cls, tms: TileMatrixSet) -> "TMSContext":
+        """Create context from a TileMatrixSet."""
+        matrices = {m.identifier: m for m in tms.tileMatrix}
+        is_quadtree = all(
+            matrices[str(z + 1)].matrixWidth == 2 * matrices[str(z)].matrixWidth
+            and matrices[str(z + 1)].matrixHeight == 2 * matrices[str(z)].matrixHeight
+            and matrices[str(z + 1)].topLeftCorner == matrices[str(z)].topLeftCorner
+            for z in range(tms.minzoom, tms.maxzoom)
+            if str(z) in matrices and str(z + 1) in matrices
+        )
+
+        ctx = cls(
+            tms=tms,
+            identifier=tms.identifier,
+            epsg=tms.crs.to_epsg(),
+            proj=tms.crs.to_proj4(),
+            wkt=tms.crs.to_wkt(),
+            minzoom=tms.minzoom,
+            maxzoom=tms.maxzoom,
+            is_quadtree=is_quadtree,
+        )
+        for z in range(tms.minzoom, tms.maxzoom + 1):
+            ctx.matrix(z)
+
+        return ctx
+
+    def matrix(self, zoom: int) -> Tuple[float, float, float, float]:
+        """Return origin and tile size (in CRS units) for a zoom level."""
+        values = self._matrices.get(zoom)
+        if values is None:
+            # morecantile extrapolates matrices outside of the TMS zoom range
+            matrix = self.tms.matrix(zoom)
+            res = self.tms._resolution(matrix)
+            origin = matrix.topLeftCorner
+            if self.tms._invert_axis:
+                origin = origin[::-1]
+
+            values = (
+                origin[0],
+                origin[1],
+                res * matrix.tileWidth,
+                res * matrix.tileHeight,
+            )
+            self._matrices[zoom] = values
+
+        return values
+
+    def xy_bounds(self, tile: Tile) -> BoundingBox:
+        """Return the bounding box of the tile in TMS's CRS."""
+        origin_x, origin_y, width, height = self.matrix(tile.z)
+        return BoundingBox(
+            origin_x + tile.x * width,
+            origin_y - (tile.y + 1) * height,
+            origin_x + (tile.x + 1) * width,
+            origin_y - tile.y * height,
+        )
+
+
+_contexts: Dict[str, TMSContext] = {}
+
+
+def get_context(tms: TileMatrixSet) -> TMSContext:
+    """Return (cached) context for a TileMatrixSet."""
+    ctx = _contexts.get(tms.identifier)
+    if ctx is None or ctx.tms is not tms:
+        ctx = TMSContext.from_tms(tms)
+        _contexts[tms.identifier] = ctx
+
+    return ctx
@@ -22,8 +22,11 @@ test_reqs = [
     "requests",
     "psycopg2",
     "pytest-pgsql",
-    "mapbox-vector-tile",
+    "mapbox-vector-tile>=2.0",
     "numpy",
+    "shapely>=2.0",
+    "pyarrow",
+    "pyogrio",
 ]
 
 # "morecantile>=3.0.2,<3.1",
@@ -31,6 +34,8 @@ extra_reqs = {
     "test": test_reqs,
     "dev": test_reqs + ["pre-commit"],
     "server": ["uvicorn[standard]"],
+    "file": ["shapely>=2.0", "pyarrow", "mapbox-vector-tile>=2.0"],
+    "ogr": ["shapely>=2.0", "pyarrow", "mapbox-vector-tile>=2.0", "pyogrio"],
     "docs": [
         "nbconvert",
         "mkdocs",
@@ -47,13 +52,11 @@ setup(
     description=u"",
     long_description=long_description,
     long_description_content_type="text/markdown",
-    python_requires=">=3.7",
+    python_requires=">=3.9",
     classifiers=[
         "Intended Audience :: Information Technology",
         "Intended Audience :: Science/Research",
         "License :: OSI Approved :: BSD License",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
     ],
     keywords="FastAPI MVT POSTGIS",
@@ -67,4 +70,5 @@ setup(
     zip_safe=False,
     install_requires=inst_reqs,
     extras_require=extra_reqs,
+    entry_points={"console_scripts": ["pg_mvt = pg_mvt.cli:main"]},
 )
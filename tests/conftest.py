@@ -34,9 +34,10 @@ def app(database_url, monkeypatch):
     monkeypatch.setenv("PG_MVT_DATABASE_URL", str(database_url))
     monkeypatch.setenv("PG_MVT_DEFAULT_MINZOOM", str(5))
     monkeypatch.setenv("PG_MVT_DEFAULT_MAXZOOM", str(12))
+    monkeypatch.setenv("PG_MVT_ADMIN_ENDPOINTS", "TRUE")
 
     from pg_mvt.functions import registry as FunctionRegistry
-    from pg_mvt.layer import Function
+    from pg_mvt.layer import Archive, FileTable, Function
     from pg_mvt.main import app
 
     # Register Function to the internal registery
@@ -60,5 +61,30 @@ def app(database_url, monkeypatch):
         )
     )
 
+    # Register MBTiles/PMTiles archives
+    FunctionRegistry.register(
+        Archive.from_file(
+            id="archive_mbtiles",
+            infile=os.path.join(DATA_DIR, "tiles.mbtiles"),
+        ),
+        Archive.from_file(
+            id="archive_pmtiles",
+            infile=os.path.join(DATA_DIR, "tiles.pmtiles"),
+        ),
+        Archive.from_file(
+            id="archive_overzoom",
+            infile=os.path.join(DATA_DIR, "tiles.pmtiles"),
+            overzoom=True,
+        ),
+    )
+
+    # Register GeoParquet file
+    FunctionRegistry.register(
+        FileTable.from_file(
+            id="grid",
+            infile=os.path.join(DATA_DIR, "grid.parquet"),
+        ),
+    )
+
     with TestClient(app) as app:
         yield app
@@ -0,0 +1,102 @@
+"""test admin endpoints."""
+
+
+def test_layers_diagnostics(app):
+    """test /admin/layers.json endpoint."""
+    response = app.get("/admin/layers.json")
+    assert response.status_code == 200
+    assert "cache-control" not in response.headers
+    body = response.json()
+    assert [d["id"] for d in body] == ["public.landsat_wrs"]
+    assert isinstance(body[0]["row_estimate"], int)
+    assert body[0]["rows_per_tile"] >= 0
+    assert isinstance(body[0]["issues"], list)
+
+
+def test_pool_stats(app):
+    """test /admin/pool.json endpoint."""
+    response = app.get("/admin/pool.json")
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"pid", "size", "idle", "max_size"}
+    assert 0 <= body["idle"] <= body["size"] <= body["max_size"]
+
+
+def test_explain(app):
+    """test /admin/explain endpoint."""
+    response = app.get("/admin/explain/public.landsat_wrs/5/10/10?limit=10")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["id"] == "public.landsat_wrs"
+    assert body["tile"] == {"z": 5, "x": 10, "y": 10}
+    assert "ST_AsMVT" in body["sql"]
+    assert body["params"][-1] == 10
+    assert body["plan"]["Plan"]
+    assert list(body["stages"]) == ["envelope", "transform", "asmvtgeom", "asmvt"]
+    assert body["timings"]["execution"] >= 0
+    assert body["timings"]["query_build"] >= 0
+
+    response = app.get(
+        "/admin/explain/public.landsat_wrs/0/0/0?TileMatrixSetId=WorldCRS84Quad"
+    )
+    assert response.status_code == 200
+    assert response.json()["tms"] == "WorldCRS84Quad"
+
+    # Only Table layers
+    response = app.get("/admin/explain/squares/0/0/0")
+    assert response.status_code == 400
+
+
+def test_heavy_tiles(app):
+    """test /admin/heavy-tiles endpoint."""
+    response = app.get("/admin/heavy-tiles/public.landsat_wrs/2?limit=3")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["zoom"] == 2
+    assert 0 < len(body["tiles"]) <= 3
+    vertices = [t["vertices"] for t in body["tiles"]]
+    assert vertices == sorted(vertices, reverse=True)
+    assert all(t["z"] == 2 for t in body["tiles"])
+    assert body["summary"]["tiles"] >= len(body["tiles"])
+    assert sum(h["tiles"] for h in body["histogram"]) == body["summary"]["tiles"]
+    # 4x4 tiles at zoom 2
+    assert body["heatmap"]["cell"] == [1, 1]
+    assert len(body["heatmap"]["vertices"]) == 4
+
+    response = app.get("/admin/heavy-tiles/public.landsat_wrs/2?filter=id<0")
+    assert response.status_code == 200
+    assert response.json()["tiles"] == []
+
+    response = app.get("/admin/heavy-tiles/squares/2")
+    assert response.status_code == 400
+
+
+def test_purge(app, monkeypatch):
+    """test /admin/purge endpoint."""
+    from pg_mvt.cache import MemoryCache
+    from pg_mvt.purge import PurgeHooks, purge_hooks
+
+    monkeypatch.setattr(PurgeHooks, "hooks", [])
+    events = []
+    purge_hooks.register(events.append)
+
+    # The tiles are removed from the tile cache before the purge event
+    cache = MemoryCache()
+    monkeypatch.setattr(app.app.state, "cache", cache)
+    cache.set("public.landsat_wrs/WebMercatorQuad/0/0/0", b"tile")
+    cache.set("public.other/WebMercatorQuad/0/0/0", b"tile")
+    purge_hooks.register(lambda keys: events.append(len(cache)))
+
+    response = app.post("/admin/purge/public.landsat_wrs")
+    assert response.status_code == 200
+    assert response.json()["keys"] == ["public.landsat_wrs"]
+
+    response = app.post("/admin/purge/public.landsat_wrs?bbox=10,10,12,12")
+    assert response.status_code == 200
+    keys = response.json()["keys"]
+    assert "public.landsat_wrs/WebMercatorQuad/q1222" in keys
+    assert events == [["public.landsat_wrs"], 1, keys, 1]
+    assert cache.get("public.other/WebMercatorQuad/0/0/0") == b"tile"
+
+    response = app.post("/admin/purge/public.landsat_wrs?bbox=10,10,12")
+    assert response.status_code == 400
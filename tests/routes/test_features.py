@@ -0,0 +1,97 @@
+"""Test features endpoint."""
+
+import asyncio
+import json
+
+
+def test_features(app):
+    """Stream a Table's features."""
+    response = app.get("/features/public.landsat_wrs?limit=10&columns=pr,row")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/geo+json"
+    body = response.json()
+    assert body["type"] == "FeatureCollection"
+    assert len(body["features"]) == 10
+    assert body["features"][0]["type"] == "Feature"
+    assert set(body["features"][0]["properties"]) == {"pr", "row"}
+
+    response = app.get(
+        "/features/public.landsat_wrs?f=ndjson&bbox=-180,-90,180,90&filter=path=13"
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    features = [json.loads(line) for line in response.text.splitlines()]
+    assert features
+    assert all(f["properties"]["path"] == 13 for f in features)
+
+    response = app.get("/features/public.landsat_wrs?bbox=-10,-10,10")
+    assert response.status_code == 400
+
+    response = app.get("/features/public.landsat_wrs?f=csv")
+    assert response.status_code == 400
+
+    response = app.get("/features/squares")
+    assert response.status_code == 400
+
+
+def test_features_flatgeobuf(app, tmp_path):
+    """Stream a Table's features as FlatGeobuf."""
+    from pyogrio.raw import read
+
+    response = app.get("/features/public.landsat_wrs?f=fgb&limit=10&columns=pr,row")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/flatgeobuf"
+    assert response.content.startswith(b"fgb\x03fgb")
+
+    path = tmp_path / "features.fgb"
+    path.write_bytes(response.content)
+    meta, _, geometries, fields = read(str(path))
+    assert meta["crs"] == "EPSG:4326"
+    assert meta["geometry_type"] == "MultiPolygon"
+    assert list(meta["fields"]) == ["pr", "row"]
+    assert len(geometries) == 10
+    assert all(geometry is not None for geometry in geometries)
+
+
+def test_features_chunks(app, monkeypatch):
+    """Features are read with a cursor and sent in chunks of bounded size."""
+    from pg_mvt.settings import PgSettings
+
+    monkeypatch.setattr(PgSettings(), "db_cursor_prefetch", 10)
+    messages = []
+
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # The client is still connected (until the response is sent)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/features/public.landsat_wrs",
+        "raw_path": b"/features/public.landsat_wrs",
+        "query_string": b"f=ndjson",
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    app.portal.call(app.app, scope, receive, send)
+
+    assert messages[0]["status"] == 200
+    chunks = [m["body"] for m in messages[1:] if m.get("body")]
+    assert len(chunks) > 1
+    assert max(len(chunk) for chunk in chunks) < 2**17
+    features = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert len(features) == len(
+        app.get("/features/public.landsat_wrs").json()["features"]
+    )
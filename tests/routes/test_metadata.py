@@ -14,6 +14,31 @@ def test_table_index(app):
     assert body[0]["tileurl"]
 
 
+def test_table_index_filter(app):
+    """test /tables.json endpoint filters and pagination."""
+    response = app.get("/tables.json?schema=public&prefix=landsat")
+    assert response.status_code == 200
+    assert [t["id"] for t in response.json()] == ["public.landsat_wrs"]
+
+    response = app.get("/tables.json?geometry_type=multipolygon")
+    assert [t["id"] for t in response.json()] == ["public.landsat_wrs"]
+
+    response = app.get("/tables.json?schema=private")
+    assert response.json() == []
+
+    response = app.get("/tables.json?prefix=roads")
+    assert response.json() == []
+
+    response = app.get("/tables.json?limit=0")
+    assert response.json() == []
+
+    response = app.get("/tables.json?offset=1")
+    assert response.json() == []
+
+    response = app.get("/tables.json?limit=-1")
+    assert response.status_code == 400
+
+
 def test_table_info(app):
     """Test metadata endpoint."""
     response = app.get("/table/public.landsat_wrs.json")
@@ -23,11 +48,59 @@ def test_table_info(app):
     assert resp_json["minzoom"] == 5
     assert resp_json["maxzoom"] == 12
     assert resp_json["tileurl"]
+    assert resp_json["geometry_index"] is not None
+    assert resp_json["clustered"] is not None
+    assert resp_json["row_estimate"] is not None
 
     np.testing.assert_almost_equal(
         resp_json["bounds"], [-180.0, -82.6401062011719, 180.0, 82.6401062011719]
     )
 
+    # Functions, archives and files are not tables
+    for layer in ["squares", "archive_pmtiles", "grid"]:
+        response = app.get(f"/table/{layer}.json")
+        assert response.status_code == 404
+
+
+def test_files_index(app):
+    """test /files.json endpoint."""
+    response = app.get("/files.json")
+    assert response.status_code == 200
+    body = response.json()
+    assert [f["id"] for f in body] == [
+        "archive_mbtiles",
+        "archive_pmtiles",
+        "archive_overzoom",
+        "grid",
+    ]
+    assert body[0]["type"] == "Archive"
+    assert body[0]["tileurl"]
+    assert body[3]["type"] == "FileTable"
+    assert body[3]["geometry_type"] == "POLYGON"
+    assert body[3]["tileurl"]
+
+    response = app.get("/files.json?prefix=archive_&limit=1&offset=1")
+    assert [f["id"] for f in response.json()] == ["archive_pmtiles"]
+
+    response = app.get("/files.json?prefix=squares")
+    assert response.json() == []
+
+
+def test_file_info(app):
+    """Test file metadata endpoint."""
+    response = app.get("/file/grid.json")
+    assert response.status_code == 200
+    resp_json = response.json()
+    assert resp_json["id"] == "grid"
+    assert resp_json["type"] == "FileTable"
+    assert resp_json["properties"]
+    assert resp_json["tileurl"]
+
+    # Tables and functions are not files
+    for layer in ["public.landsat_wrs", "squares"]:
+        response = app.get(f"/file/{layer}.json")
+        assert response.status_code == 404
+
 
 def test_function_index(app):
     """test /functions.json endpoint."""
@@ -49,6 +122,45 @@ def test_function_index(app):
     assert body[1]["options"] == [{"name": "depth", "default": 2}]
 
 
+def test_function_index_filter(app):
+    """test /functions.json endpoint filters and pagination."""
+    response = app.get("/functions.json?limit=1")
+    assert response.status_code == 200
+    assert [f["id"] for f in response.json()] == ["squares"]
+
+    response = app.get("/functions.json?limit=1&offset=1")
+    assert [f["id"] for f in response.json()] == ["squares2"]
+
+    response = app.get("/functions.json?prefix=squares2")
+    assert [f["id"] for f in response.json()] == ["squares2"]
+
+    response = app.get("/functions.json?prefix=circles")
+    assert response.json() == []
+
+
+def test_function_index_cache(app):
+    """Registering functions should invalidate the cached documents."""
+    from pg_mvt.functions import registry
+
+    squares = registry.get("squares")
+
+    response = app.get("/functions.json")
+    assert response.json()[0]["maxzoom"] == 12
+
+    registry.register(squares.copy(update={"maxzoom": 3}))
+    try:
+        response = app.get("/functions.json")
+        assert response.json()[0]["maxzoom"] == 3
+
+        response = app.get("/squares/tilejson.json")
+        assert response.json()["maxzoom"] == 3
+    finally:
+        registry.register(squares)
+
+    response = app.get("/functions.json")
+    assert response.json()[0]["maxzoom"] == 12
+
+
 def test_function_info(app):
     """Test metadata endpoint."""
     response = app.get("/function/squares.json")
@@ -64,6 +176,11 @@ def test_function_info(app):
 
     np.testing.assert_almost_equal(resp_json["bounds"], [-180, -90, 180, 90])
 
+    # Archives and files are not functions
+    for layer in ["archive_pmtiles", "grid"]:
+        response = app.get(f"/function/{layer}.json")
+        assert response.status_code == 404
+
     response = app.get("/function/squares2.json")
     assert response.status_code == 200
     resp_json = response.json()
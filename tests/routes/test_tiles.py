@@ -1,5 +1,8 @@
 """Test Tiles endpoints."""
 
+import os
+import shutil
+
 import mapbox_vector_tile
 import numpy as np
 
@@ -38,6 +41,22 @@ def test_tilejson(app):
     assert "?limit=1000" in resp_json["tiles"][0]
 
 
+def test_tms_tilejson(app):
+    """Test TileJSON endpoint with TileMatrixSetId in the path."""
+    response = app.get("/WorldCRS84Quad/public.landsat_wrs/tilejson.json?limit=1000")
+    assert response.status_code == 200
+
+    resp_json = response.json()
+    assert resp_json["name"] == "public.landsat_wrs"
+    assert "/tiles/WorldCRS84Quad/public.landsat_wrs/{z}/{x}/{y}.pbf" in (
+        resp_json["tiles"][0]
+    )
+    assert "?limit=1000" in resp_json["tiles"][0]
+
+    response = app.get("/Foo/public.landsat_wrs/tilejson.json")
+    assert response.status_code == 404
+
+
 def test_tile(app):
     """request a tile."""
     response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf")
@@ -125,3 +144,267 @@ def test_function_tile(app):
     assert response.status_code == 200
     decoded = mapbox_vector_tile.decode(response.content)
     assert len(decoded["default"]["features"]) == 16
+
+
+def test_tile_layer_settings(app, monkeypatch):
+    """request a tile with per-layer PostgreSQL settings."""
+    from pg_mvt.settings import PgSettings
+
+    monkeypatch.setitem(
+        PgSettings().db_layer_settings,
+        "public.landsat_wrs",
+        {"jit": "off", "work_mem": "8MB"},
+    )
+    response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf?limit=10&columns=id")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    assert len(decoded["default"]["features"]) == 10
+
+
+def test_tile_app_encoding(app, monkeypatch):
+    """request a tile encoded by the application."""
+    from pg_mvt.settings import TileSettings
+
+    monkeypatch.setattr(TileSettings(), "app_encoding_layers", ["public.landsat_wrs"])
+    response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf?limit=100&columns=pr,row")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    assert len(decoded["default"]["features"]) == 100
+    assert ["pr", "row"] == list(decoded["default"]["features"][0]["properties"])
+
+    response = app.get("/tiles/public.landsat_wrs/5/0/0.pbf?columns=pr")
+    assert response.status_code == 200
+    assert response.content == b""
+
+
+def test_tms_tile(app):
+    """request a tile with TileMatrixSetId in the path."""
+    response = app.get("/tiles/WebMercatorQuad/public.landsat_wrs/0/0/0.pbf?limit=1000")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    assert len(decoded["default"]["features"]) == 1000
+
+    response = app.get("/tiles/WGS1984Quad/public.landsat_wrs/0/0/0.pbf")
+    assert response.status_code == 200
+
+    response = app.get("/tiles/Foo/public.landsat_wrs/0/0/0.pbf")
+    assert response.status_code == 404
+
+
+def test_tile_filter(app):
+    """request a tile with a CQL2 filter."""
+    response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf?filter=path=13")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    features = decoded["default"]["features"]
+    assert features
+    assert all(f["properties"]["path"] == 13 for f in features)
+
+    response = app.get(
+        "/tiles/public.landsat_wrs/0/0/0.pbf?filter=path=13 AND row BETWEEN 10 AND 20&columns=path,row"
+    )
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    features = decoded["default"]["features"]
+    assert features
+    assert all(10 <= f["properties"]["row"] <= 20 for f in features)
+
+    filter = '{"op": "in", "args": [{"property": "path"}, [13, 14]]}'
+    response = app.get(
+        f"/tiles/public.landsat_wrs/0/0/0.pbf?filter={filter}&filter-lang=cql2-json"
+    )
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    assert all(
+        f["properties"]["path"] in [13, 14] for f in decoded["default"]["features"]
+    )
+
+    # invalid property
+    response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf?filter=foo=1")
+    assert response.status_code == 400
+
+    # invalid value for property type
+    response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf?filter=path='a'")
+    assert response.status_code == 400
+
+    # invalid syntax
+    response = app.get("/tiles/public.landsat_wrs/0/0/0.pbf?filter=path=")
+    assert response.status_code == 400
+
+
+def test_archive_tilejson(app):
+    """Test TileJSON endpoint for MBTiles/PMTiles layers."""
+    for layer in ["archive_mbtiles", "archive_pmtiles"]:
+        response = app.get(f"/{layer}/tilejson.json")
+        assert response.status_code == 200
+        resp_json = response.json()
+        assert resp_json["name"] == layer
+        assert resp_json["minzoom"] == 0
+        assert resp_json["maxzoom"] == 3
+        np.testing.assert_almost_equal(
+            resp_json["bounds"], [-180.0, -85.051129, 180.0, 85.051129]
+        )
+
+
+def test_archive_tile(app):
+    """request a tile from MBTiles/PMTiles layers."""
+    for layer in ["archive_mbtiles", "archive_pmtiles"]:
+        response = app.get(f"/tiles/{layer}/2/1/3.pbf")
+        assert response.status_code == 200
+        decoded = mapbox_vector_tile.decode(response.content)
+        assert decoded["archive"]["features"][0]["properties"] == {
+            "z": 2,
+            "x": 1,
+            "y": 3,
+        }
+
+        # Tile not in the archive
+        response = app.get(f"/tiles/{layer}/5/0/0.pbf")
+        assert response.status_code == 200
+        assert response.content == b""
+
+        # Tile outside of the TileMatrixSet
+        response = app.get(f"/tiles/{layer}/2/4/0.pbf")
+        assert response.status_code == 404
+
+        # Archives are only available in WebMercatorQuad
+        response = app.get(f"/tiles/WGS1984Quad/{layer}/2/1/1.pbf")
+        assert response.status_code == 404
+
+
+def test_overzoom_tile(app):
+    """request tiles above the layer's maxzoom."""
+    # Without overzoom there is no tile above maxzoom
+    response = app.get("/tiles/archive_pmtiles/5/9/10.pbf")
+    assert response.status_code == 200
+    assert response.content == b""
+
+    # With overzoom the tile is derived from its ancestor at maxzoom (3/2/2)
+    response = app.get("/tiles/archive_overzoom/5/9/10.pbf")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    feature = decoded["archive"]["features"][0]
+    assert feature["properties"] == {"z": 3, "x": 2, "y": 2}
+    assert feature["geometry"]["type"] == "Polygon"
+
+
+def test_file_tilejson(app):
+    """Test TileJSON endpoint for File layers."""
+    response = app.get("/grid/tilejson.json")
+    assert response.status_code == 200
+    resp_json = response.json()
+    assert resp_json["name"] == "grid"
+    np.testing.assert_almost_equal(resp_json["bounds"], [-179.0, -79.0, 179.0, 79.0])
+
+
+def test_file_tile(app):
+    """request a tile from a GeoParquet file."""
+    response = app.get("/tiles/grid/0/0/0.pbf")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    assert len(decoded["default"]["features"]) == 576
+    assert ["id", "name"] == list(decoded["default"]["features"][0]["properties"])
+
+    response = app.get("/tiles/grid/3/4/3.pbf?limit=3&columns=name")
+    assert response.status_code == 200
+    decoded = mapbox_vector_tile.decode(response.content)
+    assert len(decoded["default"]["features"]) == 3
+    assert ["name"] == list(decoded["default"]["features"][0]["properties"])
+
+    # Empty tile
+    response = app.get("/tiles/grid/10/0/0.pbf")
+    assert response.status_code == 200
+    assert response.content == b""
+
+
+def test_tile_version(app):
+    """Tiles requested with the layer's data version are immutable."""
+    for layer in ["public.landsat_wrs", "archive_pmtiles", "grid"]:
+        response = app.get(f"/{layer}/tilejson.json?v=foo")
+        assert response.status_code == 200
+        url = response.json()["tiles"][0]
+        assert "v=foo" not in url
+        assert "?v=" in url
+
+        response = app.get(url.replace("{z}/{x}/{y}", "0/0/0"))
+        assert response.status_code == 200
+        assert "immutable" in response.headers["Cache-Control"]
+
+        # Outdated version
+        response = app.get(f"/tiles/{layer}/0/0/0.pbf?v=foo")
+        assert response.status_code == 200
+        assert "immutable" not in response.headers["Cache-Control"]
+
+    # Function layers do not have a data version
+    response = app.get("/squares/tilejson.json")
+    assert "v=" not in response.json()["tiles"][0]
+
+
+def test_tilejson_file_version(app, tmp_path):
+    """TileJSON documents advertise the data version of the file."""
+    from pg_mvt.functions import registry
+    from pg_mvt.layer import FileTable
+
+    grid = registry.get("grid")
+    path = tmp_path / "grid.parquet"
+    shutil.copy(grid.path, path)
+    registry.register(FileTable.from_file(id="grid", infile=str(path)))
+    try:
+        response = app.get("/grid/tilejson.json")
+        url = response.json()["tiles"][0]
+
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        response = app.get("/grid/tilejson.json")
+        assert response.json()["tiles"][0] != url
+    finally:
+        registry.register(grid)
+
+
+def test_tile_surrogate_keys(app):
+    """Tiles are tagged with the layer, zoom and region keys."""
+    response = app.get("/tiles/archive_pmtiles/2/1/3.pbf")
+    assert response.status_code == 200
+    assert response.headers["Surrogate-Key"] == (
+        "archive_pmtiles archive_pmtiles/2 archive_pmtiles/WebMercatorQuad/q23"
+    )
+
+
+def test_tile_popularity(app):
+    """Tiles are counted once, without their data version."""
+    from pg_mvt.cluster import PEER_HEADER
+    from pg_mvt.popularity import Popularity
+
+    popularity = Popularity()
+    app.app.state.popularity = popularity
+    try:
+        assert app.get("/tiles/archive_pmtiles/2/1/3.pbf?v=1").status_code == 200
+        # peers' requests are counted by the requesting node
+        response = app.get(
+            "/tiles/archive_pmtiles/2/1/3.pbf", headers={PEER_HEADER: "1"}
+        )
+        assert response.status_code == 200
+    finally:
+        # not saved on shutdown
+        app.app.state.popularity = None
+
+    key = "archive_pmtiles/WebMercatorQuad/2/1/3"
+    assert popularity.tiles() == [key]
+    assert popularity.sketch.estimate(key) == 1
+
+
+def test_file_errors(app, tmp_path):
+    """Removed files return an explicit error."""
+    from pg_mvt.functions import registry
+    from pg_mvt.layer import Archive
+
+    path = tmp_path / "tiles.pmtiles"
+    shutil.copy(registry.get("archive_pmtiles").path, path)
+    registry.register(Archive.from_file(id="removed", infile=str(path)))
+    try:
+        path.unlink()
+        response = app.get("/tiles/removed/0/0/0.pbf")
+        assert response.status_code == 500
+        assert "does not exist" in response.json()["detail"]
+    finally:
+        registry.funcs.pop("removed")
@@ -0,0 +1,70 @@
+"""test pg_mvt.batch."""
+
+import asyncio
+
+import pytest
+from morecantile import Tile
+
+from pg_mvt.batch import TileBatcher
+from pg_mvt.settings import PgSettings
+
+
+def test_tile_batcher(monkeypatch):
+    """Tiles requested within the window are rendered together."""
+    monkeypatch.setattr(PgSettings(), "db_batch_window", 0.01)
+    monkeypatch.setattr(PgSettings(), "db_batch_max_tiles", 3)
+    batches = []
+    batcher = TileBatcher()
+
+    async def render(tiles):
+        # the rendering task is referenced until it's done
+        assert batcher._tasks
+        batches.append(tiles)
+        return [f"{t.z}/{t.x}/{t.y}" for t in tiles]
+
+    async def main():
+        tiles = [Tile(0, 0, 1), Tile(1, 0, 1), Tile(0, 0, 1), Tile(1, 1, 1)]
+        results = await asyncio.gather(
+            *[batcher.get("a", tile, render) for tile in tiles],
+            batcher.get("b", Tile(0, 0, 0), render),
+        )
+        assert results == ["1/0/0", "1/1/0", "1/0/0", "1/1/1", "0/0/0"]
+
+        # full batch is rendered before the end of the window
+        results = await asyncio.gather(
+            *[batcher.get("a", Tile(x, 0, 2), render) for x in range(4)]
+        )
+        assert results == ["2/0/0", "2/1/0", "2/2/0", "2/3/0"]
+
+        await asyncio.sleep(0)
+        assert not batcher._tasks
+
+    asyncio.run(main())
+    assert batches == [
+        [Tile(0, 0, 1), Tile(1, 0, 1), Tile(1, 1, 1)],
+        [Tile(0, 0, 0)],
+        [Tile(0, 0, 2), Tile(1, 0, 2), Tile(2, 0, 2)],
+        [Tile(3, 0, 2)],
+    ]
+
+
+def test_tile_batcher_error(monkeypatch):
+    """Errors are raised for all the tiles of the batch."""
+    monkeypatch.setattr(PgSettings(), "db_batch_window", 0.01)
+
+    async def render(tiles):
+        raise ValueError("invalid")
+
+    async def main():
+        batcher = TileBatcher()
+        return await asyncio.gather(
+            batcher.get("a", Tile(0, 0, 1), render),
+            batcher.get("a", Tile(1, 0, 1), render),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+    with pytest.raises(ValueError):
+        asyncio.run(TileBatcher().get("a", Tile(0, 0, 0), render))
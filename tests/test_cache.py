@@ -0,0 +1,234 @@
+"""Test pg_mvt.cache and overzoom."""
+
+import asyncio
+import time
+
+import mapbox_vector_tile
+import morecantile
+from morecantile import Tile
+from shapely.geometry import Point
+
+from pg_mvt.cache import MemoryCache, RefreshAheadCache, SharedMemoryCache, cache_key
+from pg_mvt.mvt import encode, overzoom
+from pg_mvt.tiles import ancestor, get_tile
+
+
+def test_memory_cache():
+    """Test LRU eviction and time to live."""
+    cache = MemoryCache(maxsize=2, ttl=60)
+    cache.set("a", b"a")
+    cache.set("b", b"b")
+    assert cache.get("a") == b"a"
+
+    # `b` is the least recently used tile
+    cache.set("c", b"c")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a"
+    assert cache.get("c") == b"c"
+    assert len(cache) == 2
+
+    cache.set("d", b"d", ttl=0)
+    time.sleep(0.01)
+    assert cache.get("d") is None
+
+    assert 59 < cache.expires_in("c") <= 60
+    assert cache.expires_in("b") is None
+
+    cache.invalidate(lambda key: key == "a")
+    assert cache.get("a") is None
+    assert cache.get("c") == b"c"
+
+    cache.clear()
+    assert cache.get("c") is None
+
+
+def test_shared_cache(tmp_path):
+    """Test cache shared between processes."""
+    path = str(tmp_path / "cache")
+    cache = SharedMemoryCache(path, size=2**16, buckets=64, ttl=60)
+    # Another process opening the same file
+    other = SharedMemoryCache(path, size=2**16, buckets=64, ttl=60)
+
+    cache.set("a", b"a")
+    cache.set("empty", b"")
+    assert other.get("a") == b"a"
+    assert other.get("empty") == b""
+    assert other.get("b") is None
+
+    other.set("a", b"aa")
+    assert cache.get("a") == b"aa"
+    assert 59 < cache.expires_in("a") <= 60
+    assert cache.expires_in("b") is None
+
+    cache.set("c", b"c", ttl=0)
+    time.sleep(0.01)
+    assert cache.get("c") is None
+
+    # Tiles too large for the cache are ignored
+    cache.set("large", b"x" * 2**15)
+    assert cache.get("large") is None
+
+    # Records overwritten in the ring buffer are not returned
+    cache.set("d", b"d")
+    for i in range(20):
+        cache.set(f"fill{i}", b"x" * 2**12)
+    assert cache.get("d") is None
+    assert cache.get("fill19") == b"x" * 2**12
+
+    other.set("layer/WebMercatorQuad/0/0/0", b"a")
+    cache.invalidate(lambda key: key.startswith("fill1"))
+    assert other.get("fill19") is None
+    assert other.get("fill9") == b"x" * 2**12
+    assert other.get("layer/WebMercatorQuad/0/0/0") == b"a"
+
+    cache.clear()
+    assert other.get("fill9") is None
+
+    # Opening the file with a different configuration replaces it, processes
+    # using the previous file keep their cache
+    other.set("a", b"a")
+    cache.close()
+    cache = SharedMemoryCache(path, size=2**17, buckets=64)
+    assert cache.get("a") is None
+    assert other.get("a") == b"a"
+    other.set("b", b"b")
+    assert cache.get("b") is None
+
+    reopened = SharedMemoryCache(path, size=2**17, buckets=64)
+    cache.set("c", b"c")
+    assert reopened.get("c") == b"c"
+    for c in (cache, other, reopened):
+        c.close()
+
+
+def test_refresh_ahead_cache():
+    """Hot tiles are re-rendered in the background before they expire."""
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return b"new"
+
+    async def main():
+        cache = RefreshAheadCache(MemoryCache(ttl=60), window=10, min_hits=2)
+
+        # Not expiring soon
+        cache.set("a", b"old")
+        cache.hit("a", render)
+        cache.hit("a", render)
+        await asyncio.sleep(0)
+        assert not renders
+
+        # Expiring soon but not hot yet
+        cache.set("b", b"old", ttl=5)
+        cache.hit("b", render)
+        await asyncio.sleep(0)
+        assert not renders
+
+        # Hot and expiring soon: only one render is scheduled
+        cache.hit("b", render)
+        cache.hit("b", render)
+        await asyncio.sleep(0.01)
+        assert len(renders) == 1
+        assert cache.get("b") == b"new"
+        assert cache.expires_in("b") > 10
+
+        # Rate limit
+        cache = RefreshAheadCache(MemoryCache(ttl=1), window=10, min_hits=1, rate=1)
+        cache.set("c", b"old")
+        cache.set("d", b"old")
+        cache.hit("c", render)
+        cache.hit("d", render)
+        await asyncio.sleep(0.01)
+        assert len(renders) == 2
+        assert cache.get("c") == b"new"
+        assert cache.get("d") == b"old"
+
+    asyncio.run(main())
+
+
+def test_refresh_ahead_hits():
+    """The coldest hit counters are evicted first."""
+
+    async def render():
+        return b"new"
+
+    cache = RefreshAheadCache(MemoryCache(ttl=60), min_hits=100, max_keys=4)
+    for _ in range(3):
+        cache.hit("hot", render)
+    for key in "abc":
+        cache.hit(key, render)
+    cache.hit("a", render)
+
+    cache.hit("d", render)
+    assert cache._hits == {"hot": 3, "a": 2, "d": 1}
+
+
+def test_refresh_ahead_pool():
+    """Refresh-ahead renders use the refresh pool."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+    pools = []
+
+    class Layer:
+        id = "layer"
+        overzoom = False
+
+        async def get_tile(self, pool, tile, tms, **kwargs):
+            pools.append(pool)
+            return b"new"
+
+    async def main():
+        cache = RefreshAheadCache(MemoryCache(ttl=60), window=10, min_hits=1)
+        cache.set("layer/WebMercatorQuad/0/0/0", b"old", ttl=5)
+        content = await get_tile(
+            "pool", cache, Layer(), Tile(0, 0, 0), tms, refresh_pool="refresh_pool"
+        )
+        assert content == b"old"
+        await asyncio.sleep(0.01)
+        assert cache.get("layer/WebMercatorQuad/0/0/0") == b"new"
+
+    asyncio.run(main())
+    assert pools == ["refresh_pool"]
+
+
+def test_cache_key():
+    """Query parameters order should not change the key."""
+    tile = Tile(1, 2, 3)
+    assert (
+        cache_key("layer", "WebMercatorQuad", tile, {}) == "layer/WebMercatorQuad/3/1/2"
+    )
+    assert cache_key(
+        "layer", "WebMercatorQuad", tile, {"limit": "10", "columns": "a"}
+    ) == cache_key("layer", "WebMercatorQuad", tile, {"columns": "a", "limit": "10"})
+
+
+def test_ancestor():
+    """Test ancestor tile."""
+    assert ancestor(Tile(9, 10, 5), 3) == Tile(2, 2, 3)
+    assert ancestor(Tile(9, 10, 5), 5) == Tile(9, 10, 5)
+
+
+def test_overzoom():
+    """Derive child tiles from a parent tile."""
+    # Point in the top-left quarter of the parent tile (tile coordinates, y down)
+    content = encode(
+        [Point(1500, 100)],
+        [{"name": "a"}],
+        (0, 0, 4096, 4096),
+        name="layer",
+        y_coord_down=True,
+    )
+
+    # Child tile 1/0/0 is the top-left quarter
+    data = overzoom(content, (0, 0, 0), (1, 0, 0))
+    decoded = mapbox_vector_tile.decode(data, default_options={"y_coord_down": True})
+    feature = decoded["layer"]["features"][0]
+    assert feature["geometry"]["coordinates"] == [3000, 200]
+    assert feature["properties"] == {"name": "a"}
+
+    # Child tile 1/1/1 does not contain the point
+    data = overzoom(content, (0, 0, 0), (1, 1, 1))
+    decoded = mapbox_vector_tile.decode(data)
+    assert decoded["layer"]["features"] == []
+
+    assert overzoom(b"", (0, 0, 0), (1, 0, 0)) == b""
@@ -0,0 +1,27 @@
+"""test pg_mvt.cli."""
+
+import json
+
+import pytest
+
+from pg_mvt.cli import main
+
+
+def test_heavy_tiles(database_url, capsys):
+    """Check heavy-tiles command."""
+    args = ["--database-url", str(database_url), "heavy-tiles", "public.landsat_wrs"]
+
+    main(args + ["--zoom", "3", "--limit", "5", "--json"])
+    result = json.loads(capsys.readouterr().out)
+    assert result["id"] == "public.landsat_wrs"
+    assert len(result["tiles"]) == 5
+
+    main(args + ["--zoom", "3"])
+    out = capsys.readouterr().out
+    assert "public.landsat_wrs (WebMercatorQuad, zoom 3)" in out
+    assert "heatmap" in out
+
+    with pytest.raises(SystemExit):
+        main(
+            ["--database-url", str(database_url), "heavy-tiles", "public.a", "-z", "1"]
+        )
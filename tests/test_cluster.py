@@ -0,0 +1,231 @@
+"""test pg_mvt.cluster."""
+
+import asyncio
+from collections import Counter
+
+import morecantile
+import pytest
+from morecantile import Tile
+
+from pg_mvt import tiles
+from pg_mvt.cache import MemoryCache
+from pg_mvt.cluster import (
+    PEER_HEADER,
+    Cluster,
+    HashRing,
+    get_cluster,
+    http_get,
+    peer_request,
+    peer_url,
+)
+from pg_mvt.settings import CacheSettings
+
+PEERS = ["http://a:8081", "http://b:8081", "http://c:8081"]
+
+
+def test_hash_ring():
+    """Keys are shared between the nodes and mostly keep their owner."""
+    ring = HashRing(PEERS, replicas=64)
+    keys = [f"public.roads/WebMercatorQuad/12/{x}/1" for x in range(3000)]
+    owners = {key: ring.owner(key) for key in keys}
+    assert set(owners.values()) == set(PEERS)
+    assert min(Counter(owners.values()).values()) > 500
+
+    # Only the keys of the removed node change owner
+    ring = HashRing(PEERS[:2], replicas=64)
+    for key, owner in owners.items():
+        if owner != PEERS[2]:
+            assert ring.owner(key) == owner
+
+
+def test_peer_url():
+    """Cache keys map to the peers' tile urls."""
+    assert (
+        peer_url("http://a:8081/", "public.roads/WebMercatorQuad/1/0/1")
+        == "http://a:8081/tiles/WebMercatorQuad/public.roads/1/0/1.pbf"
+    )
+    assert (
+        peer_url("http://a:8081", "public.roads/WebMercatorQuad/1/0/1?columns=name")
+        == "http://a:8081/tiles/WebMercatorQuad/public.roads/1/0/1.pbf?columns=name"
+    )
+
+
+async def _serve(response: bytes):
+    """Start a server replying `response` and recording the requests."""
+    requests = []
+
+    async def handle(reader, writer):
+        requests.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}", requests
+
+
+def test_http_get():
+    """Content-length and chunked responses."""
+
+    async def main():
+        server, url, requests = await _serve(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+        )
+        async with server:
+            status, body = await http_get(f"{url}/a?b=1", headers=[("X-A", "1")])
+        assert (status, body) == (200, b"hello")
+        assert requests[0].startswith(b"GET /a?b=1 HTTP/1.1\r\n")
+        assert b"X-A: 1\r\n" in requests[0]
+
+        server, url, _ = await _serve(
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3\r\nhel\r\n2\r\nlo\r\n0\r\n\r\n"
+        )
+        async with server:
+            assert await http_get(url) == (200, b"hello")
+
+    asyncio.run(main())
+
+
+def test_cluster_fetch():
+    """Peer tiles are requested with the peer header, failures return None."""
+
+    async def main():
+        server, url, requests = await _serve(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\ntile"
+        )
+        cluster = Cluster([url, "http://self"], "http://self")
+        async with server:
+            content = await cluster.fetch(url, "public.roads/WebMercatorQuad/1/0/1")
+        assert content == b"tile"
+        assert requests[0].startswith(
+            b"GET /tiles/WebMercatorQuad/public.roads/1/0/1.pbf HTTP/1.1"
+        )
+        assert f"{PEER_HEADER}: 1".encode() in requests[0]
+
+        server, url, _ = await _serve(
+            b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"
+        )
+        async with server:
+            assert (
+                await cluster.fetch(url, "public.roads/WebMercatorQuad/1/0/1") is None
+            )
+
+        # connection refused
+        assert await cluster.fetch(url, "public.roads/WebMercatorQuad/1/0/1") is None
+
+        # the peer closed the connection before sending the whole body
+        server, url, _ = await _serve(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\ntile"
+        )
+        async with server:
+            assert (
+                await cluster.fetch(url, "public.roads/WebMercatorQuad/1/0/1") is None
+            )
+
+    asyncio.run(main())
+
+
+class _Layer:
+    id = "public.roads"
+    overzoom = False
+    rendered = 0
+
+    async def get_tile(self, pool, tile, tms, **kwargs):
+        self.rendered += 1
+        await asyncio.sleep(0.01)
+        return b"local"
+
+
+class _Cluster:
+    def __init__(self, content):
+        self.content = content
+        self.fetched = []
+
+    def owner(self, key):
+        return "http://b:8081"
+
+    async def fetch(self, peer, key):
+        self.fetched.append((peer, key))
+        await asyncio.sleep(0.01)
+        return self.content
+
+
+def test_get_tile_cluster(monkeypatch):
+    """Cache misses are fetched from the owner node (rendered on failure)."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+
+    async def get(cache, layer, tile):
+        return await tiles.get_tile(None, cache, layer, tile, tms)
+
+    cluster = _Cluster(b"remote")
+    monkeypatch.setattr(tiles, "get_cluster", lambda: cluster)
+    cache, layer = MemoryCache(maxsize=10, ttl=60), _Layer()
+    assert asyncio.run(get(cache, layer, Tile(0, 0, 1))) == b"remote"
+    assert cluster.fetched == [("http://b:8081", "public.roads/WebMercatorQuad/1/0/0")]
+    assert cache.get("public.roads/WebMercatorQuad/1/0/0") == b"remote"
+    assert layer.rendered == 0
+
+    # the owner failed
+    cluster.content = None
+    assert asyncio.run(get(cache, layer, Tile(1, 0, 1))) == b"local"
+    assert layer.rendered == 1
+
+    # peers' requests are rendered
+    cluster.content = b"remote"
+    token = peer_request.set(True)
+    try:
+        assert asyncio.run(get(cache, layer, Tile(1, 1, 1))) == b"local"
+    finally:
+        peer_request.reset(token)
+    assert len(cluster.fetched) == 2
+
+
+def test_get_tile_single_flight(monkeypatch):
+    """Concurrent misses of a tile are fetched or rendered once."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+
+    async def get(cache, layer, tile, n):
+        results = await asyncio.gather(
+            *[tiles.get_tile(None, cache, layer, tile, tms) for _ in range(n)]
+        )
+        assert not tiles._inflight
+        return results
+
+    # the owner renders a tile once, whatever the number of peers requesting it
+    monkeypatch.setattr(tiles, "get_cluster", lambda: None)
+    cache, layer = MemoryCache(maxsize=10, ttl=60), _Layer()
+    token = peer_request.set(True)
+    try:
+        assert asyncio.run(get(cache, layer, Tile(0, 0, 1), 8)) == [b"local"] * 8
+    finally:
+        peer_request.reset(token)
+    assert layer.rendered == 1
+
+    # without cache
+    cache, layer = MemoryCache(maxsize=0, ttl=60), _Layer()
+    assert asyncio.run(get(cache, layer, Tile(0, 0, 1), 8)) == [b"local"] * 8
+    assert layer.rendered == 1
+
+    # the requester fetches the tile from the owner once
+    cluster = _Cluster(b"remote")
+    monkeypatch.setattr(tiles, "get_cluster", lambda: cluster)
+    cache, layer = MemoryCache(maxsize=10, ttl=60), _Layer()
+    assert asyncio.run(get(cache, layer, Tile(0, 0, 1), 8)) == [b"remote"] * 8
+    assert len(cluster.fetched) == 1
+    assert layer.rendered == 0
+
+
+def test_get_cluster_cache_disabled(monkeypatch):
+    """Cluster mode without tile cache is reported."""
+    settings = CacheSettings()
+    monkeypatch.setattr(settings, "peers", ["http://a:8081"])
+    monkeypatch.setattr(settings, "peer_self", "http://b:8081")
+    monkeypatch.setattr(settings, "disable", True)
+    get_cluster.cache_clear()
+    try:
+        with pytest.warns(RuntimeWarning, match="cache disabled"):
+            assert get_cluster().peers == ["http://a:8081", "http://b:8081"]
+    finally:
+        get_cluster.cache_clear()
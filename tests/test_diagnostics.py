@@ -0,0 +1,77 @@
+"""test pg_mvt.diagnostics."""
+
+from pg_mvt.diagnostics import rank_tables, table_diagnostics
+from pg_mvt.layer import Table
+
+
+def _table(id, **kwargs):
+    kwargs.setdefault("minzoom", 0)
+    return Table(
+        id=id,
+        schema="public",
+        table=id.split(".")[1],
+        geometry_type="POINT",
+        geometry_column="geom",
+        geometry_srid=4326,
+        properties={"geom": "geometry"},
+        **kwargs,
+    )
+
+
+def test_table_diagnostics():
+    """Check tile cost and issues."""
+    table = _table(
+        "public.indexed",
+        geometry_index=True,
+        clustered=True,
+        row_estimate=1000,
+        bounds=[-180, -85.051129, 180, 85.051129],
+    )
+    diag = table_diagnostics(table)
+    assert diag["rows_per_tile"] == 1000
+    assert diag["issues"] == []
+
+    # bounds covering a z=1 tile
+    table = _table(
+        "public.indexed",
+        geometry_index=True,
+        clustered=True,
+        row_estimate=1000,
+        minzoom=1,
+        bounds=[0, 0, 180, 85.051129],
+    )
+    assert table_diagnostics(table)["rows_per_tile"] == 1000
+
+    table.minzoom = 2
+    assert table_diagnostics(table)["rows_per_tile"] == 250
+
+    table = _table("public.seq", geometry_index=False, clustered=False, row_estimate=10)
+    diag = table_diagnostics(table, min_rows=5)
+    assert diag["rows_per_tile"] == 10
+    assert len(diag["issues"]) == 2
+    assert table.is_unindexed(5)
+    assert not table.is_unindexed(100)
+
+    table = _table("public.new", geometry_index=True, clustered=False, row_estimate=-1)
+    diag = table_diagnostics(table)
+    assert diag["rows_per_tile"] == 0
+    assert diag["issues"] == ["table has never been analyzed"]
+
+    # catalog without index information
+    table = _table("public.unknown")
+    assert not table.is_unindexed(0)
+    assert table_diagnostics(table)["issues"] == []
+
+
+def test_rank_tables():
+    """Tables are ranked by tile cost."""
+    tables = [
+        _table("public.a", geometry_index=True, clustered=True, row_estimate=100),
+        _table("public.b", geometry_index=False, clustered=False, row_estimate=10000),
+        _table("public.c", geometry_index=True, clustered=True, row_estimate=1000),
+    ]
+    assert [d["id"] for d in rank_tables(tables)] == [
+        "public.b",
+        "public.c",
+        "public.a",
+    ]
@@ -0,0 +1,45 @@
+"""Test pg_mvt.factory."""
+
+import pytest
+
+from pg_mvt.factory import TilerEndpoints
+
+from starlette.routing import NoMatchFound
+
+
+def test_url_path_for():
+    """Test reverse routing."""
+    endpoints = TilerEndpoints.factory(prefix="/prefix")
+    controller = endpoints(owner=None)  # type: ignore
+
+    assert (
+        controller.url_path_for("tile", layer="a", z="{z}", x="{x}", y="{y}")
+        == "/tiles/a/{z}/{x}/{y}.pbf"
+    )
+    assert (
+        controller.url_path_for(
+            "tms_tile", TileMatrixSetId="WGS1984Quad", layer="a", z="1", x="2", y="3"
+        )
+        == "/tiles/WGS1984Quad/a/1/2/3.pbf"
+    )
+    # The index is computed once per controller class
+    assert "tile" in endpoints.__dict__["_reverse_routes"]
+
+    with pytest.raises(NoMatchFound):
+        controller.url_path_for("tile", layer="a")
+
+    with pytest.raises(NoMatchFound):
+        controller.url_path_for("foo")
+
+
+def test_factory_viewer():
+    """The HTML viewer can be removed."""
+    endpoints = TilerEndpoints.factory(viewer=False)
+    controller = endpoints(owner=None)  # type: ignore
+    assert controller.url_path_for("tilejson", layer="a") == "/a/tilejson.json"
+
+    with pytest.raises(NoMatchFound):
+        controller.url_path_for("viewer", layer="a")
+
+    controller = TilerEndpoints(owner=None)  # type: ignore
+    assert controller.url_path_for("viewer", layer="a") == "/a/viewer"
@@ -0,0 +1,108 @@
+"""Test pg_mvt.filters."""
+
+import datetime
+
+import pytest
+from buildpg import render
+
+from pg_mvt.errors import InvalidFilter
+from pg_mvt.filters import parse_filter, to_sql
+
+properties = {"id": "int4", "name": "text", "value": "float8", "day": "date"}
+
+
+def test_parse_cql2_text():
+    """Parse CQL2-text to CQL2-JSON."""
+    assert parse_filter("id = 1") == {"op": "=", "args": [{"property": "id"}, 1]}
+    assert parse_filter("name IS NOT NULL") == {
+        "op": "not",
+        "args": [{"op": "isNull", "args": [{"property": "name"}]}],
+    }
+    assert parse_filter("id IN (1, 2) AND name LIKE 'a%'") == {
+        "op": "and",
+        "args": [
+            {"op": "in", "args": [{"property": "id"}, [1, 2]]},
+            {"op": "like", "args": [{"property": "name"}, "a%"]},
+        ],
+    }
+    assert parse_filter("day > DATE('2020-01-01')") == {
+        "op": ">",
+        "args": [{"property": "day"}, {"date": "2020-01-01"}],
+    }
+
+    with pytest.raises(InvalidFilter):
+        parse_filter("id = ")
+
+    with pytest.raises(InvalidFilter):
+        parse_filter("id = 1 1")
+
+
+def test_to_sql():
+    """Compile filters to parameterized SQL."""
+    q, p = render(":w", w=to_sql(parse_filter("id = 1 OR value < 2.5"), properties))
+    assert q == "t.id = $1 OR t.value < $2"
+    assert p == [1, 2.5]
+
+    q, p = render(":w", w=to_sql(parse_filter("id BETWEEN 1 AND 5"), properties))
+    assert q == "t.id >= $1 AND t.id <= $2"
+    assert p == [1, 5]
+
+    q, p = render(":w", w=to_sql(parse_filter("id IN (1, 2)"), properties))
+    assert q == "t.id = any($1)"
+    assert p == [[1, 2]]
+
+    q, p = render(":w", w=to_sql(parse_filter("day = '2020-01-01'"), properties))
+    assert p == [datetime.date(2020, 1, 1)]
+
+    # SQL injection attempts are passed as parameters
+    q, p = render(
+        ":w", w=to_sql(parse_filter("name = 'a''; DROP TABLE t; --'"), properties)
+    )
+    assert q == "t.name = $1"
+    assert p == ["a'; DROP TABLE t; --"]
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("foo = 1"), properties)
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("id = 'a'"), properties)
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("id LIKE 'a'"), properties)
+
+
+def test_to_sql_literals():
+    """Literals are not truncated or coerced to the column type."""
+    props = {**properties, "b": "bool"}
+
+    q, p = render(":w", w=to_sql(parse_filter("id = 2.0 AND b = 'TRUE'"), props))
+    assert p == [2, True]
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("id < 2.5"), props)
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("id = TRUE"), props)
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("b = 'maybe'"), props)
+
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter("b = 1"), props)
+
+
+@pytest.mark.parametrize(
+    "filter,filter_lang",
+    [
+        ("id = 1.", "cql2-text"),
+        ("id = 01", "cql2-text"),
+        ('{"op": 1}', "cql2-json"),
+        ('{"op": "not", "args": []}', "cql2-json"),
+        ('{"op": "and", "args": {"op": "isNull"}}', "cql2-json"),
+        ('[{"op": "isNull"}]', "cql2-json"),
+    ],
+)
+def test_invalid_filters(filter, filter_lang):
+    """Invalid filters raise InvalidFilter (400)."""
+    with pytest.raises(InvalidFilter):
+        to_sql(parse_filter(filter, filter_lang), properties)
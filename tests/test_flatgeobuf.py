@@ -0,0 +1,109 @@
+"""test pg_mvt.flatgeobuf."""
+
+import shapely
+from pyogrio.raw import read
+
+from pg_mvt import flatgeobuf
+
+COLUMNS = {
+    "id": "int4",
+    "name": "text",
+    "count": "int8",
+    "valid": "bool",
+    "value": "float8",
+    "tags": "jsonb",
+    "date": "timestamp",
+}
+
+
+def _read(tmp_path, data: bytes):
+    path = tmp_path / "features.fgb"
+    path.write_bytes(data)
+    return read(str(path))
+
+
+def test_flatgeobuf(tmp_path):
+    """Streamed files are read back (typed properties, no index)."""
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [
+                        [[0, 0], [2, 0], [2, 2], [0, 0]],
+                        [[0.5, 0.2], [1, 0.2], [1, 0.5], [0.5, 0.2]],
+                    ],
+                    [[[5, 5], [6, 5], [6, 6], [5, 5]]],
+                ],
+            },
+            "properties": {
+                "id": 1,
+                "name": "é",
+                "count": 2**40,
+                "valid": True,
+                "value": 1.5,
+                "tags": {"a": 1},
+                "date": "2020-01-02T03:04:05",
+            },
+        },
+        {
+            "type": "Feature",
+            "geometry": {"type": "MultiPolygon", "coordinates": []},
+            "properties": {"id": 2, "name": None},
+        },
+    ]
+    data = flatgeobuf.header("layer", "MULTIPOLYGON", COLUMNS) + b"".join(
+        flatgeobuf.feature(feature, COLUMNS) for feature in features
+    )
+    meta, _, geometries, fields = _read(tmp_path, data)
+    assert meta["crs"] == "EPSG:4326"
+    assert meta["geometry_type"] == "MultiPolygon"
+    assert list(meta["fields"]) == list(COLUMNS)
+
+    assert shapely.from_wkb(geometries[0]).equals(
+        shapely.geometry.shape(features[0]["geometry"])
+    )
+    assert shapely.from_wkb(geometries[1]).is_empty
+    assert [field[0] for field in fields[:5]] == [1, "é", 2**40, True, 1.5]
+    assert fields[5][0] == '{"a": 1}'
+    assert str(fields[6][0]) == "2020-01-02T03:04:05.000"
+    assert fields[0][1] == 2
+    assert fields[1][1] is None
+
+
+def test_flatgeobuf_geometries(tmp_path):
+    """All the GeoJSON geometry types are written (mixed geometry types)."""
+    geometries = [
+        {"type": "Point", "coordinates": [1, 2]},
+        {"type": "LineString", "coordinates": [[1, 2], [3, 4]]},
+        {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]},
+        {"type": "MultiPoint", "coordinates": [[1, 2], [3, 4]]},
+        {
+            "type": "MultiLineString",
+            "coordinates": [[[1, 2], [3, 4]], [[5, 6], [7, 8], [9, 9]]],
+        },
+        {
+            "type": "GeometryCollection",
+            "geometries": [
+                {"type": "Point", "coordinates": [1, 2]},
+                {"type": "LineString", "coordinates": [[1, 2], [3, 4, 5]]},
+            ],
+        },
+        None,
+    ]
+    data = flatgeobuf.header("layer", "GEOMETRY", {}) + b"".join(
+        flatgeobuf.feature({"geometry": geometry, "properties": {}}, {})
+        for geometry in geometries
+    )
+    meta, _, wkbs, _ = _read(tmp_path, data)
+    assert meta["geometry_type"] == "Unknown"
+    assert [shapely.from_wkb(wkb).wkt if wkb is not None else None for wkb in wkbs] == [
+        "POINT (1 2)",
+        "LINESTRING (1 2, 3 4)",
+        "POLYGON ((0 0, 1 0, 1 1, 0 0))",
+        "MULTIPOINT (1 2, 3 4)",
+        "MULTILINESTRING ((1 2, 3 4), (5 6, 7 8, 9 9))",
+        "GEOMETRYCOLLECTION (POINT (1 2), LINESTRING (1 2, 3 4))",
+        None,
+    ]
@@ -0,0 +1,267 @@
+"""Test pg_mvt.layer."""
+
+import asyncio
+import os
+import shutil
+
+import morecantile
+import pytest
+from morecantile import Tile
+from morecantile.errors import InvalidIdentifier
+
+from pg_mvt.archive import open_archive
+from pg_mvt.errors import InvalidArchive, InvalidDataset, TileNotFound
+from pg_mvt.layer import Archive, FileTable, Table, file_version
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+table = Table(
+    id="public.landsat_wrs",
+    schema="public",
+    table="landsat_wrs",
+    geometry_type="MULTIPOLYGON",
+    geometry_column="geom",
+    geometry_srid=4326,
+    properties={"id": "int4", "pr": "text", "geom": "geometry"},
+)
+
+
+def test_tile_query():
+    """Test Table tile query."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+
+    q, p = table.tile_query(Tile(0, 0, 0), tms)
+    assert "AND TRUE" in q
+    assert "AS geom, id, pr" in q
+    assert p[-1] == 10000
+
+    q, p = table.tile_query(Tile(0, 0, 0), tms, columns="pr", limit="0")
+    assert "AS geom, pr" in q
+    assert p[-1] == 0
+
+    q, p = table.tile_query(Tile(0, 0, 0), tms, filter="id > 10")
+    assert "AND t.id > $" in q
+    assert 10 in p
+
+
+def test_tiles_query():
+    """Test Table tiles (batch) query."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+
+    tiles = [Tile(0, 0, 1), Tile(1, 1, 1)]
+    q, p = table.tiles_query(tiles, tms, columns="pr", filter="id > 10")
+    assert "AS geom, pr" in q
+    assert "AND t.id > $" in q
+    assert [0, 1] in p
+    xmin = [tms.xy_bounds(tile).left for tile in tiles]
+    assert pytest.approx(xmin) == p[p.index([0, 1]) + 1]
+    assert p[-1] == 10000
+
+
+def test_features_query():
+    """Test Table features (app encoding) query."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+
+    q, p = table.features_query(Tile(0, 0, 1), tms, columns="pr", resolution="512")
+    assert "ST_SnapToGrid" in q
+    assert "AS pg_mvt_geom, pr" in q
+    bbox = tms.xy_bounds(Tile(0, 0, 1))
+    assert pytest.approx((bbox.right - bbox.left) / 512) in p
+    assert p[-1] == 10000
+
+
+def test_app_encoded_tile(monkeypatch):
+    """Features are encoded by the application."""
+    from contextlib import asynccontextmanager
+
+    import mapbox_vector_tile
+    import shapely
+
+    from pg_mvt.settings import TileSettings
+
+    monkeypatch.setattr(TileSettings(), "app_encoding_layers", ["*"])
+    monkeypatch.setattr(TileSettings(), "encoder_processes", 0)
+    assert table.is_app_encoded()
+
+    tms = morecantile.tms.get("WebMercatorQuad")
+    bbox = tms.xy_bounds(Tile(0, 0, 1))
+    rows = [
+        {"pg_mvt_geom": shapely.to_wkb(shapely.box(*bbox)), "pr": "a"},
+        {"pg_mvt_geom": shapely.to_wkb(shapely.Point(bbox.left, bbox.top)), "pr": None},
+    ]
+
+    class Connection:
+        async def fetch(self, q, *p):
+            return rows
+
+    class Pool:
+        @asynccontextmanager
+        async def acquire(self):
+            yield Connection()
+
+    content = asyncio.run(table.get_tile(Pool(), Tile(0, 0, 1), tms))
+    features = mapbox_vector_tile.decode(content)["default"]["features"]
+    assert [f["properties"] for f in features] == [{"pr": "a"}, {}]
+    assert features[0]["geometry"]["type"] == "Polygon"
+
+    rows.clear()
+    assert asyncio.run(table.get_tile(Pool(), Tile(0, 0, 1), tms)) == b""
+
+
+def test_export_query():
+    """Test Table features export query."""
+    q, p = table.export_query()
+    assert "ST_AsGeoJSON(f.*, 'pg_mvt_geom')" in q
+    assert "AS pg_mvt_geom, id, pr" in q
+    assert "WHERE TRUE" in q
+    assert p == [None]
+
+    q, p = table.export_query([-10, -5, 10, 5], 100, columns="pr", filter="id > 3")
+    assert "AS pg_mvt_geom, pr" in q
+    assert "ST_Intersects(t.geom, ST_Transform(ST_MakeEnvelope(" in q
+    assert "AND t.id > $" in q
+    assert p == [-10.0, -5.0, 10.0, 5.0, 4326, 4326, 3, 100]
+
+
+def test_iter_features():
+    """Features are read with a cursor, within a transaction."""
+    from contextlib import asynccontextmanager
+
+    calls = []
+
+    class Connection:
+        @asynccontextmanager
+        async def transaction(self):
+            calls.append("begin")
+            yield
+            calls.append("commit")
+
+        def cursor(self, q, *p, prefetch=None):
+            calls.append(prefetch)
+
+            async def rows():
+                for i in range(3):
+                    yield (f'{{"type": "Feature", "properties": {{"id": {i}}}}}',)
+
+            return rows()
+
+    class Pool:
+        @asynccontextmanager
+        async def acquire(self):
+            yield Connection()
+
+    async def main():
+        return [f async for f in table.iter_features(Pool(), columns="id")]
+
+    features = asyncio.run(main())
+    assert len(features) == 3
+    assert features[2] == '{"type": "Feature", "properties": {"id": 2}}'
+    assert calls == ["begin", 1000, "commit"]
+
+
+def test_tile_query_style(monkeypatch):
+    """Properties and features are selected with the layer's style."""
+    from pg_mvt.style import LayerStyle, StyleRegistry, StyleRule
+
+    tms = morecantile.tms.get("WebMercatorQuad")
+    style = LayerStyle(
+        rules=[
+            StyleRule(
+                maxzoom=4,
+                properties=["pr", "unknown"],
+                filter={"op": ">", "args": [{"property": "id"}, 10]},
+            ),
+            StyleRule(minzoom=6, maxzoom=8),
+            StyleRule(minzoom=8, filter={"op": "=", "args": [{"property": "x"}, 1]}),
+        ]
+    )
+    monkeypatch.setattr(StyleRegistry, "styles", {"public.landsat_wrs": style})
+
+    q, p = table.tile_query(Tile(0, 0, 1), tms)
+    assert "AS geom, pr" in q
+    assert "AND t.id > $" in q
+
+    # `columns` and `filter` query parameters
+    q, p = table.tile_query(Tile(0, 0, 1), tms, columns="id", filter="pr = 'a'")
+    assert "AS geom, id" in q
+    assert "t.pr = $" in q and "t.id > $" in q
+
+    # No properties used
+    q, p = table.tile_query(Tile(0, 0, 6), tms)
+    assert "AS geom, NULL AS pg_mvt_none" in " ".join(q.split())
+    assert "AND TRUE" in q
+
+    # The style's filter uses unknown properties
+    q, p = table.tile_query(Tile(0, 0, 9), tms)
+    assert "AND TRUE" in q
+
+    # The layer is not used at zoom 4 and 5 (tiles are displayed from the
+    # previous zoom level up to the next one)
+    monkeypatch.setattr(style.rules[0], "maxzoom", 3)
+    assert asyncio.run(table.get_tile(None, Tile(0, 0, 4), tms)) == b""
+
+
+def test_file_version(tmp_path):
+    """Test file data version token."""
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"a")
+    version = file_version(str(path))
+    assert version == file_version(str(path))
+
+    path.write_bytes(b"ab")
+    assert file_version(str(path)) != version
+
+
+def test_archive_version(tmp_path):
+    """Archives are reopened and get a new data version when the file changes."""
+    path = tmp_path / "tiles.pmtiles"
+    shutil.copy(os.path.join(DATA_DIR, "tiles.pmtiles"), path)
+    layer = Archive.from_file(id="archive", infile=str(path))
+    version = layer.data_version()
+    reader = open_archive(str(path))
+    assert open_archive(str(path)) is reader
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert layer.data_version() != version
+    assert open_archive(str(path)) is not reader
+
+
+def test_archive_tile_errors():
+    """Archives only have the WebMercatorQuad tiles."""
+    layer = Archive.from_file(
+        id="archive", infile=os.path.join(DATA_DIR, "tiles.pmtiles")
+    )
+    with pytest.raises(InvalidIdentifier):
+        asyncio.run(
+            layer.get_tile(None, Tile(0, 0, 1), morecantile.tms.get("WGS1984Quad"))
+        )
+
+    with pytest.raises(TileNotFound):
+        asyncio.run(
+            layer.get_tile(None, Tile(4, 0, 2), morecantile.tms.get("WebMercatorQuad"))
+        )
+
+
+@pytest.mark.parametrize(
+    "cls,name,error",
+    [
+        (Archive, "tiles.pmtiles", InvalidArchive),
+        (Archive, "tiles.mbtiles", InvalidArchive),
+        (FileTable, "grid.parquet", InvalidDataset),
+    ],
+)
+def test_file_layer_errors(tmp_path, cls, name, error):
+    """Files replaced by unsupported files or removed raise file errors."""
+    tms = morecantile.tms.get("WebMercatorQuad")
+    path = tmp_path / name
+    shutil.copy(os.path.join(DATA_DIR, name), path)
+    layer = cls.from_file(id="layer", infile=str(path))
+
+    path.write_bytes(b"not a file" * 100)
+    with pytest.raises(error):
+        asyncio.run(layer.get_tile(None, Tile(0, 0, 0), tms))
+
+    path.unlink()
+    with pytest.raises(error, match="does not exist"):
+        asyncio.run(layer.get_tile(None, Tile(0, 0, 0), tms))
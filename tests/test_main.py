@@ -1,8 +1,20 @@
 """Test pg_mvt.main.app."""
 
+import asyncio
+
 
 def test_health(app):
     """Test /healthz endpoint."""
     response = app.get("/healthz")
     assert response.status_code == 200
     assert response.json() == {"ping": "pong!"}
+
+
+def test_connection_init(monkeypatch):
+    """The connection init hook is set with its dotted import path."""
+    from pg_mvt.settings import _PgSettings
+
+    assert _PgSettings().db_connection_init is None
+
+    monkeypatch.setenv("PG_MVT_DB_CONNECTION_INIT", "asyncio.sleep")
+    assert _PgSettings().db_connection_init is asyncio.sleep
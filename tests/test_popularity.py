@@ -0,0 +1,187 @@
+"""test pg_mvt.popularity."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from morecantile import Tile
+
+from pg_mvt import popularity as popularity_module
+from pg_mvt.cache import MemoryCache, cache_key
+from pg_mvt.popularity import (
+    CountMinSketch,
+    Popularity,
+    TopK,
+    parse_cache_key,
+    warm_popular_tiles,
+)
+
+
+def test_count_min_sketch():
+    """Counts are never under-estimated."""
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(100):
+        for _ in range(i % 7):
+            sketch.add(f"key{i}")
+
+    for i in range(100):
+        assert sketch.estimate(f"key{i}") >= i % 7
+
+    assert sketch.add("key3") >= 4
+    sketch.decay()
+    assert sketch.estimate("key3") >= 2
+
+
+def test_top_k():
+    """Only the keys with the highest counts are kept."""
+    top = TopK(k=3)
+    for key, count in [("a", 1), ("b", 2), ("c", 3), ("d", 4), ("a", 5), ("e", 1)]:
+        top.update(key, count)
+
+    assert top.items() == [("a", 5), ("d", 4), ("c", 3)]
+
+
+def test_popularity_persistence(tmp_path):
+    """Sketch is saved and loaded back."""
+    popularity = Popularity(k=2, width=128)
+    for key, n in [("l/t/0/0/0", 3), ("l/t/1/0/0", 5), ("l/t/1/1/1", 1)]:
+        for _ in range(n):
+            popularity.add("l", key)
+    popularity.add("m", "m/t/0/0/0")
+
+    assert popularity.tiles() == ["l/t/1/0/0", "l/t/0/0/0", "m/t/0/0/0"]
+
+    path = str(tmp_path / "popularity.json")
+    popularity.save(path)
+    loaded = Popularity.load(path, k=2)
+    assert loaded.tiles() == popularity.tiles()
+    assert loaded.sketch.estimate("l/t/1/0/0") == 5
+
+    popularity.decay()
+    assert popularity.top["l"].items() == [("l/t/1/0/0", 2), ("l/t/0/0/0", 1)]
+
+    # Missing or invalid files give an empty sketch
+    assert Popularity.load(str(tmp_path / "missing.json")).tiles() == []
+    (tmp_path / "invalid.json").write_text("{")
+    assert Popularity.load(str(tmp_path / "invalid.json")).tiles() == []
+
+
+def test_popularity_merge(tmp_path):
+    """Processes sharing the file add their counts to the saved sketch."""
+    path = str(tmp_path / "popularity.json")
+    workers = [Popularity(k=2, width=128), Popularity(k=2, width=128)]
+    for _ in range(3):
+        workers[0].add("l", "l/t/0/0/0")
+    for _ in range(2):
+        workers[1].add("l", "l/t/0/0/0")
+        workers[1].add("l", "l/t/1/0/0")
+
+    for worker in workers:
+        worker.save(path)
+
+    loaded = Popularity.load(path, k=2)
+    assert loaded.top["l"].items() == [("l/t/0/0/0", 5), ("l/t/1/0/0", 2)]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "popularity.json",
+        "popularity.json.lock",
+    ]
+
+    # The saved counts are halved once per decay interval
+    workers[0].clear()
+    workers[0].add("l", "l/t/1/0/0")
+    workers[0].save(path, decay_interval=3600)
+    assert Popularity.load(path).sketch.estimate("l/t/1/0/0") == 3
+
+    saved = Popularity.load(path)
+    saved.decayed_at -= 3600
+    (tmp_path / "popularity.json").write_bytes(saved.dumps())
+    Popularity(k=2, width=128).save(path, decay_interval=3600)
+    assert Popularity.load(path).top["l"].items() == [
+        ("l/t/0/0/0", 2),
+        ("l/t/1/0/0", 1),
+    ]
+
+
+def test_persist_popularity(tmp_path, monkeypatch):
+    """Save errors don't stop the persistence loop (nor lose the counts)."""
+    popularity = Popularity(k=2, width=128)
+    popularity.add("l", "l/t/0/0/0")
+    saves = []
+
+    def save(self, path, decay_interval=None):
+        saves.append(self.tiles())
+        if len(saves) == 1:
+            raise OSError("disk full")
+        if len(saves) == 2:
+            popularity.add("l", "l/t/1/0/0")
+        if len(saves) == 3:
+            raise asyncio.CancelledError()
+
+    monkeypatch.setattr(Popularity, "save", save)
+
+    async def main():
+        try:
+            await popularity_module.persist_popularity(popularity, "path", 0)
+        except asyncio.CancelledError:
+            pass
+
+    with pytest.warns(RuntimeWarning):
+        asyncio.run(main())
+    # the counts are kept when the save failed, and reset once saved
+    assert saves == [["l/t/0/0/0"], ["l/t/0/0/0"], ["l/t/1/0/0"]]
+
+
+def test_parse_cache_key():
+    """Cache keys are parsed back."""
+    tile = Tile(3, 2, 4)
+    params = {"columns": "a,b", "v": "1", "layer": ["x", "y"]}
+    key = cache_key("public.my.table", "WebMercatorQuad", tile, params)
+    assert parse_cache_key(key) == ("public.my.table", "WebMercatorQuad", tile, params)
+
+    assert parse_cache_key(cache_key("layer", "WebMercatorQuad", tile, {})) == (
+        "layer",
+        "WebMercatorQuad",
+        tile,
+        {},
+    )
+
+
+def test_warm_popular_tiles(monkeypatch):
+    """Popular tiles of known layers are rendered."""
+    rendered = []
+
+    async def get_tile(pool, cache, layer, tile, tms, **kwargs):
+        rendered.append((layer.id, tms.identifier, tile, kwargs))
+        return b""
+
+    monkeypatch.setattr(popularity_module, "get_tile", get_tile)
+
+    catalog = [
+        {
+            "id": "public.table",
+            "schema": "public",
+            "table": "table",
+            "geometry_column": "geom",
+            "geometry_type": "POINT",
+            "geometry_srid": 4326,
+            "properties": {},
+            "version": "3",
+        }
+    ]
+    app = SimpleNamespace(
+        state=SimpleNamespace(pool=None, cache=MemoryCache(), table_catalog=catalog)
+    )
+
+    popularity = Popularity()
+    popularity.add("public.table", "public.table/WebMercatorQuad/1/0/1")
+    popularity.add("public.table", "public.table/WebMercatorQuad/1/0/1")
+    # key of an outdated version
+    popularity.add("public.table", "public.table/WebMercatorQuad/1/1/1?v=2")
+    popularity.add("public.missing", "public.missing/WebMercatorQuad/0/0/0")
+
+    assert asyncio.run(warm_popular_tiles(app, popularity, concurrency=1)) == 2
+    # tiles are rendered for the current data version
+    assert rendered == [
+        ("public.table", "WebMercatorQuad", Tile(0, 1, 1), {"v": "3"}),
+        ("public.table", "WebMercatorQuad", Tile(1, 1, 1), {"v": "3"}),
+    ]
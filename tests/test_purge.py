@@ -0,0 +1,88 @@
+"""test pg_mvt.purge."""
+
+import asyncio
+
+import morecantile
+from morecantile import Tile
+
+from pg_mvt.purge import (
+    PurgeHooks,
+    purge_hooks,
+    purge_keys,
+    purged,
+    quadkey,
+    surrogate_keys,
+)
+
+tms = morecantile.tms.get("WebMercatorQuad")
+
+
+def test_quadkey():
+    """Should match morecantile's quadkeys."""
+    assert quadkey(Tile(0, 0, 0)) == ""
+    for tile in [Tile(1, 0, 1), Tile(37, 25, 6), Tile(300, 200, 9)]:
+        assert quadkey(tile) == tms.quadkey(tile)
+
+
+def test_surrogate_keys():
+    """Check tile's surrogate keys."""
+    assert surrogate_keys("layer", Tile(300, 200, 9), tms, zoom=6) == [
+        "layer",
+        "layer/9",
+        "layer/WebMercatorQuad/q122103",
+    ]
+    assert surrogate_keys("layer", Tile(1, 1, 2), tms, zoom=6) == [
+        "layer",
+        "layer/2",
+        "layer/WebMercatorQuad/q03",
+    ]
+
+    # No region key for non-quadtree TMS
+    assert surrogate_keys(
+        "layer", Tile(0, 0, 1), morecantile.tms.get("LINZAntarticaMapTilegrid")
+    ) == [
+        "layer",
+        "layer/1",
+    ]
+
+
+def test_purge_keys():
+    """Check purge keys."""
+    assert purge_keys("layer") == ["layer"]
+
+    keys = purge_keys("layer", tms, [10, 10, 12, 12], zoom=6)
+    assert keys[0] == "layer/WebMercatorQuad/q"
+    # a tile and its ancestors are purged with the region
+    tile = tms.tile(11, 11, 9)
+    for key in surrogate_keys("layer", tile, tms, zoom=6)[2:]:
+        assert key in keys
+    for z in range(7):
+        parent = tms.tile(11, 11, z)
+        assert surrogate_keys("layer", parent, tms, zoom=6)[2] in keys
+
+
+def test_purged():
+    """Match tile cache keys with purged surrogate keys."""
+    assert purged("layer/WebMercatorQuad/9/300/200?columns=a", ["layer"])
+    assert not purged("other/WebMercatorQuad/9/300/200", ["layer"])
+    assert not purged("layer.a/WebMercatorQuad/9/300/200", ["layer"])
+
+    keys = purge_keys("layer", tms, [10, 10, 12, 12], zoom=6)
+    tile = tms.tile(11, 11, 9)
+    assert purged(f"layer/WebMercatorQuad/{tile.z}/{tile.x}/{tile.y}", keys)
+    assert not purged("layer/WebMercatorQuad/9/0/0", keys)
+    # unknown TMS: all the layer's tiles are purged
+    assert purged("layer/CustomTMS/9/0/0", keys)
+
+
+def test_purge_hooks(monkeypatch):
+    """Sync and async hooks are called with the keys."""
+    monkeypatch.setattr(PurgeHooks, "hooks", [])
+    events = []
+
+    async def hook(keys):
+        events.append(("async", keys))
+
+    purge_hooks.register(events.append, hook)
+    asyncio.run(purge_hooks.emit(["layer"]))
+    assert events == [["layer"], ("async", ["layer"])]
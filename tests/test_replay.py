@@ -0,0 +1,173 @@
+"""test pg_mvt.replay."""
+
+import asyncio
+import json
+
+import pytest
+
+from pg_mvt.cli import main
+from pg_mvt.replay import ReplayRequest, parse_log, percentile, replay, request_group
+
+LOG = [
+    '1.2.3.4 - - [10/Oct/2023:13:55:37 +0000] "GET /tiles/public.roads/2/1/1.pbf HTTP/1.1" 200 10',
+    '1.2.3.4 - - [10/Oct/2023:13:55:36 +0000] "GET /tiles/WebMercatorQuad/public.roads/1/0/0.pbf?columns=name HTTP/1.1" 200 10 "-" "curl"',
+    '1.2.3.4 - - [10/Oct/2023:13:55:38 +0000] "POST /admin/purge/public.roads HTTP/1.1" 200 10',
+    "",
+]
+
+
+def test_parse_log():
+    """Parse access logs."""
+    requests = parse_log(LOG)
+    assert requests == [
+        ReplayRequest(0, "/tiles/WebMercatorQuad/public.roads/1/0/0.pbf?columns=name"),
+        ReplayRequest(1, "/tiles/public.roads/2/1/1.pbf"),
+    ]
+
+    lines = [
+        '{"t": 100.5, "path": "/tiles/public.roads/1/0/0.pbf"}',
+        '{"t": 100, "url": "http://example.com/tilejson.json?a=1"}',
+        '{"t": 101, "method": "POST", "path": "/admin/purge/public.roads"}',
+    ]
+    assert parse_log(lines) == [
+        ReplayRequest(0, "/tilejson.json?a=1"),
+        ReplayRequest(0.5, "/tiles/public.roads/1/0/0.pbf"),
+    ]
+
+    # Lines without time are sent at `rate` requests per second
+    lines = [
+        "/tiles/public.roads/1/0/0.pbf",
+        'INFO:     127.0.0.1:5000 - "GET /tiles/public.roads/1/0/1.pbf HTTP/1.1" 200 OK',
+    ]
+    assert [r.offset for r in parse_log(lines, rate=4)] == [0, 0.25]
+
+
+def test_request_group():
+    """Group requests by layer and zoom level."""
+    assert request_group("/tiles/public.roads/1/0/0.pbf") == ("public.roads", 1)
+    assert request_group("/tiles/WGS1984Quad/public.roads/12/0/0.pbf?v=1") == (
+        "public.roads",
+        12,
+    )
+    assert request_group("/public.roads/tilejson.json") == ("other", None)
+
+
+def test_percentile():
+    """Nearest rank percentiles."""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3], 90) == 3
+    assert percentile([], 90) == 0
+
+
+def _responses():
+    """Start a fake pg_mvt server (2 workers, keep-alive connections)."""
+    requests = []
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                break
+
+            lines = head.decode().split("\r\n")
+            path = lines[0].split()[1]
+            headers = dict(line.lower().split(": ", 1) for line in lines[1:] if line)
+            requests.append((path, headers.get("accept-encoding")))
+            length = None
+            close = False
+            if path == "/admin/pool.json":
+                pid = len(requests) % 2
+                body = json.dumps(
+                    {"pid": pid, "size": 2, "idle": 0, "max_size": 2}
+                ).encode()
+                status = b"200 OK"
+            elif "/3/" in path:
+                body, status = b"", b"500 Internal Server Error"
+            elif path.endswith("/1/1.pbf"):
+                # connection closed before the end of the body
+                body, status, length, close = b"tile", b"200 OK", 10, True
+            elif path.endswith("/0/1.pbf"):
+                # keep-alive connection closed by the server after the response
+                body, status, close = b"tile", b"200 OK", True
+            else:
+                body, status = b"tile", b"200 OK"
+
+            writer.write(
+                b"HTTP/1.1 %s\r\nContent-Length: %d\r\n\r\n%s"
+                % (status, length or len(body), body)
+            )
+            await writer.drain()
+            if close:
+                break
+
+        writer.close()
+
+    return handle, requests, connections
+
+
+def test_replay():
+    """Replay requests and report latencies per layer and zoom level."""
+    handle, sent, connections = _responses()
+    requests = [
+        ReplayRequest(0, "/tiles/public.roads/1/0/0.pbf"),
+        ReplayRequest(0.01, "/tiles/public.roads/1/0/1.pbf"),
+        ReplayRequest(0.02, "/tiles/public.roads/3/0/0.pbf"),
+        ReplayRequest(0.03, "/tiles/public.roads/2/0/0.pbf"),
+        ReplayRequest(0.04, "/tiles/public.roads/1/1/1.pbf"),
+        ReplayRequest(0.06, "/tiles/public.roads/2/0/1.pbf"),
+    ]
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await replay(
+                f"http://127.0.0.1:{port}", requests, speed=2, pool_interval=0.005
+            )
+
+    result = asyncio.run(main())
+    assert result["total"]["requests"] == 6
+    assert result["total"]["errors"] == 2
+    assert [(g["layer"], g["zoom"], g["requests"]) for g in result["groups"]] == [
+        ("public.roads", 1, 3),
+        ("public.roads", 2, 2),
+        ("public.roads", 3, 1),
+    ]
+    assert result["groups"][0]["errors"] == 1
+    assert result["groups"][1]["errors"] == 0
+    assert result["groups"][2]["error_rate"] == 1
+    assert result["groups"][0]["p50"] <= result["groups"][0]["max"]
+    assert result["pool"]["samples"] > 0
+    assert result["pool"]["saturated"] == 1
+    assert result["pool"]["workers"] == 2
+
+    tiles = [(p, e) for p, e in sent if p.startswith("/tiles")]
+    assert {p for p, _ in tiles} == {r.path for r in requests}
+    assert {e for _, e in tiles} == {"gzip"}
+    # keep-alive connections are reused
+    assert len(connections) < len(sent) / 2
+
+
+def test_replay_cli(tmp_path, capsys):
+    """Check replay command (unreachable target)."""
+    log = tmp_path / "access.log"
+    log.write_text("\n".join(LOG))
+
+    args = ["replay", str(log), "--url", "http://127.0.0.1:9", "--speed", "100"]
+    main(args + ["--pool-interval", "0", "--json"])
+    result = json.loads(capsys.readouterr().out)
+    assert result["total"] == {**result["total"], "requests": 2, "errors": 2}
+
+    main(args + ["--pool-interval", "0"])
+    out = capsys.readouterr().out
+    assert "2 requests in" in out
+    assert "public.roads" in out
+
+    with pytest.raises(SystemExit):
+        main(["replay"])
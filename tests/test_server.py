@@ -0,0 +1,134 @@
+"""test pg_mvt.server."""
+
+import asyncio
+import json
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pg_mvt import server
+
+from starlette.testclient import TestClient
+
+# Serve with 2 workers, writing the pid of the processes fetching the catalog
+SERVE = """
+import os
+import sys
+
+from pg_mvt import db
+from pg_mvt.server import serve
+
+table_index = db.table_index
+
+
+async def counted_table_index(pool):
+    with open(sys.argv[1], "a") as f:
+        f.write(f"{os.getpid()}\\n")
+    return await table_index(pool)
+
+
+db.table_index = counted_table_index
+serve(port=int(sys.argv[2]), workers=2, log_level="warning")
+"""
+
+
+def test_shared_catalog(app, monkeypatch):
+    """Workers use the catalog loaded by the parent process."""
+    from pg_mvt import db
+    from pg_mvt.server import load_catalog
+
+    catalog = asyncio.run(load_catalog())
+    landsat = next(r for r in catalog if r["id"] == "public.landsat_wrs")
+    assert landsat["version"]
+
+    shared = [dict(landsat, id="public.shared")]
+    monkeypatch.setattr(db, "shared_catalog", shared)
+    with TestClient(app.app) as client:
+        assert client.app.state.table_catalog is shared
+        response = client.get("/tables.json")
+        assert response.status_code == 200
+        assert [t["id"] for t in response.json()] == ["public.shared"]
+
+
+def test_serve(app, tmp_path):
+    """Serve with 2 workers sharing the catalog loaded once."""
+    calls = tmp_path / "table_index"
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen([sys.executable, "-c", SERVE, str(calls), str(port)])
+    url = f"http://127.0.0.1:{port}"
+
+    def _pid(_):
+        with urllib.request.urlopen(f"{url}/admin/pool.json", timeout=5) as response:
+            return json.loads(response.read())["pid"]
+
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                _pid(None)
+                break
+            except OSError:
+                assert process.poll() is None
+                assert time.monotonic() < deadline
+                time.sleep(0.2)
+
+        pids = set()
+        with ThreadPoolExecutor(8) as executor:
+            while len(pids) < 2 and time.monotonic() < deadline:
+                pids.update(executor.map(_pid, range(32)))
+
+        with urllib.request.urlopen(f"{url}/tables.json", timeout=5) as response:
+            assert "public.landsat_wrs" in [
+                t["id"] for t in json.loads(response.read())
+            ]
+    finally:
+        process.send_signal(signal.SIGTERM)
+        status = process.wait(timeout=30)
+
+    assert status == 0
+    assert len(pids) == 2
+    assert process.pid not in pids
+    # The catalog was fetched once, by the parent process
+    assert calls.read_text().split() == [str(process.pid)]
+
+
+class _CrashingServer:
+    started = False
+
+    def run(self, sockets):
+        raise RuntimeError("crash")
+
+
+def test_supervise_crash_loop(monkeypatch):
+    """Stop replacing workers which keep crashing."""
+    handlers = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT)}
+    spawned = []
+    spawn = server._spawn
+
+    def _spawn(*args):
+        spawned.append(time.monotonic())
+        return spawn(*args)
+
+    monkeypatch.setattr(server, "_spawn", _spawn)
+    try:
+        with pytest.warns(RuntimeWarning, match="crashed 4 times in a row"):
+            status = server._supervise(
+                _CrashingServer(), [], workers=2, restart_delay=0.05, max_restarts=3
+            )
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    assert status == server.CRASH_LOOP
+    # 2 workers and 3 replacements, after 0.05, 0.1 and 0.2s
+    assert len(spawned) == 5
+    assert spawned[-1] - spawned[1] >= 0.35
@@ -0,0 +1,203 @@
+"""test pg_mvt.style."""
+
+import json
+
+from pg_mvt.style import (
+    LayerStyle,
+    StyleRegistry,
+    StyleRule,
+    from_gl_style,
+    gl_filter,
+    gl_properties,
+    typed_filter,
+)
+
+STYLE = {
+    "version": 8,
+    "sources": {
+        "roads": {
+            "type": "vector",
+            "url": "https://tiles.example.com/public.roads/tilejson.json",
+        },
+        "pois": {
+            "type": "vector",
+            "tiles": ["https://tiles.example.com/tiles/public.pois/{z}/{x}/{y}.pbf"],
+        },
+        "raster": {"type": "raster", "tiles": ["https://example.com/{z}/{x}/{y}.png"]},
+    },
+    "layers": [
+        {"id": "background", "type": "background"},
+        {
+            "id": "motorways",
+            "type": "line",
+            "source": "roads",
+            "source-layer": "default",
+            "maxzoom": 8,
+            "filter": ["==", "class", "motorway"],
+            "paint": {"line-width": {"property": "lanes", "stops": [[1, 1], [4, 3]]}},
+        },
+        {
+            "id": "roads",
+            "type": "line",
+            "source": "roads",
+            "source-layer": "default",
+            "minzoom": 8,
+            "filter": ["in", ["get", "class"], ["literal", ["primary", "secondary"]]],
+            "paint": {
+                "line-color": ["match", ["get", "surface"], "paved", "#000", "#888"]
+            },
+        },
+        {
+            "id": "labels",
+            "type": "symbol",
+            "source": "roads",
+            "source-layer": "default",
+            "minzoom": 12,
+            "layout": {"text-field": "{name} ({ref})"},
+        },
+        {
+            "id": "hidden",
+            "type": "line",
+            "source": "roads",
+            "source-layer": "default",
+            "layout": {"visibility": "none"},
+            "paint": {"line-color": ["get", "color"]},
+        },
+        {
+            "id": "pois",
+            "type": "circle",
+            "source": "pois",
+            "source-layer": "default",
+            "minzoom": 14,
+            "filter": ["all", ["==", "$type", "Point"], ["has", "name"]],
+        },
+    ],
+}
+
+
+def test_gl_filter():
+    """Translate Mapbox GL filters to CQL2-JSON."""
+    assert gl_filter(["==", "class", "a"]) == {
+        "op": "=",
+        "args": [{"property": "class"}, "a"],
+    }
+    assert gl_filter([">=", ["get", "rank"], 3]) == {
+        "op": ">=",
+        "args": [{"property": "rank"}, 3],
+    }
+    assert gl_filter(["in", "class", "a", "b"]) == {
+        "op": "in",
+        "args": [{"property": "class"}, ["a", "b"]],
+    }
+    # Features without the property are displayed with `!=`
+    assert gl_filter(["!=", "class", "a"])["op"] == "or"
+
+    # Filters which cannot be translated select all the features
+    assert gl_filter(["==", "$type", "Polygon"]) is None
+    assert gl_filter(["<", ["zoom"], 5]) is None
+    assert gl_filter(["any", ["==", "a", 1], ["==", "$type", "Point"]]) is None
+    assert gl_filter(["all", ["==", "a", 1], ["==", "$type", "Point"]]) == {
+        "op": "=",
+        "args": [{"property": "a"}, 1],
+    }
+
+
+def test_typed_filter():
+    """Predicates with literals of another type than the column are removed."""
+    properties = {"oneway": "bool", "lanes": "int4", "class": "text"}
+
+    expr = gl_filter(["!=", "oneway", "yes"])
+    assert typed_filter(expr, properties) is None
+    expr = gl_filter(["!=", "oneway", True])
+    assert typed_filter(expr, properties) == expr
+
+    assert typed_filter(gl_filter(["!=", "lanes", "2"]), properties) is None
+    assert typed_filter(gl_filter(["in", "lanes", 1, "2"]), properties) is None
+    assert typed_filter(gl_filter(["<", "lanes", 2.5]), properties) is None
+    expr = gl_filter(["<", "lanes", 2])
+    assert typed_filter(expr, properties) == expr
+
+    # `and` keeps the other predicates, `or` selects all the features
+    expr = gl_filter(["all", ["==", "class", "a"], ["==", "lanes", "2"]])
+    assert typed_filter(expr, properties) == gl_filter(["==", "class", "a"])
+    expr = gl_filter(["any", ["==", "class", "a"], ["==", "lanes", "2"]])
+    assert typed_filter(expr, properties) is None
+
+    # negated relaxed predicates select all the features
+    expr = {
+        "op": "not",
+        "args": [gl_filter(["all", ["==", "class", "a"], ["==", "lanes", "2"]])],
+    }
+    assert typed_filter(expr, properties) is None
+
+
+def test_gl_properties():
+    """Collect properties used in style values."""
+    value = ["case", ["has", "name"], ["get", "name"], ["literal", ["get", "x"]]]
+    assert gl_properties(value, set()) == {"name"}
+    assert gl_properties("{name}-{ref}", set(), text=True) == {"name", "ref"}
+    assert gl_properties("{name}", set()) == set()
+
+
+def test_from_gl_style():
+    """Create layer styles from a Mapbox GL style."""
+    styles = from_gl_style(STYLE)
+    assert list(styles) == ["public.roads", "public.pois"]
+
+    roads = styles["public.roads"]
+    assert len(roads.rules) == 3
+
+    properties, expr = roads.prune(6)
+    assert properties == ["class", "lanes"]
+    assert expr == {"op": "=", "args": [{"property": "class"}, "motorway"]}
+
+    # Tile 8 is displayed from zoom 7 (256px tiles) up to zoom 9 (512px tiles)
+    properties, expr = roads.prune(8)
+    assert properties == ["class", "lanes", "surface"]
+    assert expr["op"] == "or"
+
+    # Labels have no filter: all the features
+    properties, expr = roads.prune(12)
+    assert properties == ["class", "surface", "name", "ref"]
+    assert expr is None
+
+    pois = styles["public.pois"]
+    assert pois.prune(13) is None
+    assert pois.prune(14) == (
+        ["name"],
+        {"op": "not", "args": [{"op": "isNull", "args": [{"property": "name"}]}]},
+    )
+    # At the layer's maxzoom, tiles are used for all the higher zoom levels
+    assert pois.prune(10, maxzoom=10) is not None
+
+
+def test_style_registry(tmp_path, monkeypatch):
+    """Load Mapbox GL styles and specs."""
+    monkeypatch.setattr(StyleRegistry, "styles", {})
+
+    path = tmp_path / "style.json"
+    path.write_text(json.dumps(STYLE))
+    StyleRegistry.load(str(path))
+    assert StyleRegistry.get("public.pois")
+
+    spec = {
+        "public.landsat_wrs": [
+            {"maxzoom": 6, "properties": ["path"], "filter": "row > 10"},
+            {"minzoom": 6, "properties": ["path", "row"]},
+        ]
+    }
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps(spec))
+    StyleRegistry.load(str(path))
+
+    style = StyleRegistry.get("public.landsat_wrs")
+    assert style == LayerStyle(
+        rules=[
+            StyleRule(
+                maxzoom=6,
+                properties=["path"],
+                filter={"op": ">", "args": [{"property": "row"}, 10]},
+            ),
+            StyleRule(minzoom=6, properties=["path", "row"]),
+        ]
+    )
@@ -0,0 +1,29 @@
+"""Test pg_mvt.tms."""
+
+import morecantile
+import numpy as np
+import pytest
+
+from pg_mvt.tms import get_context
+
+
+@pytest.mark.parametrize("identifier", morecantile.tms.list())
+def test_context(identifier):
+    """Context should match morecantile."""
+    tms = morecantile.tms.get(identifier)
+    ctx = get_context(tms)
+    assert ctx is get_context(tms)
+    assert ctx.identifier == identifier
+    assert ctx.epsg == tms.crs.to_epsg()
+    assert ctx.proj == tms.crs.to_proj4()
+
+    for z in range(tms.minzoom, tms.maxzoom + 1):
+        matrix = tms.matrix(z)
+        tile = morecantile.Tile(matrix.matrixWidth - 1, matrix.matrixHeight // 2, z)
+        np.testing.assert_allclose(ctx.xy_bounds(tile), tms.xy_bounds(tile))
+
+
+def test_quadtree():
+    """Test quadtree flag."""
+    assert get_context(morecantile.tms.get("WebMercatorQuad")).is_quadtree
+    assert not get_context(morecantile.tms.get("CanadianNAD83_LCC")).is_quadtree